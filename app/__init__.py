@@ -1,4 +0,0 @@
-from .database import engine
-from . import models
-
-models.Base.metadata.create_all(bind=engine)
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Admission control in front of the database-bound API routes.
+
+At most ``max_concurrency`` API requests run at once per worker. Further requests
+wait in a bounded queue, ordered by the priority of their route: cheap reads
+first, then writes, then heavy calls such as recommendations or category creation.
+A request is answered 503 Service Unavailable with a Retry-After header when the
+queue is full, when a request of higher priority takes its place in a full
+queue, or when it waits longer than its route's deadline. Clients are told to
+back off at once instead of holding a thread while waiting for a pooled connection.
+
+A request holds its slot until its response has been sent in full. Streaming
+exports read from the database until their last row, so they keep their slot for
+the whole body: the route deadlines only bound the wait for admission, never the
+time a request runs.
+"""
+from enum import IntEnum
+from fastapi import status
+from fastapi.responses import JSONResponse
+from typing import NamedTuple, Optional
+from . import config, metrics
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+class Priority(IntEnum):
+    """
+    Admission priority of a route, lowest value first.
+    """
+    READ = 0
+    WRITE = 1
+    HEAVY = 2
+
+class RouteClass(NamedTuple):
+    """
+    Admission priority of a route, and the seconds its requests may wait for admission.
+    The deadline does not limit how long an admitted request runs.
+    """
+    priority: Priority
+    deadline: float
+
+# (method, path prefix, class) of the limited routes; the first match wins. Requests
+# matching no entry, or an entry without a class, are never queued.
+ROUTE_CLASSES = (
+    ("GET", "/api/v1/cache", None),
+    ("GET", "/api/v1/recommendations", RouteClass(Priority.HEAVY, 10)),
+    ("GET", "/api/v1/export", RouteClass(Priority.HEAVY, 30)),
+    ("POST", "/api/v1/categories", RouteClass(Priority.HEAVY, 10)),
+    ("POST", "/api/v1/reviews/batch", RouteClass(Priority.HEAVY, 10)),
+    ("POST", "/api/v1/recommendations/claims", RouteClass(Priority.HEAVY, 10)),
+    ("POST", "/api/v1/", RouteClass(Priority.WRITE, 5)),
+    ("DELETE", "/api/v1/", RouteClass(Priority.WRITE, 5)),
+    ("GET", "/api/v1/", RouteClass(Priority.READ, 2)),
+)
+
+# Reasons of a rejection, used as metric labels
+QUEUE_FULL = "queue_full"
+EVICTED = "evicted"
+DEADLINE = "deadline"
+
+def classify(method: str, path: str) -> Optional[RouteClass]:
+    """
+    Return the admission class of a request, or None if it is not limited.
+    """
+    for route_method, prefix, route_class in ROUTE_CLASSES:
+        if method == route_method and path.startswith(prefix):
+            return route_class
+    return None
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded priority queue.
+
+    Used from the event loop only. Each waiting request holds a future resolved with
+    None when it is admitted, or with the reason it was rejected.
+    """
+    def __init__(self, max_concurrency: int, queue_size: int):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.active = 0
+        self.queued = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    async def acquire(self, route_class: RouteClass) -> Optional[str]:
+        """
+        Wait for a slot.
+
+        Args:
+            route_class (RouteClass): The priority and deadline of the request.
+
+        Returns:
+            Optional[str]: None once the request holds a slot, to be given back with
+            ``release``; otherwise the reason it was rejected.
+        """
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            return None
+        if self.queued >= self.queue_size and not self._evict(route_class.priority):
+            return QUEUE_FULL
+
+        loop = asyncio.get_running_loop()
+        entry = (route_class.priority, next(self._sequence), loop.create_future())
+        heapq.heappush(self._waiting, entry)
+        self.queued += 1
+        timer = loop.call_later(route_class.deadline, self._reject, entry, DEADLINE)
+        try:
+            return await entry[2]
+        except asyncio.CancelledError:
+            # The client went away: give the slot back if it was just granted
+            if entry[2].done() and not entry[2].cancelled() and entry[2].result() is None:
+                self.release()
+            elif not entry[2].done():
+                self._reject(entry, None)
+            raise
+        finally:
+            timer.cancel()
+
+    def release(self):
+        """
+        Give a slot back, handing it to the first waiting request if there is one.
+        """
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self.queued -= 1
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _reject(self, entry, reason: Optional[str]):
+        future = entry[2]
+        if not future.done():
+            self.queued -= 1
+            future.set_result(reason)
+
+    def _evict(self, priority: Priority) -> bool:
+        """
+        Reject the latest waiting request of the lowest priority, if lower than ``priority``.
+        """
+        waiting = [entry for entry in self._waiting if not entry[2].done()]
+        if not waiting:
+            return False
+        worst = max(waiting, key=lambda entry: (entry[0], entry[1]))
+        if worst[0] <= priority:
+            return False
+        self._reject(worst, EVICTED)
+        return True
+
+    def stats(self):
+        """
+        Return the number of running and waiting requests.
+        """
+        return {"active": self.active, "queued": self.queued}
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting the requests of limited routes through an AdmissionController.
+    """
+    def __init__(self, app, controller: AdmissionController, retry_after: float):
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        route_class = classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        rejection = await self.controller.acquire(route_class)
+        labels = (route_class.priority.name.lower(),)
+        metrics.admission_wait.observe(labels, time.perf_counter() - started)
+        if rejection is not None:
+            metrics.admission_rejections.inc(labels + (rejection,))
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Server busy, retry later"},
+                headers={"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+controller = AdmissionController(
+    max_concurrency=config.ADMISSION_MAX_CONCURRENCY,
+    queue_size=config.ADMISSION_QUEUE_SIZE
+) if config.ADMISSION_MAX_CONCURRENCY > 0 else None
@@ -0,0 +1,568 @@
+from collections import OrderedDict
+from sqlalchemy import event, text
+from typing import Optional
+from . import config
+import bisect
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def on_commit(session, callback):
+    """
+    Run ``callback`` once the current transaction of ``session`` commits.
+
+    Callbacks are dropped if the transaction rolls back instead.
+
+    Args:
+        session (Session): A synchronous session, such as ``AsyncSession.sync_session``.
+        callback (Callable[[], Any]): The function to run.
+    """
+    callbacks = session.info.get("on_commit")
+    if callbacks is None:
+        callbacks = session.info["on_commit"] = []
+        event.listen(session, "after_commit", _run_on_commit)
+        event.listen(session, "after_soft_rollback", _drop_on_commit)
+    callbacks.append(callback)
+
+def _run_on_commit(session):
+    callbacks = list(session.info["on_commit"])
+    session.info["on_commit"].clear()
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error running a commit callback: {str(e)}")
+
+def _drop_on_commit(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info["on_commit"].clear()
+
+class LocalInvalidationChannel:
+    """
+    Invalidation channel visible to the current process only.
+    """
+    def __init__(self):
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def publish(self, payload: Optional[list] = None, session=None):
+        """
+        Announce that cached data is stale.
+
+        Args:
+            payload (Optional[list]): JSON-serializable items describing the change,
+                delivered to the other workers by channels that support it.
+            session (Optional[Session]): The session of the write. When given, the
+                invalidation is published once its transaction commits.
+        """
+        if session is not None:
+            on_commit(session, lambda: self.publish(payload))
+            return
+        with self._lock:
+            self._generation += 1
+
+    def generation(self):
+        """
+        Return a value that changes every time an invalidation is published.
+        """
+        return self._generation
+
+    def changes(self):
+        """
+        Take the payloads published by other workers since the previous call.
+
+        Returns:
+            Tuple[Any, Optional[list]]: The current generation, and the payload items
+            received, or None when some invalidation may have come without its payload.
+            This channel carries no payloads.
+        """
+        return self.generation(), None
+
+class FileInvalidationChannel(LocalInvalidationChannel):
+    """
+    Invalidation channel shared by the workers of one host through a file's modification time.
+
+    Publishing bumps the file's mtime; readers compare it with a single ``stat`` call.
+    Payloads are not carried.
+    """
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        if not os.path.exists(path):
+            with open(path, "a"):
+                pass
+
+    def publish(self, payload: Optional[list] = None, session=None):
+        super().publish(payload, session)
+        if session is not None:
+            return
+        with self._lock:
+            stamp = max(time.time_ns(), os.stat(self.path).st_mtime_ns + 1)
+            os.utime(self.path, ns=(stamp, stamp))
+
+    def generation(self):
+        try:
+            return (self._generation, os.stat(self.path).st_mtime_ns)
+        except OSError as e:
+            logger.error(f"Error reading invalidation file {self.path}: {str(e)}")
+            return (self._generation, None)
+
+class PostgresInvalidationChannel(LocalInvalidationChannel):
+    """
+    Invalidation channel shared by every worker through PostgreSQL LISTEN/NOTIFY.
+
+    A daemon thread listens on ``channel`` and bumps the local generation on each
+    notification. While the listener is disconnected the generation changes on every
+    read, so nothing is served from the cache until it reconnects. Notifications
+    published by this process are ignored, as ``publish`` already bumped the
+    generation.
+
+    Payloads travel in the notifications, split so that each stays under the
+    PostgreSQL limit of 8000 bytes, and are kept until ``changes`` takes them.
+    Given the session of the write, ``publish`` sends the notifications in its
+    transaction, so they are delivered only if it commits.
+    """
+    # Payload items per notification
+    PAYLOAD_CHUNK = 100
+
+    def __init__(self, channel: str = "map_my_world_cache"):
+        super().__init__()
+        self.channel = channel
+        self._listening = False
+        self._listener = None
+        self._payloads = []
+        self._complete = True
+
+    @property
+    def _sender(self):
+        # Read at every use: workers forked from a preloaded app share this object.
+        return f"{os.getpid()}:{id(self)}"
+
+    def publish(self, payload: Optional[list] = None, session=None):
+        from .database import engine
+
+        if payload:
+            messages = [
+                f"{self._sender} {json.dumps(payload[start:start + self.PAYLOAD_CHUNK])}"
+                for start in range(0, len(payload), self.PAYLOAD_CHUNK)
+            ]
+        else:
+            messages = [self._sender]
+        if session is not None:
+            for message in messages:
+                session.execute(text("SELECT pg_notify(:channel, :message)"), {"channel": self.channel, "message": message})
+            super().publish(session=session)
+            return
+
+        super().publish()
+        try:
+            with engine.connect() as connection:
+                for message in messages:
+                    connection.execute(text("SELECT pg_notify(:channel, :message)"), {"channel": self.channel, "message": message})
+                connection.commit()
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {str(e)}")
+
+    def generation(self):
+        if self._listener is None:
+            self.start()
+        if not self._listening:
+            with self._lock:
+                self._generation += 1
+                self._complete = False
+        return self._generation
+
+    def changes(self):
+        self.generation()
+        with self._lock:
+            payloads = self._payloads if self._complete else None
+            self._payloads = []
+            self._complete = True
+            return self._generation, payloads
+
+    def start(self):
+        """
+        Start the listener thread if it is not running yet.
+        """
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        from .database import DATABASE_URL
+        import psycopg2
+
+        while True:
+            connection = None
+            try:
+                # A dedicated connection, so the listener never holds a slot of the request pool.
+                connection = psycopg2.connect(DATABASE_URL)
+                connection.autocommit = True
+                connection.cursor().execute(f"LISTEN {self.channel}")
+                self._listening = True
+                with self._lock:
+                    # Notifications sent while disconnected are lost.
+                    self._generation += 1
+                    self._complete = False
+                while True:
+                    if select.select([connection], [], [], 5) != ([], [], []):
+                        connection.poll()
+                        if connection.notifies:
+                            messages = [notify.payload.partition(" ") for notify in connection.notifies]
+                            connection.notifies.clear()
+                            foreign = [body for sender, _, body in messages if sender != self._sender]
+                            if foreign:
+                                with self._lock:
+                                    self._generation += 1
+                                    for body in foreign:
+                                        if body:
+                                            self._payloads.extend(json.loads(body))
+                                        else:
+                                            self._complete = False
+            except Exception as e:
+                self._listening = False
+                logger.error(f"Cache invalidation listener disconnected: {str(e)}")
+                time.sleep(1)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+def create_channel(spec: str, topic: str = ""):
+    """
+    Build an invalidation channel from its configuration string.
+
+    Args:
+        spec (str): "local", "file:<path>" or "postgres[:<channel>]".
+        topic (str): Suffix separating this channel from the others built from the same
+            spec, so that unrelated writes do not invalidate each other's caches.
+
+    Returns:
+        LocalInvalidationChannel: The configured channel.
+
+    Raises:
+        ValueError: If the channel type is unknown.
+    """
+    kind, _, argument = spec.partition(":")
+    if kind == "local":
+        return LocalInvalidationChannel()
+    if kind == "file":
+        return FileInvalidationChannel(f"{argument}.{topic}" if topic else argument)
+    if kind == "postgres":
+        channel = argument or "map_my_world_cache"
+        return PostgresInvalidationChannel(f"{channel}_{topic}" if topic else channel)
+    raise ValueError(f"Unknown cache invalidation channel: {spec}")
+
+class TTLCache:
+    """
+    In-process cache whose entries expire after a TTL or on invalidation.
+
+    Entries remember the channel generation they were computed under and are
+    dropped as soon as another invalidation has been published. A value is only
+    stored if the generation read before computing it is still current, and, with
+    ``settle_seconds``, if it has not changed for that long: a read replica may not
+    have applied a write yet when its invalidation arrives.
+    """
+    def __init__(self, ttl_seconds: float, channel, settle_seconds: float = 0):
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        self.settle_seconds = settle_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._last_generation = None
+        self._changed_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0
+
+    def lookup(self, key):
+        """
+        Look up ``key`` in the cache.
+
+        Args:
+            key: A hashable cache key.
+
+        Returns:
+            Tuple[bool, Any, Any]: Whether the key was found, the cached value, and the
+            generation to pass to ``store`` after computing the value on a miss.
+        """
+        if not self.enabled:
+            return False, None, None
+
+        generation = self._observe_generation()
+        now = time.monotonic()
+        with self._lock:
+            settled = now - self._changed_at >= self.settle_seconds
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] == generation:
+                self.hits += 1
+                return True, entry[2], (generation, settled)
+            self.misses += 1
+        return False, None, (generation, settled)
+
+    def store(self, key, generation, value):
+        """
+        Store a value computed after a missed ``lookup``.
+
+        The value is dropped if an invalidation was published since ``lookup``, or
+        less than ``settle_seconds`` before it.
+
+        Args:
+            key: A hashable cache key.
+            generation: The generation returned by ``lookup``.
+            value: The value to cache.
+        """
+        if not self._may_store(generation):
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, generation[0], value)
+
+    def _observe_generation(self):
+        """
+        Read the channel generation, noting when it last changed.
+        """
+        generation = self.channel.generation()
+        with self._lock:
+            if generation != self._last_generation:
+                self._last_generation = generation
+                self._changed_at = time.monotonic()
+        return generation
+
+    def _may_store(self, generation) -> bool:
+        if not self.enabled:
+            return False
+        generation, settled = generation
+        return settled and self._observe_generation() == generation
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for ``key``, computing and storing it on a miss.
+
+        Args:
+            key: A hashable cache key.
+            compute (Callable[[], Any]): Function producing the value on a miss.
+
+        Returns:
+            Any: The cached or freshly computed value.
+        """
+        found, value, generation = self.lookup(key)
+        if found:
+            return value
+        value = compute()
+        self.store(key, generation, value)
+        return value
+
+    def invalidate(self, session=None):
+        """
+        Drop every entry in this process and publish the invalidation to the other workers.
+
+        Args:
+            session (Optional[Session]): The session of the write. When given, the entries
+                are dropped once its transaction commits.
+        """
+        if not self.enabled:
+            return
+        if session is not None:
+            self.channel.publish(session=session)
+            on_commit(session, self._clear)
+            return
+        self._clear()
+        self.channel.publish()
+
+    def _clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: Hits, misses, current size, TTL and whether the cache is enabled.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl_seconds,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": _hit_ratio(self.hits, self.misses),
+            }
+
+class LRUCache(TTLCache):
+    """
+    TTL cache holding at most ``max_entries`` entries, evicting the least recently used one.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, channel, settle_seconds: float = 0):
+        super().__init__(ttl_seconds, channel, settle_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def lookup(self, key):
+        found, value, generation = super().lookup(key)
+        if found:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+        return found, value, generation
+
+    def store(self, key, generation, value):
+        if not self._may_store(generation):
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, generation[0], value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """
+        Drop ``key`` from this process, after the cached value has changed.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        stats = super().stats()
+        stats["max_entries"] = self.max_entries
+        return stats
+
+class Catalog:
+    """
+    Complete in-memory copy of a small table, ordered by ID.
+
+    The catalog is reloaded by its owner when ``check`` reports it stale: before the
+    first load, after ``ttl_seconds``, or once an invalidation has been published on
+    its channel by a write in any worker.
+    """
+    def __init__(self, enabled: bool, ttl_seconds: float, channel):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        self.hits = 0
+        self.misses = 0
+        self._by_id = {}
+        self._ids = []
+        self._items = []
+        self._expires_at = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        """
+        Tell whether the catalog must be reloaded.
+
+        Returns:
+            Tuple[bool, Any]: Whether the catalog is stale, and the generation to pass to
+            ``load`` along with the rows read after this call.
+        """
+        generation = self.channel.generation()
+        stale = self._expires_at is None or self._expires_at <= time.monotonic() or self._generation != generation
+        return stale, generation
+
+    def load(self, items, generation):
+        """
+        Replace the catalog content.
+
+        Args:
+            items (List): Every row of the table, each with an ``id`` attribute.
+            generation: The generation returned by ``check`` before the rows were read.
+        """
+        items = sorted(items, key=lambda item: item.id)
+        with self._lock:
+            self._items = items
+            self._ids = [item.id for item in items]
+            self._by_id = {item.id: item for item in items}
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            self._generation = generation
+        logger.info(f"Loaded {len(items)} rows into the catalog")
+
+    def get(self, item_id: int):
+        """
+        Return the row with ID ``item_id``, or None if the catalog does not hold it.
+        """
+        item = self._by_id.get(item_id)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return item
+
+    def page(self, skip: int, limit: int, after_id=None):
+        """
+        Return a page of rows ordered by ID, as ``crud._select_page`` would.
+        """
+        with self._lock:
+            items, ids = self._items, self._ids
+            self.hits += 1
+        start = 0 if after_id is None else bisect.bisect_right(ids, after_id)
+        return items[start + skip:start + skip + max(limit, 0)]
+
+    def invalidate(self, session=None):
+        """
+        Mark the catalog stale in every worker after a write to the table.
+
+        Args:
+            session (Optional[Session]): The session of the write. When given, the
+                catalog is marked stale once its transaction commits.
+        """
+        if self.enabled:
+            self.channel.publish(session=session)
+
+    def stats(self):
+        """
+        Return the catalog counters.
+
+        Returns:
+            dict: Hits, misses, current size, TTL and whether the catalog is enabled.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl_seconds,
+                "size": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": _hit_ratio(self.hits, self.misses),
+            }
+
+def _hit_ratio(hits: int, misses: int) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+# Results may be read from a replica, so fills wait for the replicas to catch up
+# with the last invalidation.
+recommendation_cache = LRUCache(
+    max_entries=config.RECOMMENDATION_CACHE_SIZE,
+    ttl_seconds=config.RECOMMENDATION_CACHE_TTL,
+    channel=create_channel(config.CACHE_INVALIDATION_CHANNEL),
+    settle_seconds=config.READ_REPLICA_LAG_SECONDS if config.DATABASE_READ_URLS else 0
+)
+
+# Locations and categories by ID. Rows are never modified once created, so the
+# entries only have to expire; there is nothing to publish to other workers.
+entity_cache = LRUCache(
+    max_entries=config.ENTITY_CACHE_SIZE,
+    ttl_seconds=config.ENTITY_CACHE_TTL,
+    channel=LocalInvalidationChannel()
+)
+
+category_catalog = Catalog(
+    enabled=config.CATEGORY_CATALOG,
+    ttl_seconds=config.CATEGORY_CATALOG_TTL,
+    channel=create_channel(config.CACHE_INVALIDATION_CHANNEL, topic="categories")
+)
@@ -0,0 +1,102 @@
+"""
+HTTP conditional requests for the GET routes.
+
+Routes compute their validators from a cheap version of the result, such as the
+count, last ID and latest updated_at of a page, never from the rendered body. A
+request whose ``If-None-Match`` (or, without it, ``If-Modified-Since``) matches is
+answered 304 Not Modified before the result is loaded. Recommendations have no
+such cheap version: their validators are computed from the ranked pairs and cached
+with them, so a match is answered without ranking while the recommendation cache
+holds the result.
+
+Entity tags are weak (``W/"..."``): the same tag covers the identity and the
+gzip-compressed representations, which are equivalent but not byte-identical.
+
+Responses carry ``Cache-Control: no-cache``: clients may keep them but must
+revalidate before reuse, since Last-Modified alone would let them guess a freshness
+lifetime.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response, status
+from typing import NamedTuple, Optional
+import hashlib
+
+class Validators(NamedTuple):
+    """
+    Entity tag and last modification time of a response.
+    """
+    etag: str
+    last_modified: Optional[datetime] = None
+
+def validators(*version, last_modified: Optional[datetime] = None) -> Validators:
+    """
+    Build the validators of a response from the values identifying its content.
+
+    Args:
+        *version: Values that change whenever the response body changes.
+        last_modified (Optional[datetime]): When the content last changed. Naive
+            datetimes are read as UTC.
+
+    Returns:
+        Validators: A weak entity tag hashed from ``version``, and ``last_modified``
+        truncated to the second.
+    """
+    digest = hashlib.blake2b(repr(version).encode(), digest_size=16).hexdigest()
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+    return Validators(f'W/"{digest}"', last_modified)
+
+def set_headers(response: Response, current: Validators) -> Response:
+    """
+    Add the ETag, Last-Modified and Cache-Control headers of ``current`` to a response.
+    """
+    response.headers["ETag"] = current.etag
+    if current.last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(current.last_modified, usegmt=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: the W/ prefixes are ignored on both sides.
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+def _not_modified_since(header: str, last_modified: Optional[datetime]) -> bool:
+    if last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+def check(request: Request, response: Response, current: Validators) -> Optional[Response]:
+    """
+    Evaluate the conditional headers of a GET request.
+
+    Args:
+        request (Request): The request.
+        response (Response): The response the route fills in; receives the validator headers.
+        current (Validators): The validators of the current result.
+
+    Returns:
+        Optional[Response]: A 304 Not Modified response when the client's copy is
+        current, None when the route must send the result.
+    """
+    set_headers(response, current)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, current.etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = if_modified_since is not None and _not_modified_since(if_modified_since, current.last_modified)
+    if not fresh:
+        return None
+    return set_headers(Response(status_code=status.HTTP_304_NOT_MODIFIED), current)
@@ -0,0 +1,185 @@
+from dotenv import load_dotenv
+import os
+
+# Load environment variables from .env file
+load_dotenv()
+
+def _get_float(name: str, default: float) -> float:
+    """
+    Read a number from the environment.
+
+    Args:
+        name (str): The environment variable name.
+        default (float): The value used when the variable is not set.
+
+    Returns:
+        float: The parsed value.
+    """
+    value = os.getenv(name)
+    return default if value is None or value == "" else float(value)
+
+def _get_int(name: str, default: int) -> int:
+    """
+    Read a whole number from the environment.
+
+    Args:
+        name (str): The environment variable name.
+        default (int): The value used when the variable is not set.
+
+    Returns:
+        int: The parsed value.
+    """
+    value = os.getenv(name)
+    return default if value is None or value == "" else int(value)
+
+def _get_bool(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean flag from the environment.
+
+    Args:
+        name (str): The environment variable name.
+        default (bool): The value used when the variable is not set.
+
+    Returns:
+        bool: True for "1", "true", "yes" or "on" (case-insensitive), False otherwise.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Apply the pending schema migrations when the application starts. Disable it when
+# migrations run as a separate deployment step (python -m app.migrations).
+MIGRATE_ON_STARTUP = _get_bool('MIGRATE_ON_STARTUP', True)
+
+# Only persist location_category rows for pairs that have been reviewed.
+# Never-reviewed pairs are derived from the locations x categories cross product.
+SPARSE_LOCATION_CATEGORY = _get_bool('SPARSE_LOCATION_CATEGORY')
+
+# Seconds a recommendation result is served from the in-process cache. 0 disables the cache.
+RECOMMENDATION_CACHE_TTL = _get_float('RECOMMENDATION_CACHE_TTL', 0)
+
+# Maximum number of recommendation results cached per worker, least recently used first out.
+RECOMMENDATION_CACHE_SIZE = _get_int('RECOMMENDATION_CACHE_SIZE', 1000)
+
+# Seconds a claimed recommendation stays leased to its explorer before others can claim it.
+RECOMMENDATION_LEASE_SECONDS = _get_float('RECOMMENDATION_LEASE_SECONDS', 1800)
+
+# How cache invalidations reach the other workers: "local" (this process only),
+# "file:<path>" (workers on the same host) or "postgres[:<channel>]" (LISTEN/NOTIFY).
+CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'local')
+
+# Serve the core endpoints with async routes on an AsyncEngine (asyncpg on PostgreSQL)
+# instead of sync routes running in the threadpool.
+ASYNC_DB = _get_bool('ASYNC_DB')
+
+# Accept single reviews into an in-memory buffer that coalesces them per pair and
+# writes them in batches, instead of writing each review in its own transaction.
+WRITE_BEHIND_ENABLED = _get_bool('WRITE_BEHIND_ENABLED')
+
+# Seconds between two flushes of the write-behind buffer.
+WRITE_BEHIND_FLUSH_INTERVAL = _get_float('WRITE_BEHIND_FLUSH_INTERVAL', 1)
+
+# Number of buffered pairs that triggers a flush before the interval elapses.
+WRITE_BEHIND_MAX_PENDING = _get_int('WRITE_BEHIND_MAX_PENDING', 1000)
+
+# Prefix of the append-only journals of accepted reviews: each worker writes <path>.<pid>,
+# and the journals of stopped workers are replayed on startup.
+WRITE_BEHIND_JOURNAL = os.getenv('WRITE_BEHIND_JOURNAL') or None
+
+# fsync the journal before acknowledging a review; concurrent reviews share one fsync.
+WRITE_BEHIND_FSYNC = _get_bool('WRITE_BEHIND_FSYNC')
+
+# Record reviews as rows of an append-only review_events table and answer 202 Accepted.
+# The last review times and the daily review counts are rolled up from the events in
+# the background. Takes precedence over WRITE_BEHIND_ENABLED.
+REVIEW_EVENTS_ENABLED = _get_bool('REVIEW_EVENTS_ENABLED')
+
+# Seconds between two rollups of the review events.
+REVIEW_ROLLUP_INTERVAL = _get_float('REVIEW_ROLLUP_INTERVAL', 1)
+
+# Maximum number of events folded by one rollup transaction.
+REVIEW_ROLLUP_BATCH_SIZE = _get_int('REVIEW_ROLLUP_BATCH_SIZE', 5000)
+
+# Seconds between two rollups of the queued location grid deltas into the map tile counts.
+GRID_ROLLUP_INTERVAL = _get_float('GRID_ROLLUP_INTERVAL', 5)
+
+# Maximum number of location grid deltas folded by one rollup transaction.
+GRID_ROLLUP_BATCH_SIZE = _get_int('GRID_ROLLUP_BATCH_SIZE', 5000)
+
+# Build list and recommendation responses from plain rows and encode them with orjson,
+# skipping ORM objects and pydantic validation. The JSON output is unchanged.
+FAST_SERIALIZATION = _get_bool('FAST_SERIALIZATION')
+
+# Responses of at least this many bytes are gzip-compressed for clients accepting it. 0 disables compression.
+GZIP_MINIMUM_SIZE = _get_int('GZIP_MINIMUM_SIZE', 1000)
+
+# Keep every category in memory, loaded at startup and reloaded after a category is
+# created (in any worker, through CACHE_INVALIDATION_CHANNEL) or after the TTL.
+CATEGORY_CATALOG = _get_bool('CATEGORY_CATALOG')
+
+# Seconds after which the category catalog is reloaded even without a write.
+CATEGORY_CATALOG_TTL = _get_float('CATEGORY_CATALOG_TTL', 300)
+
+# Maximum number of locations and categories cached by ID per worker. 0 disables the cache.
+ENTITY_CACHE_SIZE = _get_int('ENTITY_CACHE_SIZE', 0)
+
+# Seconds a location or category is served from the entity cache.
+ENTITY_CACHE_TTL = _get_float('ENTITY_CACHE_TTL', 60)
+
+# Record per-endpoint latency and SQL statistics, served in the Prometheus format at /metrics.
+METRICS_ENABLED = _get_bool('METRICS_ENABLED')
+
+# Log SQL statements slower than this many milliseconds when metrics are enabled. 0 disables the log.
+SLOW_QUERY_MS = _get_float('SLOW_QUERY_MS', 200)
+
+# Connections kept open by the pool of each engine, primary and replicas.
+DB_POOL_SIZE = _get_int('DB_POOL_SIZE', 5)
+
+# Connections each engine may open beyond DB_POOL_SIZE under load; they are closed when returned.
+DB_MAX_OVERFLOW = _get_int('DB_MAX_OVERFLOW', 10)
+
+# Seconds a request waits for a pooled connection before its query fails.
+DB_POOL_TIMEOUT = _get_float('DB_POOL_TIMEOUT', 30)
+
+# Seconds after which a pooled connection is closed and replaced.
+DB_POOL_RECYCLE = _get_int('DB_POOL_RECYCLE', 1800)
+
+# API requests running at once per worker. Further requests wait in the admission queue,
+# cheap reads first, until their route's deadline. 0 disables admission control.
+ADMISSION_MAX_CONCURRENCY = _get_int('ADMISSION_MAX_CONCURRENCY', 0)
+
+# API requests waiting for admission per worker. Further requests are answered 503.
+ADMISSION_QUEUE_SIZE = _get_int('ADMISSION_QUEUE_SIZE', 100)
+
+# Seconds sent in the Retry-After header of the 503 responses of admission control.
+ADMISSION_RETRY_AFTER = _get_float('ADMISSION_RETRY_AFTER', 1)
+
+# Comma-separated URLs of read replicas serving the GET endpoints, in turn. Writes, and
+# reads sending the X-Read-Your-Writes header, go to DATABASE_URL.
+DATABASE_READ_URLS = [url.strip() for url in os.getenv('DATABASE_READ_URLS', '').split(',') if url.strip()]
+
+# Seconds a read replica that failed is skipped before being tried again.
+READ_REPLICA_RETRY_SECONDS = _get_float('READ_REPLICA_RETRY_SECONDS', 30)
+
+# Seconds the replicas may lag behind the primary: results read after an invalidation
+# are only cached once this long has passed since it.
+READ_REPLICA_LAG_SECONDS = _get_float('READ_REPLICA_LAG_SECONDS', 1)
+
+# Recommendation ranking: "sql" (ordered in the database) or "vectorized" (NumPy
+# scoring of an in-memory snapshot of every location-category pair, see app/scoring.py).
+RECOMMENDATION_ENGINE = os.getenv('RECOMMENDATION_ENGINE', 'sql')
+
+# Weights of the vectorized engine multiplying the staleness of a category's pairs,
+# as "category_id:weight,...". Unlisted categories weigh 1.
+SCORING_CATEGORY_WEIGHTS = os.getenv('SCORING_CATEGORY_WEIGHTS', '')
+
+# Days of staleness the vectorized engine subtracts per kilometer from the center of a circular region.
+SCORING_DISTANCE_WEIGHT = _get_float('SCORING_DISTANCE_WEIGHT', 0)
+
+# Minimum seconds between two reloads of the scoring snapshot after new locations or categories,
+# or writes by other workers announced without their pairs (see app/scoring.py).
+SCORING_RELOAD_INTERVAL = _get_float('SCORING_RELOAD_INTERVAL', 5)
+
+# Seconds after which the scoring snapshot is reloaded even without a write.
+SCORING_SNAPSHOT_TTL = _get_float('SCORING_SNAPSHOT_TTL', 300)
@@ -1,41 +1,555 @@
-from sqlite3 import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
-from . import models, schemas
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.dialects import postgresql, sqlite
+from . import cache, config, geo, models, schemas, scoring
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import Date, and_, case, delete, exists, func, insert, literal, null, or_, select, true, tuple_, update
 from fastapi import HTTPException, status
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import logging
+import math
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pairs not reviewed for this long are recommended for a new review.
+RECOMMENDATION_STALE_AFTER = timedelta(days=30)
+
+# Number of recommendations returned per request.
+RECOMMENDATION_LIMIT = 10
+
+# Days of review counts kept in the location grid: older reviews are stale either way.
+GRID_REVIEW_DAYS = RECOMMENDATION_STALE_AFTER.days + 1
+
+# Periods the daily review counts can be summed over.
+REVIEW_COUNT_PERIODS = ('day', 'week', 'month')
+
+# Rows per statement when adding to counter tables such as the location grid.
+COUNTER_UPSERT_BATCH_SIZE = 1000
+
+# Most IDs or location-category pairs resolved by one batch lookup.
+MAX_LOOKUP_IDS = 1000
+
+# Rankings run by one claim when concurrent claims lease its candidates first.
+CLAIM_ATTEMPTS = 3
+
+class RecommendationScope(NamedTuple):
+    """
+    Restriction of the recommendations to the locations of a region and to a category.
+
+    ``bboxes`` select the candidate locations through the geohash index. With
+    ``center`` (latitude, longitude) and ``radius_m``, candidates outside that
+    circle are then dropped. The default scope ranks every pair.
+    """
+    bboxes: Tuple[geo.BoundingBox, ...] = ()
+    center: Optional[Tuple[float, float]] = None
+    radius_m: Optional[float] = None
+    category_id: Optional[int] = None
+    limit: int = RECOMMENDATION_LIMIT
+
+def _select_page(model, skip: int, limit: int, after_id: Optional[int], columns=None):
+    """
+    Build a page of ``model`` rows ordered by ID, starting after ``after_id`` when given.
+
+    With ``columns``, the page holds plain rows of those columns instead of ORM objects.
+    """
+    statement = select(model) if columns is None else select(*columns)
+    if after_id is not None:
+        statement = statement.where(model.id > after_id)
+    return statement.order_by(model.id).offset(skip).limit(limit)
+
+def _schema_columns(model, schema):
+    """
+    Return the columns of ``model`` backing the fields of ``schema``, in field order.
+    """
+    return [getattr(model, name) for name in schema.model_fields]
+
+def get_page_rows(db: Session, model, schema, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Retrieve a page of records as plain rows, without loading ORM objects.
+
+    Args:
+        db (Session): The database session.
+        model: The mapped class to read, such as models.Location.
+        schema: The response schema whose fields are selected, such as schemas.Location.
+        skip (int): Number of records to skip.
+        limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+
+    Returns:
+        List[Row]: Rows holding the fields of ``schema`` in declaration order, ordered by ID.
+    """
+    columns = _schema_columns(model, schema)
+    return db.execute(_select_page(model, skip, limit, after_id, columns=columns)).all()
+
+def _select_page_version(model, skip: int, limit: int, after_id: Optional[int]):
+    """
+    Build a query for the number of rows, last ID and latest updated_at of a page.
+
+    Pages are ranges of IDs and rows are only inserted with higher IDs, so these
+    three values change whenever the content of the page does.
+    """
+    page = _select_page(model, skip, limit, after_id, columns=[model.id, model.updated_at]).subquery()
+    return select(func.count(), func.max(page.c.id), func.max(page.c.updated_at))
+
+def get_page_version(db: Session, model, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Identify the content of a page of records without loading it.
+
+    Args:
+        db (Session): The database session.
+        model: The mapped class of the page, such as models.Location.
+        skip (int): Number of records to skip.
+        limit (int): Maximum number of records in the page.
+        after_id (Optional[int]): Only count records with an ID greater than this one.
+
+    Returns:
+        Row: The number of records in the page, their highest ID and latest updated_at.
+    """
+    return db.execute(_select_page_version(model, skip, limit, after_id)).one()
+
+def _get_through_entity_cache(db: Session, model, schema, entity_id: int):
+    """
+    Read a row by ID through the entity cache.
+
+    Only rows that exist are cached, so creating a row never leaves a stale entry.
+    Cached rows are returned as ``schema`` objects, detached from any session.
+    """
+    key = (model.__tablename__, entity_id)
+    found, entity, generation = cache.entity_cache.lookup(key)
+    if found:
+        return entity
+
+    entity = db.query(model).filter(model.id == entity_id).first()
+    if entity is not None and cache.entity_cache.enabled:
+        entity = schema.model_validate(entity)
+        cache.entity_cache.store(key, generation, entity)
+    return entity
+
+def _get_many_through_entity_cache(db: Session, model, schema, ids: List[int]):
+    """
+    Read rows by ID through the entity cache, with one query for the IDs not cached.
+
+    Returns:
+        Dict[int, object]: The rows that exist, by ID.
+    """
+    found = {}
+    generations = {}
+    for entity_id in set(ids):
+        hit, entity, generation = cache.entity_cache.lookup((model.__tablename__, entity_id))
+        if hit:
+            found[entity_id] = entity
+        else:
+            generations[entity_id] = generation
+
+    if generations:
+        for entity in db.scalars(select(model).where(model.id.in_(generations))):
+            entity_id = entity.id
+            if cache.entity_cache.enabled:
+                entity = schema.model_validate(entity)
+                cache.entity_cache.store((model.__tablename__, entity_id), generations[entity_id], entity)
+            found[entity_id] = entity
+    return found
+
 def get_location(db: Session, location_id: int):
     """
-    Retrieve a location by its ID.
+    Retrieve a location by its ID, through the entity cache when it is enabled.
 
     Args:
         db (Session): The database session.
         location_id (int): The ID of the location to retrieve.
 
     Returns:
-        models.Location: The location object if found, None otherwise.
+        models.Location: The location object if found, None otherwise. A
+        schemas.Location is returned instead when the entity cache is enabled.
     """
-    return db.query(models.Location).filter(models.Location.id == location_id).first()
+    return _get_through_entity_cache(db, models.Location, schemas.Location, location_id)
 
-def get_locations(db: Session, skip: int = 0, limit: int = 100):
+def get_locations_by_ids(db: Session, location_ids: List[int]):
     """
-    Retrieve a list of locations with pagination.
+    Retrieve several locations by ID in one query.
+
+    Args:
+        db (Session): The database session.
+        location_ids (List[int]): The IDs of the locations to retrieve.
+
+    Returns:
+        List[Optional[models.Location]]: The location of each ID, in the order of
+        ``location_ids``, None where no location has that ID. Locations served from
+        the entity cache are schemas.Location objects.
+    """
+    found = _get_many_through_entity_cache(db, models.Location, schemas.Location, location_ids)
+    return [found.get(location_id) for location_id in location_ids]
+
+def get_locations(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Retrieve a list of locations with offset or keyset pagination.
 
     Args:
         db (Session): The database session.
         skip (int): Number of records to skip.
         limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+            Paging with the last ID of the previous page costs the same at any depth.
+
+    Returns:
+        List[models.Location]: A list of location objects, ordered by ID.
+    """
+    return db.scalars(_select_page(models.Location, skip, limit, after_id)).all()
+
+def _in_boxes(bboxes):
+    """
+    Build the condition selecting the locations inside a set of bounding boxes.
+
+    Candidates are selected through the geohash prefix index and then narrowed
+    to the exact boxes on latitude and longitude.
+    """
+    cells = geo.covering_cells(bboxes)
+    return and_(
+        or_(*[models.Location.geohash.like(f"{cell}%") for cell in cells]),
+        or_(*[
+            and_(
+                models.Location.longitude.between(min_lon, max_lon),
+                models.Location.latitude.between(min_lat, max_lat)
+            )
+            for min_lon, min_lat, max_lon, max_lat in bboxes
+        ])
+    )
+
+def _query_locations_in_boxes(db: Session, bboxes):
+    """
+    Build a query for the locations inside a set of bounding boxes.
+    """
+    return db.query(models.Location).filter(_in_boxes(bboxes))
+
+def _approximate_distance(latitude: float, longitude: float):
+    """
+    Build an expression ordering locations by their distance to a point.
+
+    The squared equirectangular distance in degrees is monotonic enough with the
+    haversine distance over a search radius to rank candidates in the database.
+    """
+    delta_longitude = models.Location.longitude - longitude
+    delta_longitude = case(
+        (delta_longitude > 180, delta_longitude - 360),
+        (delta_longitude < -180, delta_longitude + 360),
+        else_=delta_longitude
+    ) * math.cos(math.radians(latitude))
+    delta_latitude = models.Location.latitude - latitude
+    return delta_latitude * delta_latitude + delta_longitude * delta_longitude
+
+def get_locations_nearby(db: Session, latitude: float, longitude: float, radius_m: float, limit: int = 100):
+    """
+    Retrieve the locations within a radius of a point, nearest first.
+
+    The database ranks the candidates of the covering boxes by approximate distance
+    and returns twice ``limit`` of them, which are refined with the haversine distance.
+    The memory used does not depend on how many locations the radius covers.
+
+    Args:
+        db (Session): The database session.
+        latitude (float): Latitude of the search center.
+        longitude (float): Longitude of the search center.
+        radius_m (float): Search radius in meters.
+        limit (int): Maximum number of locations to return.
+
+    Returns:
+        List[schemas.NearbyLocation]: The matching locations with their distance to the center.
+    """
+    candidates = _query_locations_in_boxes(db, geo.bbox_around(latitude, longitude, radius_m)).order_by(
+        _approximate_distance(latitude, longitude), models.Location.id
+    ).limit(2 * limit).all()
+
+    nearby = []
+    for location in candidates:
+        distance = geo.haversine_m(latitude, longitude, location.latitude, location.longitude)
+        if distance <= radius_m:
+            nearby.append((distance, location))
+    nearby.sort(key=lambda item: (item[0], item[1].id))
+
+    return [
+        schemas.NearbyLocation(**schemas.Location.model_validate(location).model_dump(), distance_m=distance)
+        for distance, location in nearby[:limit]
+    ]
+
+def get_locations_within(db: Session, bbox, limit: int = 100):
+    """
+    Retrieve the locations inside a bounding box.
+
+    Args:
+        db (Session): The database session.
+        bbox (geo.BoundingBox): The box as (min_lon, min_lat, max_lon, max_lat). A box with
+            min_lon > max_lon crosses the antimeridian.
+        limit (int): Maximum number of locations to return.
+
+    Returns:
+        List[models.Location]: The locations inside the box, ordered by ID.
+    """
+    return _query_locations_in_boxes(db, geo.split_bbox(bbox)).order_by(models.Location.id).limit(limit).all()
+
+def _fan_out_location_categories(location_id, category_id):
+    """
+    Build an INSERT ... SELECT adding a location_category row per selected pair.
+
+    One side of the pair is a literal ID, the other a column of the table to fan
+    out over, so the rows are generated by the database without loading them.
+    """
+    now = datetime.now(timezone.utc)
+    pairs = select(
+        location_id,
+        category_id,
+        literal(now, type_=models.LocationCategory.created_at.type),
+        literal(now, type_=models.LocationCategory.updated_at.type)
+    )
+    return insert(models.LocationCategory).from_select(
+        ['location_id', 'category_id', 'created_at', 'updated_at'],
+        pairs
+    )
+
+def _add_to_counters(db: Session, model, rows, counters):
+    """
+    Add the ``counters`` of ``rows`` to the matching rows of ``model``, inserting missing ones.
+
+    Rows are written in primary key order, so concurrent writers lock them in the
+    same order and cannot deadlock each other.
+    """
+    keys = [column.key for column in model.__table__.primary_key.columns]
+    rows = sorted(rows, key=lambda row: tuple(row[key] for key in keys))
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    for start in range(0, len(rows), COUNTER_UPSERT_BATCH_SIZE):
+        statement = dialect_insert(model).values(rows[start:start + COUNTER_UPSERT_BATCH_SIZE])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: getattr(model, name) + getattr(statement.excluded, name) for name in counters}
+        ))
+
+def _queue_grid_deltas(db: Session, deltas):
+    """
+    Queue changes to the location grid for the grid rollup, without committing.
+
+    Args:
+        db (Session): The database session.
+        deltas: Mapping of (finest cell, day or None) to the [locations, longitude_sum,
+            latitude_sum, pairs] added to them.
+    """
+    rows = [
+        {'cell': cell, 'day': day, 'locations': locations, 'longitude_sum': longitude_sum,
+         'latitude_sum': latitude_sum, 'pairs': pairs}
+        for (cell, day), (locations, longitude_sum, latitude_sum, pairs) in deltas.items()
+        if locations or pairs
+    ]
+    if rows:
+        db.execute(insert(models.LocationGridDelta).values(rows))
+
+def _add_locations_to_grid(db: Session, locations):
+    """
+    Queue new locations for the location grid, without committing.
+
+    Args:
+        db (Session): The database session.
+        locations: (geohash, longitude, latitude) of each new location.
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0.0, 0])
+    for geohash, longitude, latitude in locations:
+        if geohash is None:
+            continue
+        delta = deltas[(geohash[:geo.GRID_PRECISIONS[-1]], None)]
+        delta[0] += 1
+        delta[1] += longitude
+        delta[2] += latitude
+    _queue_grid_deltas(db, deltas)
+
+def _review_day(reviewed_at: datetime) -> date:
+    """
+    Return the UTC day of a review time, reading naive times as UTC.
+    """
+    if reviewed_at.tzinfo is None:
+        return reviewed_at.date()
+    return reviewed_at.astimezone(timezone.utc).date()
+
+def _move_reviews_in_grid(db: Session, changes):
+    """
+    Queue the move of reviewed pairs to the day of their new review in the grid, without committing.
+
+    Days before the grid window are neither counted nor uncounted.
+
+    Args:
+        db (Session): The database session.
+        changes: (geohash, previous last_reviewed or None, new last_reviewed) of each pair.
+    """
+    first_day = datetime.now(timezone.utc).date() - timedelta(days=GRID_REVIEW_DAYS)
+    deltas = defaultdict(lambda: [0, 0.0, 0.0, 0])
+    for geohash, previous, current in changes:
+        previous_day = _review_day(previous) if previous is not None else None
+        current_day = _review_day(current)
+        if geohash is None or previous_day == current_day:
+            continue
+        cell = geohash[:geo.GRID_PRECISIONS[-1]]
+        if previous_day is not None and previous_day >= first_day:
+            deltas[(cell, previous_day)][3] -= 1
+        if current_day >= first_day:
+            deltas[(cell, current_day)][3] += 1
+    _queue_grid_deltas(db, deltas)
+
+def roll_up_location_grid(db: Session, batch_size: int = 5000):
+    """
+    Fold the next queued deltas into the location grid, at every precision.
+
+    The deltas folded are deleted in the same transaction, so each is counted once
+    whatever the order their writes committed in. Concurrent rollups skip the deltas
+    locked by each other. Days that left the grid window are purged.
+
+    Args:
+        db (Session): The database session.
+        batch_size (int): Maximum number of deltas to fold.
+
+    Returns:
+        int: The number of deltas folded.
+
+    Raises:
+        HTTPException: If there's an error rolling up the grid.
+    """
+    try:
+        first_day = datetime.now(timezone.utc).date() - timedelta(days=GRID_REVIEW_DAYS)
+        db.execute(delete(models.LocationGridReviewDay).where(models.LocationGridReviewDay.day < first_day))
+        deltas = db.execute(select(
+            models.LocationGridDelta.id,
+            models.LocationGridDelta.cell,
+            models.LocationGridDelta.locations,
+            models.LocationGridDelta.longitude_sum,
+            models.LocationGridDelta.latitude_sum,
+            models.LocationGridDelta.day,
+            models.LocationGridDelta.pairs
+        ).order_by(models.LocationGridDelta.id).limit(batch_size).with_for_update(skip_locked=True)).all()
+
+        cells = defaultdict(lambda: [0, 0.0, 0.0])
+        days = defaultdict(int)
+        for delta in deltas:
+            for precision in geo.GRID_PRECISIONS:
+                cell = delta.cell[:precision]
+                if delta.locations:
+                    total = cells[(precision, cell)]
+                    total[0] += delta.locations
+                    total[1] += delta.longitude_sum
+                    total[2] += delta.latitude_sum
+                if delta.day is not None and delta.day >= first_day:
+                    days[(precision, cell, delta.day)] += delta.pairs
+
+        _add_to_counters(db, models.LocationGridCell, [
+            {'precision': precision, 'cell': cell, 'locations': count, 'longitude_sum': longitude_sum, 'latitude_sum': latitude_sum}
+            for (precision, cell), (count, longitude_sum, latitude_sum) in cells.items()
+        ], ['locations', 'longitude_sum', 'latitude_sum'])
+        _add_to_counters(db, models.LocationGridReviewDay, [
+            {'precision': precision, 'cell': cell, 'day': day, 'pairs': pairs}
+            for (precision, cell, day), pairs in days.items() if pairs
+        ], ['pairs'])
+        if deltas:
+            db.execute(delete(models.LocationGridDelta).where(
+                models.LocationGridDelta.id.in_([delta.id for delta in deltas])
+            ))
+        db.commit()
+        return len(deltas)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error rolling up the location grid: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error rolling up the location grid")
+
+def rebuild_location_grid(db: Session):
+    """
+    Recompute the location grid from the locations and location categories.
+
+    The aggregates are computed by the database, one INSERT ... SELECT per precision.
+    The queued deltas are dropped, since the rebuild counts the writes they come from.
+
+    Args:
+        db (Session): The database session.
+
+    Raises:
+        HTTPException: If there's an error rebuilding the grid.
+    """
+    first_day = datetime.now(timezone.utc).date() - timedelta(days=GRID_REVIEW_DAYS)
+    last_reviewed = models.LocationCategory.last_reviewed
+    if db.get_bind().dialect.name == 'postgresql':
+        last_reviewed = func.timezone('UTC', last_reviewed)
+    day = func.date(last_reviewed, type_=Date)
+    try:
+        db.execute(delete(models.LocationGridDelta))
+        db.execute(delete(models.LocationGridReviewDay))
+        db.execute(delete(models.LocationGridCell))
+        for precision in geo.GRID_PRECISIONS:
+            cell = func.substr(models.Location.geohash, 1, precision)
+            db.execute(insert(models.LocationGridCell).from_select(
+                ['precision', 'cell', 'locations', 'longitude_sum', 'latitude_sum'],
+                select(
+                    literal(precision), cell, func.count(),
+                    func.sum(models.Location.longitude), func.sum(models.Location.latitude)
+                ).where(models.Location.geohash.isnot(None)).group_by(cell)
+            ))
+            db.execute(insert(models.LocationGridReviewDay).from_select(
+                ['precision', 'cell', 'day', 'pairs'],
+                select(literal(precision), cell, day, func.count())
+                .select_from(models.LocationCategory)
+                .join(models.Location, models.Location.id == models.LocationCategory.location_id)
+                .where(models.Location.geohash.isnot(None), day >= first_day)
+                .group_by(cell, day)
+            ))
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error rebuilding the location grid: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error rebuilding the location grid")
+
+def get_location_tile(db: Session, z: int, x: int, y: int, include_stale: bool = False):
+    """
+    Aggregate the locations of a map tile per grid cell.
+
+    Args:
+        db (Session): The database session.
+        z (int): Zoom level.
+        x (int): Tile column.
+        y (int): Tile row.
+        include_stale (bool): Also count the pairs of each cell due for a review.
+            Pairs are counted by the day of their last review, so a pair reviewed on
+            the threshold day counts as fresh for the whole day.
 
     Returns:
-        List[models.Location]: A list of location objects.
+        schemas.LocationTile: The non-empty cells of the tile with their count and centroid.
     """
-    return db.query(models.Location).offset(skip).limit(limit).all()
+    precision, cells = geo.tile_cells(z, x, y)
+    rows = db.execute(select(
+        models.LocationGridCell.cell,
+        models.LocationGridCell.locations,
+        models.LocationGridCell.longitude_sum,
+        models.LocationGridCell.latitude_sum
+    ).where(
+        models.LocationGridCell.precision == precision,
+        models.LocationGridCell.cell.in_(cells),
+        models.LocationGridCell.locations > 0
+    ).order_by(models.LocationGridCell.cell)).all()
+
+    fresh_pairs, category_count = {}, 0
+    if include_stale and rows:
+        threshold_day = (datetime.now(timezone.utc) - RECOMMENDATION_STALE_AFTER).date()
+        fresh_pairs = dict(db.execute(select(
+            models.LocationGridReviewDay.cell, func.sum(models.LocationGridReviewDay.pairs)
+        ).where(
+            models.LocationGridReviewDay.precision == precision,
+            models.LocationGridReviewDay.cell.in_([row.cell for row in rows]),
+            models.LocationGridReviewDay.day >= threshold_day
+        ).group_by(models.LocationGridReviewDay.cell)).all())
+        category_count = db.scalar(select(func.count(models.Category.id)))
+
+    return schemas.LocationTile(z=z, x=x, y=y, precision=precision, cells=[
+        schemas.LocationTileCell(
+            geohash=row.cell,
+            locations=row.locations,
+            longitude=row.longitude_sum / row.locations,
+            latitude=row.latitude_sum / row.locations,
+            stale_pairs=row.locations * category_count - (fresh_pairs.get(row.cell) or 0) if include_stale else None
+        )
+        for row in rows
+    ])
 
 def create_location(db: Session, location: schemas.LocationCreate):
     """
@@ -54,16 +568,18 @@ def create_location(db: Session, location: schemas.LocationCreate):
     try:
         db_location = models.Location(**location.dict())
         db.add(db_location)
-        db.commit()
-        db.refresh(db_location)
+        db.flush()
 
-        categories = db.query(models.Category).all()
-        db_location_categories = [
-            models.LocationCategory(location_id=db_location.id, category_id=category.id)
-            for category in categories
-        ]
-        db.bulk_save_objects(db_location_categories)
+        if not config.SPARSE_LOCATION_CATEGORY:
+            db.execute(_fan_out_location_categories(
+                location_id=literal(db_location.id),
+                category_id=models.Category.id
+            ))
+        _add_locations_to_grid(db, [(db_location.geohash, db_location.longitude, db_location.latitude)])
+        cache.recommendation_cache.invalidate(db)
+        scoring.engine.invalidate(db)
         db.commit()
+        db.refresh(db_location)
 
         return db_location
     except SQLAlchemyError as e:
@@ -71,32 +587,139 @@ def create_location(db: Session, location: schemas.LocationCreate):
         logger.error(f"Error creating location: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creating location")
 
+def stream_rows(db: Session, columns, order_by, batch_size: int = 1000):
+    """
+    Stream the rows of a table in batches through a server-side cursor.
+
+    Only ``batch_size`` rows are held in memory at a time, whatever the table size.
+
+    Args:
+        db (Session): The database session. It must stay open while the batches are consumed.
+        columns (List[Column]): The columns to select.
+        order_by (Column): The column to order the rows by.
+        batch_size (int): Number of rows fetched per batch.
+
+    Yields:
+        List[Row]: Batches of at most ``batch_size`` rows.
+    """
+    result = db.execute(select(*columns).order_by(order_by).execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+def get_category_catalog(db: Session):
+    """
+    Return the category catalog, reloading it first if it is stale.
+
+    Args:
+        db (Session): The database session used for reloading.
+
+    Returns:
+        cache.Catalog: The up-to-date catalog, or None when it is disabled.
+    """
+    catalog = cache.category_catalog
+    if not catalog.enabled:
+        return None
+    stale, generation = catalog.check()
+    if stale:
+        categories = db.scalars(select(models.Category).order_by(models.Category.id)).all()
+        catalog.load([schemas.Category.model_validate(category) for category in categories], generation)
+    return catalog
+
+def _page_version(items):
+    """
+    Return the version of a page held in memory, as ``get_page_version`` computes it.
+    """
+    return (
+        len(items),
+        max((item.id for item in items), default=None),
+        max((item.updated_at for item in items), default=None)
+    )
+
+def get_category_page_version(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Identify the content of a page of categories without rendering it.
+
+    With the category catalog enabled the version is taken from the catalog, kept
+    current by its invalidation channel, and no query is run.
+
+    Args:
+        db (Session): The database session.
+        skip (int): Number of records to skip.
+        limit (int): Maximum number of records in the page.
+        after_id (Optional[int]): Only count records with an ID greater than this one.
+
+    Returns:
+        Tuple: The number of categories in the page, their highest ID and latest updated_at.
+    """
+    catalog = get_category_catalog(db)
+    if catalog is not None:
+        return _page_version(catalog.page(skip, limit, after_id))
+    return get_page_version(db, models.Category, skip=skip, limit=limit, after_id=after_id)
+
 def get_category(db: Session, category_id: int):
     """
-    Retrieve a category by its ID.
+    Retrieve a category by its ID, from the category catalog or the entity cache when enabled.
 
     Args:
         db (Session): The database session.
         category_id (int): The ID of the category to retrieve.
 
     Returns:
-        models.Category: The category object if found, None otherwise.
+        models.Category: The category object if found, None otherwise. A
+        schemas.Category is returned instead when it comes from a cache.
+    """
+    catalog = get_category_catalog(db)
+    if catalog is not None:
+        category = catalog.get(category_id)
+        if category is not None:
+            return category
+    return _get_through_entity_cache(db, models.Category, schemas.Category, category_id)
+
+def get_categories_by_ids(db: Session, category_ids: List[int]):
+    """
+    Retrieve several categories by ID, from the category catalog when enabled or else
+    in one query.
+
+    Args:
+        db (Session): The database session.
+        category_ids (List[int]): The IDs of the categories to retrieve.
+
+    Returns:
+        List[Optional[models.Category]]: The category of each ID, in the order of
+        ``category_ids``, None where no category has that ID. Categories served from
+        a cache are schemas.Category objects.
     """
-    return db.query(models.Category).filter(models.Category.id == category_id).first()
+    found = {}
+    catalog = get_category_catalog(db)
+    if catalog is not None:
+        for category_id in set(category_ids):
+            category = catalog.get(category_id)
+            if category is not None:
+                found[category_id] = category
+    missing = [category_id for category_id in category_ids if category_id not in found]
+    if missing:
+        found.update(_get_many_through_entity_cache(db, models.Category, schemas.Category, missing))
+    return [found.get(category_id) for category_id in category_ids]
 
-def get_categories(db: Session, skip: int = 0, limit: int = 100):
+def get_categories(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
     """
-    Retrieve a list of categories with pagination.
+    Retrieve a list of categories with offset or keyset pagination.
 
     Args:
         db (Session): The database session.
         skip (int): Number of records to skip.
         limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+            Paging with the last ID of the previous page costs the same at any depth.
 
     Returns:
-        List[models.Category]: A list of category objects.
+        List[models.Category]: A list of category objects, ordered by ID. They are
+        schemas.Category objects when served from the category catalog.
     """
-    return db.query(models.Category).offset(skip).limit(limit).all()
+    catalog = get_category_catalog(db)
+    if catalog is not None:
+        return catalog.page(skip, limit, after_id)
+    return db.scalars(_select_page(models.Category, skip, limit, after_id)).all()
 
 def create_category(db: Session, category: schemas.CategoryCreate):
     """
@@ -120,16 +743,18 @@ def create_category(db: Session, category: schemas.CategoryCreate):
 
         db_category = models.Category(**category.dict())
         db.add(db_category)
-        db.commit()
-        db.refresh(db_category)
+        db.flush()
 
-        locations = db.query(models.Location).all()
-        db_location_categories = [
-            models.LocationCategory(location_id=location.id, category_id=db_category.id)
-            for location in locations
-        ]
-        db.bulk_save_objects(db_location_categories)
+        if not config.SPARSE_LOCATION_CATEGORY:
+            db.execute(_fan_out_location_categories(
+                location_id=models.Location.id,
+                category_id=literal(db_category.id)
+            ))
+        cache.recommendation_cache.invalidate(db)
+        cache.category_catalog.invalidate(db)
+        scoring.engine.invalidate(db)
         db.commit()
+        db.refresh(db_category)
 
         return db_category
     except IntegrityError as e:
@@ -157,44 +782,512 @@ def create_or_update_review(db: Session, review: schemas.ReviewCreate):
     """
     try:
         now = datetime.now(timezone.utc)
-        db_review = db.query(models.Review).filter(
+        _write_review(db, review, now)
+        cache.recommendation_cache.invalidate(db)
+        scoring.engine.record_reviews({(review.location_id, review.category_id): now}, db)
+        db.commit()
+        db_review = db.scalar(select(models.Review).where(
             models.Review.location_id == review.location_id,
             models.Review.category_id == review.category_id
-        ).first()
+        ))
 
-        if db_review:
-            db_review.last_reviewed = now
-        else:
-            db_review = models.Review(
-                location_id=review.location_id,
-                category_id=review.category_id,
-                last_reviewed=now
-            )
-            db.add(db_review)
+        return db_review
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error creating or updating review: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creating or updating review")
 
-        db_location_category = db.query(models.LocationCategory).filter(
-            models.LocationCategory.location_id == review.location_id,
-            models.LocationCategory.category_id == review.category_id
-        ).first()
+def _set_last_reviewed(db: Session, pair: Tuple[int, int], now: datetime):
+    """
+    Set the last_reviewed of an existing location category, without committing.
 
-        if db_location_category:
-            db_location_category.last_reviewed = now
-        else:
-            db_location_category = models.LocationCategory(
-                location_id=review.location_id,
-                category_id=review.category_id,
-                last_reviewed=now
-            )
-            db.add(db_location_category)
+    On PostgreSQL this is a single UPDATE ... FROM (SELECT ... FOR UPDATE) RETURNING,
+    which returns the values the row held once locked. SQLite cannot return the
+    columns of a FROM clause, but it serializes writers, so the row is read first.
+
+    Returns:
+        Optional[Row]: The previous last_reviewed and the geohash of the location,
+        or None if the pair has no location category.
+    """
+    table = models.LocationCategory.__table__
+    current = select(table.c.id, table.c.last_reviewed, models.Location.geohash).join(
+        models.Location, models.Location.id == table.c.location_id
+    ).where(
+        table.c.location_id == pair[0], table.c.category_id == pair[1]
+    ).with_for_update(of=table)
+    if db.get_bind().dialect.name != 'postgresql':
+        row = db.execute(current).first()
+        if row is not None:
+            db.execute(update(table).where(table.c.id == row.id).values(last_reviewed=now, updated_at=now))
+        return row
+
+    previous = current.subquery()
+    return db.execute(update(table).where(table.c.id == previous.c.id).values(
+        last_reviewed=now, updated_at=now
+    ).returning(previous.c.last_reviewed, previous.c.geohash)).first()
+
+def _write_review(db: Session, review: schemas.ReviewCreate, now: datetime):
+    """
+    Upsert the review and location category of a pair reviewed at ``now``, move it in
+    the grid and complete its recommendation lease, without committing.
+
+    The review is upserted with INSERT ... ON CONFLICT like the batch path. The
+    location category is updated in the statement that reads its previous review
+    time, and only inserted when missing, so concurrent first reviews of a pair
+    both succeed and move it in the grid once.
+    """
+    pair = (review.location_id, review.category_id)
+    db.execute(_upsert_last_reviewed(db, models.Review, [{
+        'location_id': review.location_id,
+        'category_id': review.category_id,
+        'last_reviewed': now,
+        'created_at': now,
+        'updated_at': now,
+    }]))
+
+    current = _set_last_reviewed(db, pair, now)
+    if current is None:
+        dialect_insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+        inserted = db.execute(dialect_insert(models.LocationCategory).values(
+            location_id=review.location_id, category_id=review.category_id,
+            last_reviewed=now, created_at=now, updated_at=now
+        ).on_conflict_do_nothing(
+            index_elements=[models.LocationCategory.location_id, models.LocationCategory.category_id]
+        ).returning(models.LocationCategory.id)).first()
+        # Inserted meanwhile by a concurrent first review, committed by now
+        current = _set_last_reviewed(db, pair, now) if inserted is None else None
+
+    if current is not None:
+        previous, geohash = current.last_reviewed, current.geohash
+    else:
+        previous = None
+        geohash = db.scalar(select(models.Location.geohash).where(models.Location.id == review.location_id))
+    _move_reviews_in_grid(db, [(geohash, previous, now)])
+    _complete_leases(db, [pair])
+
+def _upsert_last_reviewed(db: Session, model, rows):
+    """
+    Build an INSERT ... ON CONFLICT (location_id, category_id) DO UPDATE for ``model``.
+
+    Existing rows keep the later of their current and incoming last_reviewed, so
+    replaying an older review never moves a pair back in time.
+    """
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    statement = dialect_insert(model).values(rows)
+    incoming = statement.excluded.last_reviewed
+    return statement.on_conflict_do_update(
+        index_elements=[model.location_id, model.category_id],
+        set_={
+            'last_reviewed': case(
+                (or_(model.last_reviewed.is_(None), incoming > model.last_reviewed), incoming),
+                else_=model.last_reviewed
+            ),
+            'updated_at': statement.excluded.updated_at,
+        }
+    )
+
+def _lock_last_reviewed(db: Session, pairs: List[Tuple[int, int]], now: datetime):
+    """
+    Lock the location categories of ``pairs`` and return their last_reviewed, without committing.
+
+    Missing location categories are inserted first, never reviewed, so that concurrent
+    first reviews of a pair wait for each other instead of both reading no previous
+    review. Rows are locked in pair order to keep concurrent batches from deadlocking.
+
+    Returns:
+        Dict[Tuple[int, int], Optional[datetime]]: The last_reviewed of each pair.
+    """
+    pairs = sorted(set(pairs))
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    db.execute(dialect_insert(models.LocationCategory).values([
+        {'location_id': location_id, 'category_id': category_id, 'created_at': now, 'updated_at': now}
+        for location_id, category_id in pairs
+    ]).on_conflict_do_nothing(
+        index_elements=[models.LocationCategory.location_id, models.LocationCategory.category_id]
+    ))
+    return {
+        (location_id, category_id): last_reviewed
+        for location_id, category_id, last_reviewed in db.execute(select(
+            models.LocationCategory.location_id,
+            models.LocationCategory.category_id,
+            models.LocationCategory.last_reviewed
+        ).where(
+            tuple_(models.LocationCategory.location_id, models.LocationCategory.category_id).in_(pairs)
+        ).order_by(
+            models.LocationCategory.location_id, models.LocationCategory.category_id
+        ).with_for_update())
+    }
+
+def _complete_leases(db: Session, pairs: List[Tuple[int, int]]):
+    """
+    Delete the recommendation leases of reviewed pairs, without committing.
+    """
+    if pairs:
+        db.execute(delete(models.RecommendationLease).where(
+            tuple_(models.RecommendationLease.location_id, models.RecommendationLease.category_id).in_(pairs)
+        ))
+
+def _write_review_timestamps(db: Session, reviewed_at: Dict[Tuple[int, int], datetime]):
+    """
+    Upsert the reviews and location categories of a set of pairs, and complete their
+    recommendation leases, without committing.
+
+    Pairs whose location or category does not exist are skipped.
+
+    Returns:
+        Tuple[Set[int], Set[int], Set[Tuple[int, int]]]: The requested location and category
+        IDs that exist, and the pairs that already had a review.
+    """
+    now = datetime.now(timezone.utc)
+    geohashes = dict(db.execute(select(models.Location.id, models.Location.geohash).where(
+        models.Location.id.in_({location_id for location_id, _ in reviewed_at})
+    )).all())
+    location_ids = set(geohashes)
+    category_ids = set(db.scalars(select(models.Category.id).where(
+        models.Category.id.in_({category_id for _, category_id in reviewed_at})
+    )))
+    valid_pairs = [
+        (location_id, category_id) for location_id, category_id in reviewed_at
+        if location_id in location_ids and category_id in category_ids
+    ]
+    if not valid_pairs:
+        return location_ids, category_ids, set()
+
+    existing_pairs = set(db.execute(select(models.Review.location_id, models.Review.category_id).where(
+        tuple_(models.Review.location_id, models.Review.category_id).in_(valid_pairs)
+    )).all())
+    previous = _lock_last_reviewed(db, valid_pairs, now)
 
+    rows = [
+        {
+            'location_id': location_id,
+            'category_id': category_id,
+            'last_reviewed': reviewed_at[(location_id, category_id)],
+            'created_at': now,
+            'updated_at': now,
+        }
+        for location_id, category_id in valid_pairs
+    ]
+    db.execute(_upsert_last_reviewed(db, models.Review, rows))
+    db.execute(_upsert_last_reviewed(db, models.LocationCategory, rows))
+
+    changes = []
+    for pair in valid_pairs:
+        before = previous.get(pair)
+        after = reviewed_at[pair]
+        if before is not None and _review_day(before) >= _review_day(after):
+            continue
+        changes.append((geohashes[pair[0]], before, after))
+    _move_reviews_in_grid(db, changes)
+    _complete_leases(db, valid_pairs)
+
+    return location_ids, category_ids, existing_pairs
+
+def create_or_update_reviews(db: Session, reviews: List[schemas.ReviewCreate]):
+    """
+    Create or update a batch of reviews in one transaction.
+
+    Reviews and location categories are written with one set-based upsert each,
+    so the number of round trips does not depend on the batch size.
+
+    Args:
+        db (Session): The database session.
+        reviews (List[schemas.ReviewCreate]): The reviews to create or update.
+
+    Returns:
+        List[schemas.ReviewBatchResult]: One result per input review, in input order.
+
+    Raises:
+        HTTPException: If there's an error writing the batch.
+    """
+    if not reviews:
+        return []
+
+    try:
+        now = datetime.now(timezone.utc)
+        reviewed_at = {(review.location_id, review.category_id): now for review in reviews}
+
+        location_ids, category_ids, existing_pairs = _write_review_timestamps(db, reviewed_at)
+        valid_pairs = [
+            (location_id, category_id) for location_id, category_id in reviewed_at
+            if location_id in location_ids and category_id in category_ids
+        ]
+        cache.recommendation_cache.invalidate(db)
+        scoring.engine.record_reviews({pair: reviewed_at[pair] for pair in valid_pairs}, db)
         db.commit()
-        db.refresh(db_review)
-        
-        return db_review
+
+        db_reviews = {}
+        if valid_pairs:
+            db_reviews = {
+                (db_review.location_id, db_review.category_id): db_review
+                for db_review in db.scalars(select(models.Review).where(
+                    tuple_(models.Review.location_id, models.Review.category_id).in_(valid_pairs)
+                ))
+            }
+
+        results = []
+        seen = set()
+        for review in reviews:
+            pair = (review.location_id, review.category_id)
+            if review.location_id not in location_ids:
+                results.append(schemas.ReviewBatchResult(**review.dict(), status="error", detail="Location not found"))
+            elif review.category_id not in category_ids:
+                results.append(schemas.ReviewBatchResult(**review.dict(), status="error", detail="Category not found"))
+            else:
+                created = pair not in existing_pairs and pair not in seen
+                results.append(schemas.ReviewBatchResult(
+                    **review.dict(),
+                    status="created" if created else "updated",
+                    review=db_reviews[pair]
+                ))
+            seen.add(pair)
+
+        return results
     except SQLAlchemyError as e:
         db.rollback()
-        logger.error(f"Error creating or updating review: {str(e)}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creating or updating review")
+        logger.error(f"Error creating or updating reviews: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creating or updating reviews")
+
+def apply_review_timestamps(db: Session, reviewed_at: Dict[Tuple[int, int], datetime]):
+    """
+    Record the latest review time of a set of location-category pairs.
+
+    Used to flush reviews accepted by the write-behind buffer. Pairs whose location
+    or category does not exist are dropped with a warning.
+
+    Args:
+        db (Session): The database session.
+        reviewed_at (Dict[Tuple[int, int], datetime]): Review time by (location_id, category_id).
+
+    Returns:
+        int: The number of pairs written.
+
+    Raises:
+        HTTPException: If there's an error writing the reviews.
+    """
+    if not reviewed_at:
+        return 0
+
+    try:
+        location_ids, category_ids, _ = _write_review_timestamps(db, reviewed_at)
+        cache.recommendation_cache.invalidate(db)
+        scoring.engine.record_reviews({
+            pair: value for pair, value in reviewed_at.items()
+            if pair[0] in location_ids and pair[1] in category_ids
+        }, db)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error applying buffered reviews: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error applying buffered reviews")
+
+    written = sum(
+        1 for location_id, category_id in reviewed_at
+        if location_id in location_ids and category_id in category_ids
+    )
+    if written < len(reviewed_at):
+        logger.warning(f"Dropped {len(reviewed_at) - written} buffered reviews for missing locations or categories")
+    return written
+
+def append_review_events(db: Session, reviews: List[schemas.ReviewCreate], reviewed_at: Optional[datetime] = None):
+    """
+    Record reviews as review events, to be rolled up into their pairs later.
+
+    Events are only inserted, so concurrent reviews of the same pair never wait
+    on each other's row locks. Each event is also queued in review_events_pending
+    for the rollup.
+
+    Args:
+        db (Session): The database session.
+        reviews (List[schemas.ReviewCreate]): The reviews to record.
+        reviewed_at (Optional[datetime]): When the reviews happened, now by default.
+
+    Returns:
+        List[schemas.ReviewBatchResult]: One result per input review, in input order,
+        "accepted" or "error" when the location or category does not exist.
+
+    Raises:
+        HTTPException: If there's an error recording the events.
+    """
+    if not reviews:
+        return []
+
+    try:
+        reviewed_at = reviewed_at or datetime.now(timezone.utc)
+        location_ids = set(db.scalars(select(models.Location.id).where(
+            models.Location.id.in_({review.location_id for review in reviews})
+        )))
+        category_ids = set(db.scalars(select(models.Category.id).where(
+            models.Category.id.in_({review.category_id for review in reviews})
+        )))
+
+        results = []
+        rows = []
+        for review in reviews:
+            if review.location_id not in location_ids:
+                results.append(schemas.ReviewBatchResult(**review.dict(), status="error", detail="Location not found"))
+            elif review.category_id not in category_ids:
+                results.append(schemas.ReviewBatchResult(**review.dict(), status="error", detail="Category not found"))
+            else:
+                rows.append({'location_id': review.location_id, 'category_id': review.category_id, 'reviewed_at': reviewed_at})
+                results.append(schemas.ReviewBatchResult(**review.dict(), status="accepted"))
+        if rows:
+            event_ids = db.scalars(insert(models.ReviewEvent).returning(models.ReviewEvent.id), rows).all()
+            db.execute(insert(models.PendingReviewEvent), [{'event_id': event_id} for event_id in event_ids])
+        db.commit()
+        return results
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error recording review events: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error recording review events")
+
+def _as_utc(value: datetime) -> datetime:
+    """
+    Return a datetime as UTC, reading naive values as UTC.
+    """
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def roll_up_review_events(db: Session, batch_size: int = 5000):
+    """
+    Fold the next review events into the last review times and the daily review counts.
+
+    The events to fold are those still queued in review_events_pending. The queue
+    entries are deleted in the transaction that folds their events, so each event
+    is counted exactly once, however late the transaction recording it commits.
+    Concurrent rollups lock and fold disjoint batches.
+
+    Args:
+        db (Session): The database session.
+        batch_size (int): Maximum number of events to fold.
+
+    Returns:
+        int: The number of events folded.
+
+    Raises:
+        HTTPException: If there's an error rolling up the events.
+    """
+    try:
+        settled = db.execute(select(
+            models.ReviewEvent.id,
+            models.ReviewEvent.location_id,
+            models.ReviewEvent.category_id,
+            models.ReviewEvent.reviewed_at
+        ).join(
+            models.PendingReviewEvent, models.PendingReviewEvent.event_id == models.ReviewEvent.id
+        ).order_by(models.PendingReviewEvent.event_id).limit(batch_size).with_for_update(
+            of=models.PendingReviewEvent, skip_locked=True
+        )).all()
+        if not settled:
+            db.rollback()
+            return 0
+
+        reviewed_at = {}
+        daily = defaultdict(int)
+        for event in settled:
+            pair = (event.location_id, event.category_id)
+            event_time = _as_utc(event.reviewed_at)
+            if pair not in reviewed_at or reviewed_at[pair] < event_time:
+                reviewed_at[pair] = event_time
+            daily[(event.location_id, event.category_id, event_time.date())] += 1
+
+        _write_review_timestamps(db, reviewed_at)
+        _add_to_counters(db, models.ReviewDailyCount, [
+            {'location_id': location_id, 'category_id': category_id, 'day': day, 'reviews': count}
+            for (location_id, category_id, day), count in daily.items()
+        ], ['reviews'])
+        db.execute(delete(models.PendingReviewEvent).where(
+            models.PendingReviewEvent.event_id.in_([event.id for event in settled])
+        ))
+        cache.recommendation_cache.invalidate(db)
+        scoring.engine.record_reviews(reviewed_at, db)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error rolling up review events: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error rolling up review events")
+
+    return len(settled)
+
+def get_review_history(db: Session, location_id: int, category_id: int, after_id: Optional[int] = None, limit: int = 100):
+    """
+    Retrieve the review events of a location-category pair, oldest first.
+
+    Args:
+        db (Session): The database session.
+        location_id (int): The ID of the location.
+        category_id (int): The ID of the category.
+        after_id (Optional[int]): Only return events with an ID greater than this one.
+        limit (int): Maximum number of events to return.
+
+    Returns:
+        List[models.ReviewEvent]: The events of the pair, ordered by ID.
+    """
+    statement = select(models.ReviewEvent).where(
+        models.ReviewEvent.location_id == location_id,
+        models.ReviewEvent.category_id == category_id
+    )
+    if after_id is not None:
+        statement = statement.where(models.ReviewEvent.id > after_id)
+    return db.scalars(statement.order_by(models.ReviewEvent.id).limit(limit)).all()
+
+def _period_start(day: date, period: str) -> date:
+    """
+    Return the first day of the day, week (starting on Monday) or month holding ``day``.
+    """
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+def _next_period(start: date, period: str) -> date:
+    """
+    Return the first day of the period following the one starting on ``start``.
+    """
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def get_review_counts(db: Session, start: date, end: date, period: str = 'day',
+                      location_id: Optional[int] = None, category_id: Optional[int] = None):
+    """
+    Count the reviews per period from the daily review counts.
+
+    Counts only include the events rolled up so far.
+
+    Args:
+        db (Session): The database session.
+        start (date): First UTC day counted.
+        end (date): Last UTC day counted.
+        period (str): "day", "week" or "month".
+        location_id (Optional[int]): Only count the reviews of this location.
+        category_id (Optional[int]): Only count the reviews of this category.
+
+    Returns:
+        List[schemas.ReviewCount]: One count per period overlapping [start, end], in
+        order, including periods without reviews. The first and last periods only
+        count the days inside the range.
+    """
+    statement = select(
+        models.ReviewDailyCount.day, func.sum(models.ReviewDailyCount.reviews)
+    ).where(models.ReviewDailyCount.day.between(start, end))
+    if location_id is not None:
+        statement = statement.where(models.ReviewDailyCount.location_id == location_id)
+    if category_id is not None:
+        statement = statement.where(models.ReviewDailyCount.category_id == category_id)
+
+    totals = defaultdict(int)
+    for day, reviews in db.execute(statement.group_by(models.ReviewDailyCount.day)):
+        totals[_period_start(day, period)] += reviews
+
+    counts = []
+    period_start = _period_start(start, period)
+    while period_start <= end:
+        counts.append(schemas.ReviewCount(period_start=period_start, reviews=totals.get(period_start, 0)))
+        period_start = _next_period(period_start, period)
+    return counts
 
 def get_review(db: Session, location_id: int, category_id: int):
     """
@@ -210,29 +1303,216 @@ def get_review(db: Session, location_id: int, category_id: int):
     """
     return db.query(models.Review).filter(models.Review.location_id == location_id, models.Review.category_id == category_id).first()
 
-def get_reviews(db: Session, skip: int = 0, limit: int = 10):
+def get_reviews_by_pairs(db: Session, pairs: List[Tuple[int, int]]):
     """
-    Retrieve a list of reviews with pagination.
+    Retrieve the reviews of several location-category pairs in one query.
+
+    The location and category IDs are matched separately first, as in
+    ``_select_ranked_pairs``, so that each side can use an index.
+
+    Args:
+        db (Session): The database session.
+        pairs (List[Tuple[int, int]]): The (location ID, category ID) pairs.
+
+    Returns:
+        List[Optional[models.Review]]: The review of each pair, in the order of
+        ``pairs``, None where the pair has no review.
+    """
+    if not pairs:
+        return []
+    reviews = db.scalars(select(models.Review).where(
+        models.Review.location_id.in_({location_id for location_id, _ in pairs}),
+        models.Review.category_id.in_({category_id for _, category_id in pairs}),
+        tuple_(models.Review.location_id, models.Review.category_id).in_(set(pairs))
+    ))
+    found = {(review.location_id, review.category_id): review for review in reviews}
+    return [found.get(tuple(pair)) for pair in pairs]
+
+def get_reviews(db: Session, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    """
+    Retrieve a list of reviews with offset or keyset pagination.
 
     Args:
         db (Session): The database session.
         skip (int): Number of records to skip.
         limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+            Paging with the last ID of the previous page costs the same at any depth.
+
+    Returns:
+        List[models.Review]: A list of review objects, ordered by ID.
+    """
+    return db.scalars(_select_page(models.Review, skip, limit, after_id)).all()
+
+def _select_recommendation_pairs():
+    """
+    Build the base recommendation statement over persisted location_category rows.
+    """
+    return select(
+        models.Location,
+        models.Category,
+        models.LocationCategory.last_reviewed
+    ).select_from(models.LocationCategory).join(
+        models.Location,
+        models.LocationCategory.location_id == models.Location.id
+    ).join(
+        models.Category,
+        models.LocationCategory.category_id == models.Category.id
+    )
+
+def _in_scope(statement, scope: RecommendationScope, category_column):
+    """
+    Restrict a recommendation statement to the region and category of ``scope``.
+
+    The region is a condition on the joined locations, so the database can start
+    from the geohash index and only rank the pairs of the locations it finds.
+    """
+    if scope.bboxes:
+        statement = statement.where(_in_boxes(scope.bboxes))
+    if scope.category_id is not None:
+        statement = statement.where(category_column == scope.category_id)
+    return statement
+
+def _select_dense_recommendations(threshold_date: datetime, limit: int, scope: RecommendationScope = RecommendationScope()):
+    """
+    Build the ranking of location_category rows when every pair is materialized.
+
+    The ordering matches idx_location_category_staleness, so without a region the
+    database walks the index from the never-reviewed rows to the oldest ones and
+    stops after ``limit`` rows.
+    """
+    return _in_scope(_select_recommendation_pairs(), scope, models.LocationCategory.category_id).where(
+        or_(
+            models.LocationCategory.last_reviewed.is_(None),
+            models.LocationCategory.last_reviewed < threshold_date
+        )
+    ).order_by(
+        models.LocationCategory.last_reviewed.asc().nulls_first(),
+        models.LocationCategory.location_id.asc(),
+        models.LocationCategory.category_id.asc()
+    ).limit(limit)
+
+def _select_never_reviewed_pairs(limit: int, scope: RecommendationScope = RecommendationScope()):
+    """
+    Build the never-reviewed pairs when only reviewed pairs are materialized.
+
+    They are found with an anti-join of the location x category cross product
+    against the reviewed location_category rows.
+    """
+    reviewed = exists().where(
+        models.LocationCategory.location_id == models.Location.id,
+        models.LocationCategory.category_id == models.Category.id,
+        models.LocationCategory.last_reviewed.isnot(None)
+    )
+    return _in_scope(select(
+        models.Location,
+        models.Category,
+        null().label('last_reviewed')
+    ).select_from(models.Location).join(
+        models.Category,
+        true()
+    ), scope, models.Category.id).where(~reviewed).order_by(
+        models.Location.id.asc(),
+        models.Category.id.asc()
+    ).limit(limit)
+
+def _select_stale_pairs(threshold_date: datetime, limit: int, scope: RecommendationScope = RecommendationScope()):
+    """
+    Build the reviewed pairs whose last review is older than ``threshold_date``, oldest first.
+    """
+    return _in_scope(_select_recommendation_pairs(), scope, models.LocationCategory.category_id).where(
+        models.LocationCategory.last_reviewed < threshold_date
+    ).order_by(
+        models.LocationCategory.last_reviewed.asc(),
+        models.LocationCategory.location_id.asc(),
+        models.LocationCategory.category_id.asc()
+    ).limit(limit)
+
+def _to_recommendations(rows):
+    """
+    Convert (location, category, last_reviewed) rows to recommendation schemas.
+    """
+    return [
+        schemas.Recommendation(
+            location=row[0],
+            category=row[1],
+            last_reviewed=row[2]
+        )
+        for row in rows
+    ]
+
+def _recommendation_cache_key(scope: RecommendationScope, *key):
+    """
+    Return the recommendation cache key of a scope, or None when it should not be cached.
+
+    Regions are left out of the cache: their coordinates are free-form, so caching
+    them would grow the cache without bound, and their ranking is cheap anyway.
+    """
+    if scope.bboxes:
+        return None
+    if scope == RecommendationScope():
+        return ("recommendations",) + key
+    return ("recommendations", scope.category_id, scope.limit) + key
+
+def _recommendation_version(recommendations, rows: bool):
+    """
+    Return the values identifying ranked recommendations, for their entity tag.
+
+    Args:
+        recommendations (List): schemas.Recommendation objects, or rows when ``rows`` is set.
+        rows (bool): Whether ``recommendations`` come from ``get_recommendation_rows``.
+    """
+    if rows:
+        return tuple(map(tuple, recommendations))
+    return tuple(
+        (item.location.id, item.location.updated_at, item.category.id, item.category.updated_at, item.last_reviewed)
+        for item in recommendations
+    )
+
+def get_versioned_recommendations(db: Session, scope: RecommendationScope = RecommendationScope(), rows: bool = False):
+    """
+    Retrieve the recommendations along with the values identifying them.
+
+    The version is computed once when the recommendations are ranked and cached with
+    them, so a conditional request answered from the recommendation cache ranks nothing.
+    It only depends on the pairs ranked, so every worker derives the same version.
+
+    Args:
+        db (Session): The database session.
+        scope (RecommendationScope): Region, category and number of recommendations.
+        rows (bool): Return plain rows, as ``get_recommendation_rows`` does, instead of
+            schemas.Recommendation objects.
 
     Returns:
-        List[models.Review]: A list of review objects.
+        Tuple[List, tuple]: The recommendations, and their version.
+
+    Raises:
+        HTTPException: If there's an error retrieving recommendations.
     """
-    return db.query(models.Review).offset(skip).limit(limit).all()
+    def compute():
+        if rows:
+            recommendations = _rank_recommendations(db, columns=_recommendation_columns(), scope=scope)
+        else:
+            recommendations = _to_recommendations(_rank_recommendations(db, scope=scope))
+        return recommendations, _recommendation_version(recommendations, rows)
 
-def get_recommendations(db: Session):
+    key = _recommendation_cache_key(scope, "rows") if rows else _recommendation_cache_key(scope)
+    if key is None:
+        return compute()
+    return cache.recommendation_cache.get_or_compute(key, compute)
+
+def get_recommendations(db: Session, scope: RecommendationScope = RecommendationScope()):
     """
     Retrieve a list of recommendations based on review history.
 
     This function returns a list of location-category combinations that have not been
     reviewed in the last 30 days, prioritizing those that have never been reviewed.
+    Ties are broken by location ID, then category ID. Results are served from the
+    recommendation cache when it is enabled.
 
     Args:
         db (Session): The database session.
+        scope (RecommendationScope): Region, category and number of recommendations.
 
     Returns:
         List[schemas.Recommendation]: A list of recommendation objects.
@@ -240,40 +1520,274 @@ def get_recommendations(db: Session):
     Raises:
         HTTPException: If there's an error retrieving recommendations.
     """
-    try:
-        current_time = datetime.now(timezone.utc)
-        threshold_date = current_time - timedelta(days=30)
+    return get_versioned_recommendations(db, scope)[0]
 
-        recommendations = db.query(
-            models.Location,
-            models.Category,
-            models.LocationCategory.last_reviewed
-        ).select_from(models.LocationCategory).join(
-            models.Location,
-            models.LocationCategory.location_id == models.Location.id
-        ).join(
-            models.Category,
+def _recommendation_columns():
+    """
+    Return the location and category columns of a recommendation row, in schema field order.
+    """
+    return _schema_columns(models.Location, schemas.Location) + _schema_columns(models.Category, schemas.Category)
+
+def _only_columns(statement, columns):
+    """
+    Narrow a recommendation statement to ``columns`` followed by its last_reviewed column.
+    """
+    return statement.with_only_columns(*columns, statement.selected_columns.last_reviewed)
+
+def get_recommendation_rows(db: Session, scope: RecommendationScope = RecommendationScope()):
+    """
+    Retrieve the recommendations as plain rows, without loading ORM objects.
+
+    The ranking is the same as ``get_recommendations``; results are cached separately.
+
+    Args:
+        db (Session): The database session.
+        scope (RecommendationScope): Region, category and number of recommendations.
+
+    Returns:
+        List[Row]: Rows holding the fields of schemas.Location, then those of
+        schemas.Category, then last_reviewed.
+
+    Raises:
+        HTTPException: If there's an error retrieving recommendations.
+    """
+    return get_versioned_recommendations(db, scope, rows=True)[0]
+
+def _in_circle(rows, scope: RecommendationScope, columns):
+    """
+    Keep the recommendation rows whose location is inside the circle of ``scope``.
+    """
+    latitude, longitude = scope.center
+    locations = [row[0] for row in rows] if columns is None else rows
+    return [
+        row for row, location in zip(rows, locations)
+        if geo.haversine_m(latitude, longitude, location.latitude, location.longitude) <= scope.radius_m
+    ]
+
+def _select_ranked_pairs(pairs: List[Tuple[int, int]]):
+    """
+    Build the recommendation rows of pairs ranked by the scoring engine, in ranking order.
+
+    The location and category IDs are matched separately first so that each side
+    is an index lookup, then narrowed to the exact pairs.
+    """
+    return select(
+        models.Location,
+        models.Category,
+        models.LocationCategory.last_reviewed
+    ).select_from(models.Location).join(
+        models.Category,
+        tuple_(models.Location.id, models.Category.id).in_(pairs)
+    ).outerjoin(
+        models.LocationCategory,
+        and_(
+            models.LocationCategory.location_id == models.Location.id,
             models.LocationCategory.category_id == models.Category.id
-        ).filter(
-            or_(
-                models.LocationCategory.last_reviewed.is_(None),
-                models.LocationCategory.last_reviewed < threshold_date
-            )
-        ).order_by(
-            models.LocationCategory.last_reviewed.is_(None).desc(),
-            models.LocationCategory.last_reviewed.asc()
-        ).limit(10).all()
+        )
+    ).where(
+        models.Location.id.in_({location_id for location_id, _ in pairs}),
+        models.Category.id.in_({category_id for _, category_id in pairs})
+    ).order_by(case(
+        *[
+            (and_(models.Location.id == location_id, models.Category.id == category_id), position)
+            for position, (location_id, category_id) in enumerate(pairs)
+        ]
+    ))
+
+def _not_leased(now: datetime):
+    """
+    Build the condition excluding the recommendation pairs under an active lease.
+    """
+    return ~exists().where(
+        models.RecommendationLease.location_id == models.Location.id,
+        models.RecommendationLease.category_id == models.Category.id,
+        models.RecommendationLease.expires_at > now
+    )
+
+def _ranking_statement(statement, columns=None, claimable_at: Optional[datetime] = None):
+    """
+    Narrow a ranking statement to ``columns`` and, for claims, skip and lock leased pairs.
+    """
+    if columns is not None:
+        statement = _only_columns(statement, columns)
+    if claimable_at is not None:
+        statement = statement.where(_not_leased(claimable_at))
+        if not config.SPARSE_LOCATION_CATEGORY:
+            statement = statement.with_for_update(skip_locked=True, of=models.LocationCategory)
+    return statement
+
+def _ranking_queries(scope: RecommendationScope, threshold_date: datetime, columns=None, pairs=None):
+    """
+    Rank the recommendations as a generator of statements, shared by the sync and async sessions.
 
+    Each yielded statement must be narrowed with ``_ranking_statement``, executed,
+    and its rows sent back into the generator. The recommendation rows are the
+    value of the final StopIteration.
+
+    Args:
+        scope (RecommendationScope): Region, category and number of recommendations.
+        threshold_date (datetime): Pairs reviewed after it are not stale.
+        columns: The columns read, as for ``_rank_recommendations``.
+        pairs (Optional[List[Tuple[int, int]]]): The pairs ranked by the vectorized
+            engine, if it ranked them.
+    """
+    if pairs is not None:
+        recommendations = (yield _select_ranked_pairs(pairs)) if pairs else []
         logger.info(f"Number of recommendations retrieved: {len(recommendations)}")
+        return recommendations
 
-        return [
-            schemas.Recommendation(
-                location=recommendation[0],
-                category=recommendation[1],
-                last_reviewed=recommendation[2]
-            )
-            for recommendation in recommendations
-        ]
+    # Circles are ranked on their bounding boxes, most of which they cover
+    limit = scope.limit if scope.center is None else scope.limit * 2
+    while True:
+        if config.SPARSE_LOCATION_CATEGORY:
+            recommendations = yield _select_never_reviewed_pairs(limit, scope)
+            if len(recommendations) < limit:
+                recommendations += yield _select_stale_pairs(threshold_date, limit - len(recommendations), scope)
+        else:
+            recommendations = yield _select_dense_recommendations(threshold_date, limit, scope)
+        if scope.center is None:
+            break
+        fetched = len(recommendations)
+        recommendations = _in_circle(recommendations, scope, columns)
+        if len(recommendations) >= scope.limit or fetched < limit:
+            recommendations = recommendations[:scope.limit]
+            break
+        limit *= 2
+
+    logger.info(f"Number of recommendations retrieved: {len(recommendations)}")
+    return recommendations
+
+def _rank_recommendations(db: Session, columns=None, scope: RecommendationScope = RecommendationScope(),
+                          claimable_at: Optional[datetime] = None):
+    """
+    Compute the recommendation rows from the database, bypassing the cache.
+
+    Rows are (location, category, last_reviewed), or ``columns`` followed by
+    last_reviewed when given. With the vectorized engine, pairs are ranked in
+    memory and only the selected ones are read.
+
+    With ``claimable_at``, pairs leased at that time are skipped and the ranking
+    always runs in SQL. When every pair is materialized, the location_category rows
+    read are locked with FOR UPDATE SKIP LOCKED on PostgreSQL, so that concurrent
+    claims rank past each other's candidates instead of waiting for them.
+    """
+    try:
+        threshold_date = datetime.now(timezone.utc) - RECOMMENDATION_STALE_AFTER
+        use_engine = scoring.engine.enabled and claimable_at is None
+        pairs = scoring.engine.rank(scope, threshold_date) if use_engine else None
+
+        ranking = _ranking_queries(scope, threshold_date, columns, pairs)
+        try:
+            statement = next(ranking)
+            while True:
+                statement = ranking.send(db.execute(_ranking_statement(statement, columns, claimable_at)).all())
+        except StopIteration as finished:
+            return finished.value
     except SQLAlchemyError as e:
         logger.error(f"Error getting recommendations: {str(e)}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error getting recommendations")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error getting recommendations")
+
+def _lease_pairs(db: Session, pairs: List[Tuple[int, int]], holder: str, now: datetime, expires_at: datetime):
+    """
+    Lease the pairs that are not leased at ``now``, without committing.
+
+    Returns:
+        Set[Tuple[int, int]]: The pairs leased to ``holder``; the others were leased
+        by a concurrent claim.
+    """
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    statement = dialect_insert(models.RecommendationLease).values([
+        {'location_id': location_id, 'category_id': category_id, 'holder': holder, 'expires_at': expires_at}
+        for location_id, category_id in pairs
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[models.RecommendationLease.location_id, models.RecommendationLease.category_id],
+        set_={'holder': statement.excluded.holder, 'expires_at': statement.excluded.expires_at},
+        where=models.RecommendationLease.expires_at <= now
+    ).returning(models.RecommendationLease.location_id, models.RecommendationLease.category_id)
+    return {tuple(row) for row in db.execute(statement)}
+
+def claim_recommendations(db: Session, holder: str, scope: RecommendationScope = RecommendationScope(),
+                          lease_seconds: Optional[float] = None):
+    """
+    Lease the next recommendations to an explorer, so that concurrent explorers get different pairs.
+
+    Pairs are ranked like ``get_recommendations``, skipping the pairs under an active
+    lease, and leased with an insert that only takes over expired leases. Pairs
+    leased first by a concurrent claim are ranked again, at most CLAIM_ATTEMPTS times.
+    Leases end when the pair is reviewed, released or expires.
+
+    Args:
+        db (Session): The database session.
+        holder (str): Identifier of the explorer claiming the pairs.
+        scope (RecommendationScope): Region, category and number of pairs to claim.
+        lease_seconds (Optional[float]): Seconds the pairs stay leased to ``holder``,
+            RECOMMENDATION_LEASE_SECONDS by default.
+
+    Returns:
+        List[schemas.RecommendationClaim]: The claimed pairs in rank order, possibly fewer
+        than ``scope.limit`` when the claimable pairs run out.
+
+    Raises:
+        HTTPException: If there's an error claiming recommendations.
+    """
+    if lease_seconds is None:
+        lease_seconds = config.RECOMMENDATION_LEASE_SECONDS
+    try:
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=lease_seconds)
+        claims = []
+        for _ in range(CLAIM_ATTEMPTS):
+            wanted = scope._replace(limit=scope.limit - len(claims))
+            rows = _rank_recommendations(db, scope=wanted, claimable_at=now)
+            leased = _lease_pairs(db, [(row[0].id, row[1].id) for row in rows], holder, now, expires_at) if rows else set()
+            claims += [
+                schemas.RecommendationClaim(
+                    location=location, category=category, last_reviewed=last_reviewed, lease_expires_at=expires_at
+                )
+                for location, category, last_reviewed in rows
+                if (location.id, category.id) in leased
+            ]
+            # Committing releases the row locks, and shows the leases to the other claims
+            db.commit()
+            if len(rows) < wanted.limit or len(claims) >= scope.limit:
+                break
+
+        logger.info(f"Number of recommendations claimed by {holder}: {len(claims)}")
+        return claims
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error claiming recommendations: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error claiming recommendations")
+
+def release_recommendations(db: Session, holder: str, pairs: Optional[List[Tuple[int, int]]] = None):
+    """
+    Release the leases of an explorer, so that the pairs can be claimed again.
+
+    Args:
+        db (Session): The database session.
+        holder (str): Identifier of the explorer holding the leases.
+        pairs (Optional[List[Tuple[int, int]]]): The (location ID, category ID) pairs
+            to release, all the leases of ``holder`` by default.
+
+    Returns:
+        int: The number of leases released.
+
+    Raises:
+        HTTPException: If there's an error releasing the leases.
+    """
+    try:
+        statement = delete(models.RecommendationLease).where(models.RecommendationLease.holder == holder)
+        if pairs is not None:
+            if not pairs:
+                return 0
+            statement = statement.where(
+                tuple_(models.RecommendationLease.location_id, models.RecommendationLease.category_id).in_(pairs)
+            )
+        released = db.execute(statement).rowcount
+        db.commit()
+        return released
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error releasing recommendations: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error releasing recommendations")
@@ -0,0 +1,410 @@
+"""
+Async versions of the ``crud`` functions used by the async routes.
+
+Statements are built by the helpers in ``crud`` so both paths issue the same SQL.
+"""
+from sqlalchemy import literal, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from fastapi import HTTPException, status
+from datetime import datetime, timezone
+from typing import Optional
+from . import cache, config, crud, models, schemas, scoring
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def _invalidate_recommendations(db: AsyncSession):
+    """
+    Invalidate the recommendation cache once the transaction of ``db`` commits.
+    """
+    if cache.recommendation_cache.enabled:
+        await db.run_sync(cache.recommendation_cache.invalidate)
+
+async def _get_through_entity_cache(db: AsyncSession, model, schema, entity_id: int):
+    """
+    Read a row by ID through the entity cache. See ``crud._get_through_entity_cache``.
+    """
+    key = (model.__tablename__, entity_id)
+    found, entity, generation = cache.entity_cache.lookup(key)
+    if found:
+        return entity
+
+    entity = await db.get(model, entity_id)
+    if entity is not None and cache.entity_cache.enabled:
+        entity = schema.model_validate(entity)
+        cache.entity_cache.store(key, generation, entity)
+    return entity
+
+async def get_location(db: AsyncSession, location_id: int):
+    """
+    Retrieve a location by its ID, through the entity cache when it is enabled.
+
+    Args:
+        db (AsyncSession): The database session.
+        location_id (int): The ID of the location to retrieve.
+
+    Returns:
+        models.Location: The location object if found, None otherwise. A
+        schemas.Location is returned instead when the entity cache is enabled.
+    """
+    return await _get_through_entity_cache(db, models.Location, schemas.Location, location_id)
+
+async def get_locations(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Retrieve a list of locations with offset or keyset pagination.
+
+    Args:
+        db (AsyncSession): The database session.
+        skip (int): Number of records to skip.
+        limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+
+    Returns:
+        List[models.Location]: A list of location objects, ordered by ID.
+    """
+    return (await db.scalars(crud._select_page(models.Location, skip, limit, after_id))).all()
+
+async def create_location(db: AsyncSession, location: schemas.LocationCreate):
+    """
+    Create a new location and associated location categories.
+
+    Args:
+        db (AsyncSession): The database session.
+        location (schemas.LocationCreate): The location data to create.
+
+    Returns:
+        models.Location: The created location object.
+
+    Raises:
+        HTTPException: If there's an error creating the location.
+    """
+    try:
+        db_location = models.Location(**location.dict())
+        db.add(db_location)
+        await db.flush()
+
+        if not config.SPARSE_LOCATION_CATEGORY:
+            await db.execute(crud._fan_out_location_categories(
+                location_id=literal(db_location.id),
+                category_id=models.Category.id
+            ))
+        await db.run_sync(crud._add_locations_to_grid, [(db_location.geohash, db_location.longitude, db_location.latitude)])
+        await _invalidate_recommendations(db)
+        if scoring.engine.enabled:
+            await db.run_sync(scoring.engine.invalidate)
+        await db.commit()
+        await db.refresh(db_location)
+
+        return db_location
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error creating location: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creating location")
+
+async def get_category_catalog(db: AsyncSession):
+    """
+    Return the category catalog, reloading it first if it is stale.
+
+    Args:
+        db (AsyncSession): The database session used for reloading.
+
+    Returns:
+        cache.Catalog: The up-to-date catalog, or None when it is disabled.
+    """
+    catalog = cache.category_catalog
+    if not catalog.enabled:
+        return None
+    stale, generation = catalog.check()
+    if stale:
+        categories = (await db.scalars(select(models.Category).order_by(models.Category.id))).all()
+        catalog.load([schemas.Category.model_validate(category) for category in categories], generation)
+    return catalog
+
+async def get_category_page_version(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Identify the content of a page of categories without rendering it.
+
+    See ``crud.get_category_page_version``.
+
+    Returns:
+        Tuple: The number of categories in the page, their highest ID and latest updated_at.
+    """
+    catalog = await get_category_catalog(db)
+    if catalog is not None:
+        return crud._page_version(catalog.page(skip, limit, after_id))
+    return await get_page_version(db, models.Category, skip=skip, limit=limit, after_id=after_id)
+
+async def get_category(db: AsyncSession, category_id: int):
+    """
+    Retrieve a category by its ID, from the category catalog or the entity cache when enabled.
+
+    Args:
+        db (AsyncSession): The database session.
+        category_id (int): The ID of the category to retrieve.
+
+    Returns:
+        models.Category: The category object if found, None otherwise. A
+        schemas.Category is returned instead when it comes from a cache.
+    """
+    catalog = await get_category_catalog(db)
+    if catalog is not None:
+        category = catalog.get(category_id)
+        if category is not None:
+            return category
+    return await _get_through_entity_cache(db, models.Category, schemas.Category, category_id)
+
+async def get_categories(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Retrieve a list of categories with offset or keyset pagination.
+
+    Args:
+        db (AsyncSession): The database session.
+        skip (int): Number of records to skip.
+        limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+
+    Returns:
+        List[models.Category]: A list of category objects, ordered by ID. They are
+        schemas.Category objects when served from the category catalog.
+    """
+    catalog = await get_category_catalog(db)
+    if catalog is not None:
+        return catalog.page(skip, limit, after_id)
+    return (await db.scalars(crud._select_page(models.Category, skip, limit, after_id))).all()
+
+async def create_category(db: AsyncSession, category: schemas.CategoryCreate):
+    """
+    Create a new category or return existing if it already exists.
+
+    Args:
+        db (AsyncSession): The database session.
+        category (schemas.CategoryCreate): The category data to create.
+
+    Returns:
+        models.Category: The created or existing category object.
+
+    Raises:
+        HTTPException: If there's an error creating the category.
+    """
+    try:
+        existing_category = await db.scalar(select(models.Category).where(models.Category.name == category.name))
+        if existing_category:
+            logger.info(f"Category '{category.name}' already exists. Returning existing category.")
+            return existing_category
+
+        db_category = models.Category(**category.dict())
+        db.add(db_category)
+        await db.flush()
+
+        if not config.SPARSE_LOCATION_CATEGORY:
+            await db.execute(crud._fan_out_location_categories(
+                location_id=models.Location.id,
+                category_id=literal(db_category.id)
+            ))
+        await _invalidate_recommendations(db)
+        if cache.category_catalog.enabled:
+            await db.run_sync(cache.category_catalog.invalidate)
+        if scoring.engine.enabled:
+            await db.run_sync(scoring.engine.invalidate)
+        await db.commit()
+        await db.refresh(db_category)
+
+        return db_category
+    except IntegrityError as e:
+        await db.rollback()
+        logger.error(f"IntegrityError creating category: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Category already exists")
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error creating category: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creating category")
+
+async def create_or_update_review(db: AsyncSession, review: schemas.ReviewCreate):
+    """
+    Create a new review or update an existing one.
+
+    Args:
+        db (AsyncSession): The database session.
+        review (schemas.ReviewCreate): The review data to create or update.
+
+    Returns:
+        models.Review: The created or updated review object.
+
+    Raises:
+        HTTPException: If there's an error creating or updating the review.
+    """
+    try:
+        now = datetime.now(timezone.utc)
+        await db.run_sync(crud._write_review, review, now)
+        await _invalidate_recommendations(db)
+        if scoring.engine.enabled:
+            await db.run_sync(lambda session: scoring.engine.record_reviews({(review.location_id, review.category_id): now}, session))
+        await db.commit()
+        db_review = await db.scalar(select(models.Review).where(
+            models.Review.location_id == review.location_id,
+            models.Review.category_id == review.category_id
+        ))
+
+        return db_review
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error creating or updating review: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creating or updating review")
+
+async def get_reviews(db: AsyncSession, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    """
+    Retrieve a list of reviews with offset or keyset pagination.
+
+    Args:
+        db (AsyncSession): The database session.
+        skip (int): Number of records to skip.
+        limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+
+    Returns:
+        List[models.Review]: A list of review objects, ordered by ID.
+    """
+    return (await db.scalars(crud._select_page(models.Review, skip, limit, after_id))).all()
+
+async def get_page_rows(db: AsyncSession, model, schema, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Retrieve a page of records as plain rows, without loading ORM objects.
+
+    Args:
+        db (AsyncSession): The database session.
+        model: The mapped class to read, such as models.Location.
+        schema: The response schema whose fields are selected, such as schemas.Location.
+        skip (int): Number of records to skip.
+        limit (int): Maximum number of records to return.
+        after_id (Optional[int]): Only return records with an ID greater than this one.
+
+    Returns:
+        List[Row]: Rows holding the fields of ``schema`` in declaration order, ordered by ID.
+    """
+    columns = crud._schema_columns(model, schema)
+    return (await db.execute(crud._select_page(model, skip, limit, after_id, columns=columns))).all()
+
+async def stream_rows(db: AsyncSession, columns, order_by, batch_size: int = 1000):
+    """
+    Stream the rows of a table in batches through a server-side cursor.
+
+    See ``crud.stream_rows``.
+
+    Args:
+        db (AsyncSession): The database session. It must stay open while the batches are consumed.
+        columns (List[Column]): The columns to select.
+        order_by (Column): The column to order the rows by.
+        batch_size (int): Number of rows fetched per batch.
+
+    Yields:
+        List[Row]: Batches of at most ``batch_size`` rows.
+    """
+    result = await db.stream(select(*columns).order_by(order_by).execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+async def get_versioned_recommendations(db: AsyncSession, scope: crud.RecommendationScope = crud.RecommendationScope(), rows: bool = False):
+    """
+    Retrieve the recommendations along with the values identifying them.
+
+    See ``crud.get_versioned_recommendations``; both share the recommendation cache.
+
+    Args:
+        db (AsyncSession): The database session.
+        scope (crud.RecommendationScope): Region, category and number of recommendations.
+        rows (bool): Return plain rows instead of schemas.Recommendation objects.
+
+    Returns:
+        Tuple[List, tuple]: The recommendations, and their version.
+
+    Raises:
+        HTTPException: If there's an error retrieving recommendations.
+    """
+    key = crud._recommendation_cache_key(scope, "rows") if rows else crud._recommendation_cache_key(scope)
+    found, versioned, generation = cache.recommendation_cache.lookup(key) if key else (False, None, None)
+    if found:
+        return versioned
+
+    if rows:
+        recommendations = await _rank_recommendations(db, columns=crud._recommendation_columns(), scope=scope)
+    else:
+        recommendations = crud._to_recommendations(await _rank_recommendations(db, scope=scope))
+    versioned = recommendations, crud._recommendation_version(recommendations, rows)
+    if key:
+        cache.recommendation_cache.store(key, generation, versioned)
+    return versioned
+
+async def get_recommendations(db: AsyncSession, scope: crud.RecommendationScope = crud.RecommendationScope()):
+    """
+    Retrieve a list of recommendations based on review history.
+
+    See ``crud.get_recommendations`` for the ranking; both share the recommendation cache.
+
+    Args:
+        db (AsyncSession): The database session.
+        scope (crud.RecommendationScope): Region, category and number of recommendations.
+
+    Returns:
+        List[schemas.Recommendation]: A list of recommendation objects.
+
+    Raises:
+        HTTPException: If there's an error retrieving recommendations.
+    """
+    return (await get_versioned_recommendations(db, scope))[0]
+
+async def get_recommendation_rows(db: AsyncSession, scope: crud.RecommendationScope = crud.RecommendationScope()):
+    """
+    Retrieve the recommendations as plain rows, without loading ORM objects.
+
+    See ``crud.get_recommendation_rows``; both share the recommendation cache.
+
+    Args:
+        db (AsyncSession): The database session.
+        scope (crud.RecommendationScope): Region, category and number of recommendations.
+
+    Returns:
+        List[Row]: Rows holding the fields of schemas.Location, then those of
+        schemas.Category, then last_reviewed.
+
+    Raises:
+        HTTPException: If there's an error retrieving recommendations.
+    """
+    return (await get_versioned_recommendations(db, scope, rows=True))[0]
+
+async def get_page_version(db: AsyncSession, model, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Identify the content of a page of records without loading it.
+
+    See ``crud.get_page_version``.
+
+    Returns:
+        Row: The number of records in the page, their highest ID and latest updated_at.
+    """
+    return (await db.execute(crud._select_page_version(model, skip, limit, after_id))).one()
+
+async def _rank_recommendations(db: AsyncSession, columns=None, scope: crud.RecommendationScope = crud.RecommendationScope()):
+    """
+    Compute the recommendation rows from the database, bypassing the cache.
+
+    Runs the statements of ``crud._ranking_queries``; see ``crud._rank_recommendations``.
+    """
+    try:
+        threshold_date = datetime.now(timezone.utc) - crud.RECOMMENDATION_STALE_AFTER
+        pairs = None
+        if scoring.engine.enabled:
+            # Ranking a large snapshot takes milliseconds of CPU: keep it off the event loop.
+            pairs = await run_in_threadpool(scoring.engine.rank, scope, threshold_date)
+
+        ranking = crud._ranking_queries(scope, threshold_date, columns, pairs)
+        try:
+            statement = next(ranking)
+            while True:
+                statement = ranking.send((await db.execute(crud._ranking_statement(statement, columns))).all())
+        except StopIteration as finished:
+            return finished.value
+    except SQLAlchemyError as e:
+        logger.error(f"Error getting recommendations: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error getting recommendations")
@@ -1,9 +1,17 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from dotenv import load_dotenv
+from typing import List
+from . import config, metrics
+import itertools
 import os
 import logging
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,22 +26,147 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     raise ValueError("No DATABASE_URL set for Flask application")
 
-# Convert postgres:// to postgresql:// if necessary
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+def _normalize_url(url: str) -> str:
+    """
+    Convert postgres:// to postgresql:// if necessary.
+    """
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+DATABASE_URL = _normalize_url(DATABASE_URL)
+DATABASE_READ_URLS = [_normalize_url(url) for url in config.DATABASE_READ_URLS]
+
+# Connection pool settings of every engine, primary and replicas
+POOL_OPTIONS = {
+    "pool_size": config.DB_POOL_SIZE,
+    "max_overflow": config.DB_MAX_OVERFLOW,
+    "pool_timeout": config.DB_POOL_TIMEOUT,
+    "pool_recycle": config.DB_POOL_RECYCLE,
+}
+
+def _create_sync_engine(url: str, **options):
+    new_engine = create_engine(
+        url,
+        poolclass=metrics.InstrumentedQueuePool if config.METRICS_ENABLED else QueuePool,
+        **POOL_OPTIONS,
+        **options,
+    )
+    if config.METRICS_ENABLED:
+        metrics.instrument_engine(new_engine)
+    return new_engine
 
 # Create the SQLAlchemy engine with connection pooling
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800,
-)
+engine = _create_sync_engine(DATABASE_URL)
 
 # Create a SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers used for the async database path, by synchronous URL scheme
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    """
+    Convert a synchronous database URL to the URL of its async driver.
+
+    Args:
+        url (str): A database URL such as postgresql://... or postgresql+psycopg2://...
+
+    Returns:
+        str: The same database URL using the async driver.
+
+    Raises:
+        ValueError: If no async driver is known for the URL scheme.
+    """
+    scheme, separator, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database scheme '{scheme}'")
+    return f"{ASYNC_DRIVERS[dialect]}{separator}{rest}"
+
+def _create_async_engine(url: str, **options):
+    new_engine = create_async_engine(
+        to_async_url(url),
+        poolclass=metrics.InstrumentedAsyncAdaptedQueuePool if config.METRICS_ENABLED else AsyncAdaptedQueuePool,
+        **POOL_OPTIONS,
+        **options,
+    )
+    if config.METRICS_ENABLED:
+        metrics.instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+# Create the async engine and session factory when the async database path is enabled
+async_engine = None
+AsyncSessionLocal = None
+if config.ASYNC_DB:
+    async_engine = _create_async_engine(DATABASE_URL)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+class ReplicaSet:
+    """
+    Read replica engines picked round-robin.
+
+    A replica that fails to hand out a connection, or loses one, is skipped for
+    ``retry_seconds`` before being tried again. Engines are created with
+    ``pool_pre_ping`` so that a pooled connection to a replica that went away is
+    detected at checkout rather than by the request's first query.
+    """
+    def __init__(self, engines: list, retry_seconds: float):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._down_until = [0.0] * len(engines)
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        for index, replica in enumerate(engines):
+            sync_engine = getattr(replica, "sync_engine", replica)
+            event.listen(sync_engine, "handle_error", self._on_error(index))
+
+    def _on_error(self, index: int):
+        def handle_error(context):
+            if context.is_disconnect:
+                self.mark_down(index, context.original_exception)
+        return handle_error
+
+    def candidates(self) -> List[int]:
+        """
+        Return the indexes of the healthy replicas, starting with the next one in turn.
+        """
+        if not self.engines:
+            return []
+        with self._lock:
+            start = next(self._turn) % len(self.engines)
+        now = time.monotonic()
+        order = list(range(start, len(self.engines))) + list(range(start))
+        return [index for index in order if self._down_until[index] <= now]
+
+    def mark_down(self, index: int, error: Exception):
+        """
+        Skip a replica for ``retry_seconds``.
+        """
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+        logger.warning(f"Read replica {index} unavailable for {self.retry_seconds}s: {error}")
+
+read_replicas = ReplicaSet(
+    [_create_sync_engine(url, pool_pre_ping=True) for url in DATABASE_READ_URLS],
+    config.READ_REPLICA_RETRY_SECONDS,
+)
+async_read_replicas = ReplicaSet(
+    [_create_async_engine(url, pool_pre_ping=True) for url in DATABASE_READ_URLS] if config.ASYNC_DB else [],
+    config.READ_REPLICA_RETRY_SECONDS,
+)
+
+# Request header with which a client reads from the primary, to see its own writes
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
+
+def reads_own_writes(request: Request) -> bool:
+    """
+    Return whether the request asks to read from the primary.
+    """
+    return request.headers.get(READ_YOUR_WRITES_HEADER, "").strip().lower() in ("1", "true", "yes", "on")
+
 # Create a Base class
 Base = declarative_base()
 
@@ -54,13 +187,107 @@ def get_db():
     finally:
         db.close()
 
+def open_read_session(read_your_writes: bool = False) -> Session:
+    """
+    Open a session on a read replica, or on the primary if none is available.
+
+    Args:
+        read_your_writes (bool): Read from the primary, which has every committed write.
+
+    Returns:
+        Session: A SQLAlchemy Session object holding a connection.
+    """
+    if not read_your_writes:
+        for index in read_replicas.candidates():
+            db = SessionLocal(bind=read_replicas.engines[index])
+            try:
+                db.connection()
+                return db
+            except SQLAlchemyError as e:
+                db.close()
+                read_replicas.mark_down(index, e)
+    return SessionLocal()
+
+def get_read_db(request: Request):
+    """
+    Dependency function to get a database session for read-only endpoints.
+
+    The session is bound to a read replica when DATABASE_READ_URLS is set, unless the
+    request sends the X-Read-Your-Writes header.
+
+    Yields:
+        Session: A SQLAlchemy Session object.
+    """
+    db = open_read_session(reads_own_writes(request))
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logger.error(f"Database error occurred: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def get_async_db():
+    """
+    Dependency function to get an async database session.
+
+    Yields:
+        AsyncSession: A SQLAlchemy AsyncSession object.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            logger.error(f"Database error occurred: {e}")
+            await db.rollback()
+            raise
+
+async def open_async_read_session(read_your_writes: bool = False) -> AsyncSession:
+    """
+    Open an async session on a read replica, or on the primary if none is available.
+
+    Args:
+        read_your_writes (bool): Read from the primary, which has every committed write.
+
+    Returns:
+        AsyncSession: A SQLAlchemy AsyncSession object.
+    """
+    if not read_your_writes:
+        for index in async_read_replicas.candidates():
+            db = AsyncSessionLocal(bind=async_read_replicas.engines[index])
+            try:
+                await db.connection()
+                return db
+            except SQLAlchemyError as e:
+                await db.close()
+                async_read_replicas.mark_down(index, e)
+    return AsyncSessionLocal()
+
+async def get_async_read_db(request: Request):
+    """
+    Dependency function to get an async database session for read-only endpoints.
+
+    Yields:
+        AsyncSession: A SQLAlchemy AsyncSession object, bound to a read replica like ``get_read_db``.
+    """
+    async with await open_async_read_session(reads_own_writes(request)) as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            logger.error(f"Database error occurred: {e}")
+            await db.rollback()
+            raise
+
 def init_db():
     """
-    Initialize the database by creating all tables.
+    Initialize the database by applying the pending schema migrations.
     """
+    from . import migrations
+
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
+        migrations.migrate(engine)
+        logger.info("Database schema is up to date")
     except SQLAlchemyError as e:
         logger.error(f"Error creating database tables: {e}")
         raise
\ No newline at end of file
@@ -0,0 +1,274 @@
+import math
+from typing import List, Tuple
+
+# Base32 alphabet used by geohash (no "a", "i", "l", "o").
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision stored on every location (~4.8m x 4.8m cells).
+GEOHASH_PRECISION = 9
+
+# Upper bound on the number of prefix cells used to cover a search area.
+MAX_COVERING_CELLS = 32
+
+EARTH_RADIUS_M = 6371008.8
+
+# Geohash precisions of the precomputed location grid, coarsest to finest.
+GRID_PRECISIONS = range(1, GEOHASH_PRECISION)
+
+# Minimum number of grid cells across the width of a map tile.
+TILE_MIN_CELLS_ACROSS = 4
+
+# Deepest map tile zoom level accepted.
+MAX_TILE_ZOOM = 22
+
+BoundingBox = Tuple[float, float, float, float]
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Encode a coordinate as a geohash string.
+
+    Args:
+        latitude (float): Latitude in degrees.
+        longitude (float): Longitude in degrees.
+        precision (int): Number of characters in the resulting geohash.
+
+    Returns:
+        str: The geohash of the coordinate.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Return the size of a geohash cell at the given precision.
+
+    Args:
+        precision (int): Geohash precision in characters.
+
+    Returns:
+        Tuple[float, float]: The cell width (longitude) and height (latitude) in degrees.
+    """
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 360.0 / (1 << lon_bits), 180.0 / (1 << lat_bits)
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Compute the great-circle distance between two coordinates.
+
+    Args:
+        lat1 (float): Latitude of the first point in degrees.
+        lon1 (float): Longitude of the first point in degrees.
+        lat2 (float): Latitude of the second point in degrees.
+        lon2 (float): Longitude of the second point in degrees.
+
+    Returns:
+        float: The distance in meters.
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def bbox_around(latitude: float, longitude: float, radius_m: float) -> List[BoundingBox]:
+    """
+    Compute the bounding boxes enclosing a circle on the globe.
+
+    The circle is split in two boxes when it crosses the antimeridian.
+
+    Args:
+        latitude (float): Latitude of the center in degrees.
+        longitude (float): Longitude of the center in degrees.
+        radius_m (float): Radius of the circle in meters.
+
+    Returns:
+        List[BoundingBox]: Boxes as (min_lon, min_lat, max_lon, max_lat) tuples.
+    """
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat = latitude - dlat
+    max_lat = latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return [(-180.0, max(min_lat, -90.0), 180.0, min(max_lat, 90.0))]
+
+    dlon = math.degrees(math.asin(min(1.0, math.sin(radius_m / EARTH_RADIUS_M) / math.cos(math.radians(latitude)))))
+    min_lon = longitude - dlon
+    max_lon = longitude + dlon
+    if max_lon - min_lon >= 360:
+        return [(-180.0, min_lat, 180.0, max_lat)]
+    if min_lon < -180:
+        return [(min_lon + 360, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    if max_lon > 180:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+def parse_bbox(value: str) -> BoundingBox:
+    """
+    Parse a "min_lon,min_lat,max_lon,max_lat" bounding box string.
+
+    Args:
+        value (str): The comma-separated bounding box.
+
+    Returns:
+        BoundingBox: The parsed bounding box.
+
+    Raises:
+        ValueError: If the string is malformed or the coordinates are out of range.
+    """
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be 'min_lon,min_lat,max_lon,max_lat'")
+    min_lon, min_lat, max_lon, max_lat = (float(part) for part in parts)
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox longitudes must be between -180 and 180")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox latitudes must be between -90 and 90 and min_lat <= max_lat")
+    return min_lon, min_lat, max_lon, max_lat
+
+def split_bbox(bbox: BoundingBox) -> List[BoundingBox]:
+    """
+    Split a bounding box crossing the antimeridian (min_lon > max_lon) in two.
+
+    Args:
+        bbox (BoundingBox): The bounding box to split.
+
+    Returns:
+        List[BoundingBox]: One or two boxes that do not cross the antimeridian.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if min_lon <= max_lon:
+        return [bbox]
+    return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+
+def _cells_for_bbox(bbox: BoundingBox, precision: int) -> List[str]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    width, height = cell_size(precision)
+    max_x = int(round(360.0 / width)) - 1
+    max_y = int(round(180.0 / height)) - 1
+    x0 = min(max_x, int(math.floor((min_lon + 180.0) / width)))
+    x1 = min(max_x, int(math.floor((max_lon + 180.0) / width)))
+    y0 = min(max_y, int(math.floor((min_lat + 90.0) / height)))
+    y1 = min(max_y, int(math.floor((max_lat + 90.0) / height)))
+    return [
+        encode_geohash(-90.0 + (y + 0.5) * height, -180.0 + (x + 0.5) * width, precision)
+        for x in range(x0, x1 + 1)
+        for y in range(y0, y1 + 1)
+    ]
+
+def covering_cells(bboxes: List[BoundingBox], max_cells: int = MAX_COVERING_CELLS) -> List[str]:
+    """
+    Find the geohash prefixes covering a set of bounding boxes.
+
+    The finest precision whose cover stays within ``max_cells`` cells is used, so
+    the prefixes select as few candidate rows as possible from the geohash index.
+
+    Args:
+        bboxes (List[BoundingBox]): The boxes to cover.
+        max_cells (int): Maximum number of prefixes to return.
+
+    Returns:
+        List[str]: Geohash prefixes whose cells together contain every box.
+    """
+    best = [""]
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        cells = set()
+        for bbox in bboxes:
+            cells.update(_cells_for_bbox(bbox, precision))
+            if len(cells) > max_cells:
+                break
+        if len(cells) > max_cells:
+            break
+        best = sorted(cells)
+    return best
+
+def tile_bbox(z: int, x: int, y: int) -> BoundingBox:
+    """
+    Compute the bounding box of a web mercator map tile.
+
+    The top and bottom rows of tiles are extended to the poles, so that every
+    location belongs to a tile.
+
+    Args:
+        z (int): Zoom level.
+        x (int): Tile column, from 0 at the antimeridian eastwards.
+        y (int): Tile row, from 0 at the north edge southwards.
+
+    Returns:
+        BoundingBox: The tile as (min_lon, min_lat, max_lon, max_lat).
+    """
+    n = 1 << z
+
+    def latitude(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    max_lat = 90.0 if y == 0 else latitude(y)
+    min_lat = -90.0 if y == n - 1 else latitude(y + 1)
+    return x / n * 360.0 - 180.0, min_lat, (x + 1) / n * 360.0 - 180.0, max_lat
+
+def tile_cells(z: int, x: int, y: int) -> Tuple[int, List[str]]:
+    """
+    Find the grid cells making up a map tile.
+
+    The precision is the coarsest whose cells fit ``TILE_MIN_CELLS_ACROSS`` times in
+    the tile width. Geohash columns line up with tile edges, but rows do not: a cell
+    belongs to the tile holding its center, so that each cell is in exactly one tile.
+
+    Args:
+        z (int): Zoom level.
+        x (int): Tile column.
+        y (int): Tile row.
+
+    Returns:
+        Tuple[int, List[str]]: The grid precision and the geohashes of the cells.
+    """
+    min_lon, min_lat, max_lon, max_lat = tile_bbox(z, x, y)
+    precision = GRID_PRECISIONS[-1]
+    for candidate in GRID_PRECISIONS:
+        if cell_size(candidate)[0] * TILE_MIN_CELLS_ACROSS <= max_lon - min_lon:
+            precision = candidate
+            break
+
+    width, height = cell_size(precision)
+    first_column = int(math.floor((min_lon + 180.0) / width))
+    first_row = int(math.floor((min_lat + 90.0) / height))
+    cells = []
+    column = first_column
+    while -180.0 + (column + 0.5) * width < max_lon:
+        row = first_row
+        while -90.0 + (row + 0.5) * height < max_lat:
+            center_lat = -90.0 + (row + 0.5) * height
+            if center_lat >= min_lat:
+                cells.append(encode_geohash(center_lat, -180.0 + (column + 0.5) * width, precision))
+            row += 1
+        column += 1
+    return precision, cells
@@ -0,0 +1,69 @@
+from . import config
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class GridRollup:
+    """
+    Background rollup of the queued location grid deltas into the grid counters.
+
+    Every ``interval`` seconds, deltas are folded ``batch_size`` at a time until the
+    queue is empty. Every worker runs one; concurrent rollups fold disjoint deltas.
+    """
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """
+        Fold the queued deltas.
+
+        Returns:
+            int: The number of deltas folded.
+        """
+        from . import crud
+        from .database import SessionLocal
+
+        folded = 0
+        db = SessionLocal()
+        try:
+            while not self._stopping.is_set():
+                count = crud.roll_up_location_grid(db, batch_size=self.batch_size)
+                folded += count
+                if count < self.batch_size:
+                    break
+        except Exception as e:
+            logger.error(f"Error rolling up the location grid: {str(e)}")
+        finally:
+            db.close()
+        return folded
+
+    def start(self):
+        """
+        Start the background rollup thread.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="grid-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread. Deltas not folded yet are left to the next start.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.run_once()
+
+grid_rollup = GridRollup(
+    interval=config.GRID_ROLLUP_INTERVAL,
+    batch_size=config.GRID_ROLLUP_BATCH_SIZE
+)
@@ -1,8 +1,13 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import categories, locations, recommendations, reviews
-from .database import engine
-from . import models
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.routing import APIRoute
+from .routers import caches, categories, exports, locations, recommendations, reviews
+from . import database
+from .database import SessionLocal, engine
+from . import admission, cache, config, crud, location_grid, metrics, migrations, review_events, scoring, write_behind
 import logging
 import uvicorn
 
@@ -10,16 +15,43 @@ import uvicorn
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Apply the schema migrations, warm the caches and start background workers on
+    startup, and drain them on shutdown.
+    """
+    if config.MIGRATE_ON_STARTUP:
+        migrations.migrate(engine)
+    with SessionLocal() as db:
+        crud.get_category_catalog(db)
+    # Loads in the background; recommendations are ranked by SQL until it is ready.
+    scoring.engine.refresh()
+    if write_behind.review_buffer is not None:
+        write_behind.review_buffer.start()
+    if review_events.review_rollup is not None:
+        review_events.review_rollup.start()
+    location_grid.grid_rollup.start()
+    yield
+    location_grid.grid_rollup.stop()
+    if review_events.review_rollup is not None:
+        review_events.review_rollup.stop()
+    if write_behind.review_buffer is not None:
+        write_behind.review_buffer.stop()
 
 # Create FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title="Map My World API",
     description="REST API for managing locations and categories, and providing exploration recommendations for 'Map My World'.",
     version="1.0.0"
 )
 
+# Limit the API requests running at once, queueing or rejecting the others. Added
+# before CORS so that 503 responses carry the CORS headers too.
+if admission.controller is not None:
+    app.add_middleware(admission.AdmissionMiddleware, controller=admission.controller, retry_after=config.ADMISSION_RETRY_AFTER)
+
 # Configure CORS
 origins = ["*"]
 app.add_middleware(
@@ -30,11 +62,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses for clients sending Accept-Encoding: gzip
+if config.GZIP_MINIMUM_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=config.GZIP_MINIMUM_SIZE)
+
+# Record per-endpoint latency and SQL statistics
+if config.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Include async routers first so they shadow the sync routes they replace
+if config.ASYNC_DB:
+    from .routers import async_routes
+
+    app.include_router(async_routes.categories_router, prefix="/api/v1/categories", tags=["Categories"])
+    app.include_router(async_routes.locations_router, prefix="/api/v1/locations", tags=["Locations"])
+    app.include_router(async_routes.recommendations_router, prefix="/api/v1/recommendations", tags=["Recommendations"])
+    app.include_router(async_routes.reviews_router, prefix="/api/v1/reviews", tags=["Reviews"])
+    app.include_router(async_routes.exports_router, prefix="/api/v1/export", tags=["Export"])
+    async_operations = {(route.path_format, method) for route in app.routes if isinstance(route, APIRoute) for method in route.methods}
+
 # Include routers
 app.include_router(categories.router, prefix="/api/v1/categories", tags=["Categories"])
 app.include_router(locations.router, prefix="/api/v1/locations", tags=["Locations"])
 app.include_router(recommendations.router, prefix="/api/v1/recommendations", tags=["Recommendations"])
 app.include_router(reviews.router, prefix="/api/v1/reviews", tags=["Reviews"])
+app.include_router(exports.router, prefix="/api/v1/export", tags=["Export"])
+app.include_router(caches.router, prefix="/api/v1/cache", tags=["Cache"])
+
+# Hide the sync routes shadowed by async ones from the OpenAPI schema
+if config.ASYNC_DB:
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.endpoint.__module__ != async_routes.__name__:
+            if any((route.path_format, method) in async_operations for method in route.methods):
+                route.include_in_schema = False
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -46,5 +106,30 @@ async def root():
     """
     return {"message": "Welcome to Map My World API"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """
+    Metrics of this worker in the Prometheus text format.
+
+    Returns:
+        str: Per-endpoint latency histograms and SQL statistics, connection pool
+        usage and cache counters. Request metrics are only recorded when
+        METRICS_ENABLED is set.
+    """
+    pools = {"sync": engine.pool}
+    if database.async_engine is not None:
+        pools["async"] = database.async_engine.pool
+    for index, replica in enumerate(database.read_replicas.engines):
+        pools[f"replica{index}"] = replica.pool
+    for index, replica in enumerate(database.async_read_replicas.engines):
+        pools[f"async_replica{index}"] = replica.pool
+    caches = {
+        "recommendations": cache.recommendation_cache.stats(),
+        "entities": cache.entity_cache.stats(),
+        "category_catalog": cache.category_catalog.stats(),
+    }
+    admission_stats = admission.controller.stats() if admission.controller is not None else None
+    return PlainTextResponse(metrics.render(pools, caches, admission_stats), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
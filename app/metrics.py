@@ -0,0 +1,299 @@
+"""
+Per-request SQL instrumentation exposed in the Prometheus text format.
+
+``MetricsMiddleware`` opens a ``RequestStats`` for every HTTP request in a context
+variable. SQLAlchemy cursor events and the instrumented pool classes add to it the
+statements run, their time and rows, and the time spent waiting for a pooled
+connection. When the response is sent, the stats are folded into per-endpoint
+histograms and counters, labelled with the route template rather than the raw
+path so that IDs do not create new series.
+"""
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import Dict, Optional, Tuple
+from . import config
+import bisect
+import logging
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds or statements
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Longest statement text written to the slow query log
+SLOW_QUERY_LOG_CHARS = 1000
+
+class RequestStats:
+    """
+    Database work done on behalf of one request.
+    """
+    __slots__ = ("path", "statements", "slow_statements", "db_seconds", "rows", "pool_wait_seconds", "_lock")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.statements = 0
+        self.slow_statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.pool_wait_seconds = 0.0
+        # Sync endpoints run in the threadpool, possibly alongside a streaming generator.
+        self._lock = threading.Lock()
+
+    def add_statement(self, seconds: float, rows: int, slow: bool):
+        with self._lock:
+            self.statements += 1
+            self.slow_statements += slow
+            self.db_seconds += seconds
+            if rows > 0:
+                self.rows += rows
+
+    def add_pool_wait(self, seconds: float):
+        with self._lock:
+            self.pool_wait_seconds += seconds
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+class Histogram:
+    """
+    Prometheus histogram with labels.
+    """
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...], buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts, then the +Inf count and the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (str(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Counter:
+    """
+    Prometheus counter with labels.
+    """
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], value: float = 1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+def _labels(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+ENDPOINT_LABELS = ("method", "endpoint")
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the end of its response.",
+    ENDPOINT_LABELS + ("status",), LATENCY_BUCKETS
+)
+request_statements = Histogram(
+    "http_request_db_statements", "SQL statements executed per request.",
+    ENDPOINT_LABELS, STATEMENT_BUCKETS
+)
+request_pool_wait = Histogram(
+    "http_request_db_pool_wait_seconds", "Time per request spent waiting for a pooled database connection.",
+    ENDPOINT_LABELS, LATENCY_BUCKETS
+)
+db_seconds = Counter(
+    "http_request_db_seconds_total", "Time spent executing SQL statements.", ENDPOINT_LABELS
+)
+db_rows = Counter(
+    "http_request_db_rows_total", "Rows returned or affected by SQL statements, as reported by the driver.", ENDPOINT_LABELS
+)
+slow_queries = Counter(
+    "db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.", ENDPOINT_LABELS
+)
+admission_wait = Histogram(
+    "http_admission_wait_seconds", "Time API requests waited for admission.", ("priority",), LATENCY_BUCKETS
+)
+admission_rejections = Counter(
+    "http_admission_rejected_total", "API requests answered 503 by admission control.", ("priority", "reason")
+)
+
+# Endpoint label of requests that did not match a route
+UNMATCHED_ENDPOINT = "unmatched"
+
+# Labels of statements run outside any request, such as write-behind flushes
+BACKGROUND_LABELS = ("", "background")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and database work of every HTTP request.
+    """
+    def __init__(self, app):
+        self.app = app
+        self._endpoint_paths = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope["path"])
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_stats.reset(token)
+            labels = (scope["method"], self._endpoint(scope))
+            request_duration.observe(labels + (str(status_code),), time.perf_counter() - started)
+            request_statements.observe(labels, stats.statements)
+            request_pool_wait.observe(labels, stats.pool_wait_seconds)
+            db_seconds.inc(labels, stats.db_seconds)
+            db_rows.inc(labels, stats.rows)
+            if stats.slow_statements:
+                slow_queries.inc(labels, stats.slow_statements)
+
+    def _endpoint(self, scope):
+        """
+        Return the route template of the endpoint the router dispatched the request to.
+        """
+        if self._endpoint_paths is None:
+            self._endpoint_paths = {
+                route.endpoint: route.path_format
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint") and hasattr(route, "path_format")
+            }
+        return self._endpoint_paths.get(scope.get("endpoint"), UNMATCHED_ENDPOINT)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    slow = config.SLOW_QUERY_MS > 0 and elapsed * 1000 >= config.SLOW_QUERY_MS
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_statement(elapsed, cursor.rowcount, slow)
+    elif slow:
+        slow_queries.inc(BACKGROUND_LABELS)
+    if slow:
+        source = stats.path if stats is not None else "background"
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms, {source}): {' '.join(statement.split())[:SLOW_QUERY_LOG_CHARS]}")
+
+def instrument_engine(engine):
+    """
+    Attach the statement timing hooks to a sync engine, or to the sync side of an async one.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def _record_pool_wait(started: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_pool_wait(time.perf_counter() - started)
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool recording the time spent waiting for a connection to the current request.
+    """
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _record_pool_wait(started)
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool recording the time spent waiting for a connection to the current request.
+    """
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _record_pool_wait(started)
+
+def _gauges(name: str, documentation: str, label_name: str, values: Dict[str, float]):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for label, value in sorted(values.items()):
+        lines.append(f"{name}{_labels((label_name,), (label,))} {value}")
+    return lines
+
+def render(pools: Dict[str, object], caches: Dict[str, dict], admission: Optional[dict] = None) -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Args:
+        pools (Dict[str, Pool]): Connection pools by name, reported as gauges.
+        caches (Dict[str, dict]): Cache ``stats()`` by cache name.
+        admission (Optional[dict]): Admission controller ``stats()``, when it is enabled.
+
+    Returns:
+        str: The metrics page.
+    """
+    lines = []
+    for metric in (
+        request_duration, request_statements, request_pool_wait, db_seconds, db_rows, slow_queries,
+        admission_wait, admission_rejections,
+    ):
+        lines += metric.render()
+
+    queue_pools = {name: pool for name, pool in pools.items() if isinstance(pool, QueuePool)}
+    lines += _gauges("db_pool_size", "Connections kept open by the pool.", "pool",
+                     {name: pool.size() for name, pool in queue_pools.items()})
+    lines += _gauges("db_pool_checked_out", "Connections currently checked out of the pool.", "pool",
+                     {name: pool.checkedout() for name, pool in queue_pools.items()})
+    lines += _gauges("db_pool_overflow", "Connections open beyond the pool size.", "pool",
+                     {name: pool.overflow() for name, pool in queue_pools.items()})
+
+    lines += _gauges("cache_hits", "Cache hits since the worker started.", "cache",
+                     {name: stats["hits"] for name, stats in caches.items()})
+    lines += _gauges("cache_misses", "Cache misses since the worker started.", "cache",
+                     {name: stats["misses"] for name, stats in caches.items()})
+    lines += _gauges("cache_size", "Entries currently cached.", "cache",
+                     {name: stats["size"] for name, stats in caches.items()})
+
+    if admission is not None:
+        lines += _gauges("http_admission_requests", "API requests running or waiting for admission.", "state", admission)
+    return "\n".join(lines) + "\n"
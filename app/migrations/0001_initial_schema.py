@@ -0,0 +1,6 @@
+"""Create the tables of the models that do not exist yet."""
+from .. import models
+
+def upgrade(bind):
+    # Tables that already exist are left as they are, with their indexes
+    models.Base.metadata.create_all(bind=bind)
@@ -0,0 +1,30 @@
+"""Add the geohash of the locations, backfilled in batches, and its prefix index."""
+from sqlalchemy import inspect, text
+from .. import geo
+from . import create_index
+
+# Locations updated per transaction by the backfill
+BATCH_SIZE = 1000
+
+def upgrade(bind):
+    if 'geohash' not in {column['name'] for column in inspect(bind).get_columns('locations')}:
+        with bind.begin() as connection:
+            connection.execute(text(f"ALTER TABLE locations ADD COLUMN geohash VARCHAR({geo.GEOHASH_PRECISION})"))
+
+    # Short transactions, so that the backfill does not hold row locks for long
+    last_id = 0
+    while True:
+        with bind.begin() as connection:
+            rows = connection.execute(text(
+                "SELECT id, latitude, longitude FROM locations "
+                "WHERE id > :last_id AND geohash IS NULL ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+            if not rows:
+                break
+            connection.execute(text("UPDATE locations SET geohash = :geohash WHERE id = :id"), [
+                {"id": row.id, "geohash": geo.encode_geohash(row.latitude, row.longitude)} for row in rows
+            ])
+        last_id = rows[-1].id
+
+    columns = "geohash text_pattern_ops" if bind.dialect.name == 'postgresql' else "geohash"
+    create_index(bind, 'idx_location_geohash', 'locations', columns)
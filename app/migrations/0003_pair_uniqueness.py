@@ -0,0 +1,61 @@
+"""Merge the duplicate reviews and location categories of a pair, and make pairs unique."""
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from . import create_index, has_unique_constraint
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (table, unique constraint) of the tables holding one row per location-category pair
+PAIR_TABLES = (
+    ('reviews', 'uq_reviews_location_category'),
+    ('location_category', 'uq_location_category_pair'),
+)
+
+# Times the duplicates are merged again when concurrent writes add new ones during the index build
+ATTEMPTS = 3
+
+def _merge_duplicates(bind, table: str) -> int:
+    """
+    Keep the first row of each pair with the latest last_reviewed of the pair, and
+    delete the others, in one transaction.
+    """
+    duplicate_pairs = (
+        f"SELECT location_id, category_id, MIN(id) AS kept_id FROM {table} "
+        "WHERE location_id IS NOT NULL AND category_id IS NOT NULL "
+        "GROUP BY location_id, category_id HAVING COUNT(*) > 1"
+    )
+    with bind.begin() as connection:
+        connection.execute(text(
+            f"UPDATE {table} SET last_reviewed = ("
+            f"SELECT MAX(duplicate.last_reviewed) FROM {table} duplicate "
+            f"WHERE duplicate.location_id = {table}.location_id AND duplicate.category_id = {table}.category_id"
+            f") WHERE id IN (SELECT kept_id FROM ({duplicate_pairs}) duplicate_pair)"
+        ))
+        return connection.execute(text(
+            f"DELETE FROM {table} WHERE id IN ("
+            f"SELECT duplicate.id FROM {table} duplicate JOIN ({duplicate_pairs}) duplicate_pair "
+            "ON duplicate.location_id = duplicate_pair.location_id AND duplicate.category_id = duplicate_pair.category_id "
+            "WHERE duplicate.id <> duplicate_pair.kept_id)"
+        )).rowcount
+
+def upgrade(bind):
+    for table, name in PAIR_TABLES:
+        if has_unique_constraint(bind, table, name):
+            continue
+        for attempt in range(1, ATTEMPTS + 1):
+            removed = _merge_duplicates(bind, table)
+            if removed:
+                logger.info(f"Deleted {removed} duplicate rows from {table}")
+            try:
+                create_index(bind, name, table, "location_id, category_id", unique=True)
+                break
+            except IntegrityError:
+                if attempt == ATTEMPTS:
+                    raise
+                logger.info(f"New duplicates in {table} during the index build, merging again")
+
+        if bind.dialect.name == 'postgresql':
+            # Attaching the index only takes a brief lock; the table is not scanned again
+            with bind.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}"))
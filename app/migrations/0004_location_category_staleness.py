@@ -0,0 +1,14 @@
+"""Index the location categories in recommendation order."""
+from . import create_index
+
+def upgrade(bind):
+    if bind.dialect.name == 'postgresql':
+        create_index(
+            bind, 'idx_location_category_staleness', 'location_category',
+            "last_reviewed ASC NULLS FIRST, location_id, category_id"
+        )
+    else:
+        create_index(
+            bind, 'idx_location_category_staleness_default', 'location_category',
+            "last_reviewed, location_id, category_id"
+        )
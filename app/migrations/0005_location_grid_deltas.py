@@ -0,0 +1,5 @@
+"""Queue the location grid changes of the writes in a table folded in the background."""
+from .. import models
+
+def upgrade(bind):
+    models.LocationGridDelta.__table__.create(bind, checkfirst=True)
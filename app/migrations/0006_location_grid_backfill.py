@@ -0,0 +1,10 @@
+"""Build the location grid of the locations created before it existed."""
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .. import crud, models
+
+def upgrade(bind):
+    with Session(bind) as db:
+        if db.scalar(select(models.LocationGridCell.cell).limit(1)) is None \
+                and db.scalar(select(models.Location.id).limit(1)) is not None:
+            crud.rebuild_location_grid(db)
@@ -0,0 +1,16 @@
+"""Queue the review events to roll up in a table, replacing the rollup watermark."""
+from sqlalchemy import inspect, text
+from .. import models
+
+def upgrade(bind):
+    models.PendingReviewEvent.__table__.create(bind, checkfirst=True)
+    if not inspect(bind).has_table('rollup_watermarks'):
+        return
+    with bind.begin() as connection:
+        last_event_id = connection.scalar(text(
+            "SELECT last_event_id FROM rollup_watermarks WHERE name = 'review_events'"
+        ))
+        connection.execute(text(
+            "INSERT INTO review_events_pending (event_id) SELECT id FROM review_events WHERE id > :last_event_id"
+        ), {"last_event_id": last_event_id or 0})
+        connection.execute(text("DROP TABLE rollup_watermarks"))
@@ -0,0 +1,143 @@
+"""
+Versioned schema migrations.
+
+Each migration is a module of this package named ``<4-digit version>_<name>.py``
+with a docstring describing it and an ``upgrade(bind)`` function receiving the
+Engine. Migrations run in version order and each version is recorded in the
+``schema_migrations`` table once its upgrade returns. An upgrade interrupted
+midway is run again from the start, so every upgrade must be safe to repeat.
+
+``create_all`` only creates missing tables: indexes, constraints and columns added
+to an existing table need a new migration. Indexes are built with
+``create_index``, which uses ``CREATE INDEX CONCURRENTLY`` on PostgreSQL so that
+writes go on during the build.
+
+Apply the pending migrations with ``python -m app.migrations``; the application
+also applies them on startup unless MIGRATE_ON_STARTUP is disabled.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, func, insert, inspect, select, text
+from typing import List
+import importlib
+import logging
+import pkgutil
+import re
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Key of the PostgreSQL advisory lock letting one process migrate at a time
+ADVISORY_LOCK_KEY = 7_290_201
+
+# Seconds between two attempts to take the advisory lock
+LOCK_POLL_INTERVAL = 0.5
+
+schema_migrations = Table(
+    'schema_migrations',
+    MetaData(),
+    Column('version', String(128), primary_key=True),
+    Column('description', Text),
+    Column('applied_at', DateTime(timezone=True), nullable=False),
+)
+
+def migrations():
+    """
+    Return the (version, module) of every migration, in version order.
+    """
+    found = []
+    for module_info in pkgutil.iter_modules(__path__):
+        if re.fullmatch(r"\d{4}_\w+", module_info.name):
+            found.append((module_info.name, importlib.import_module(f"{__name__}.{module_info.name}")))
+    return sorted(found, key=lambda migration: migration[0])
+
+def applied_versions(bind) -> List[str]:
+    """
+    Return the versions already applied to the database.
+    """
+    schema_migrations.create(bind, checkfirst=True)
+    with bind.connect() as connection:
+        return list(connection.scalars(select(schema_migrations.c.version)))
+
+def migrate(bind=None) -> List[str]:
+    """
+    Apply the pending migrations.
+
+    On PostgreSQL, an advisory lock makes concurrent runs, such as several workers
+    starting at once, wait for each other. Waiting runs poll the lock outside of any
+    transaction: a run blocked inside one would hold a snapshot that the concurrent
+    index builds of the lock holder wait for.
+
+    Args:
+        bind (Engine): The database engine, the primary engine by default.
+
+    Returns:
+        List[str]: The versions applied by this call.
+    """
+    if bind is None:
+        from ..database import engine as bind
+
+    applied = []
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        if bind.dialect.name == 'postgresql':
+            while not lock_connection.scalar(select(func.pg_try_advisory_lock(ADVISORY_LOCK_KEY))):
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            done = set(applied_versions(bind))
+            for version, module in migrations():
+                if version in done:
+                    continue
+                description = (module.__doc__ or '').strip()
+                logger.info(f"Applying migration {version}: {description}")
+                module.upgrade(bind)
+                with bind.begin() as connection:
+                    connection.execute(insert(schema_migrations).values(
+                        version=version, description=description, applied_at=datetime.now(timezone.utc)
+                    ))
+                applied.append(version)
+        finally:
+            if bind.dialect.name == 'postgresql':
+                lock_connection.execute(select(func.pg_advisory_unlock(ADVISORY_LOCK_KEY)))
+    if applied:
+        logger.info(f"Applied {len(applied)} migrations")
+    return applied
+
+def create_index(bind, name: str, table: str, columns: str, unique: bool = False):
+    """
+    Create an index if it does not exist, without blocking writes on PostgreSQL.
+
+    On PostgreSQL the index is built with CREATE INDEX CONCURRENTLY, outside of any
+    transaction. A build that failed leaves an invalid index behind; it is dropped
+    and built again.
+
+    Args:
+        bind (Engine): The database engine.
+        name (str): The index name.
+        table (str): The indexed table.
+        columns (str): The SQL list of indexed columns, with their options.
+        unique (bool): Create a unique index.
+
+    Raises:
+        IntegrityError: If ``unique`` and the table holds duplicates.
+    """
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if bind.dialect.name != 'postgresql':
+        with bind.begin() as connection:
+            connection.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns})"))
+        return
+
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        valid = connection.scalar(text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+        ), {"name": name})
+        if valid is False:
+            logger.info(f"Dropping invalid index {name} left by an interrupted build")
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        connection.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"))
+
+def has_unique_constraint(bind, table: str, name: str) -> bool:
+    """
+    Return whether ``table`` has a unique constraint called ``name``.
+    """
+    return any(constraint['name'] == name for constraint in inspect(bind).get_unique_constraints(table))
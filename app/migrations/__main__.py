@@ -0,0 +1,11 @@
+"""
+Apply the pending schema migrations to the database in DATABASE_URL.
+
+Usage:
+    python -m app.migrations
+"""
+from . import migrate
+
+if __name__ == "__main__":
+    applied = migrate()
+    print("\n".join(applied) if applied else "The database is up to date")
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index, Text
+from sqlalchemy import BigInteger, Column, Integer, Float, Date, DateTime, ForeignKey, Index, String, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from .database import Base
+from . import geo
 
 class TimestampMixin:
     """
@@ -10,6 +11,13 @@ class TimestampMixin:
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
+def _location_geohash(context):
+    """
+    Column default computing the geohash of the location being inserted.
+    """
+    params = context.get_current_parameters()
+    return geo.encode_geohash(params['latitude'], params['longitude'])
+
 class Location(TimestampMixin, Base):
     """
     Represents a location in the database.
@@ -18,11 +26,13 @@ class Location(TimestampMixin, Base):
     id = Column(Integer, primary_key=True)
     longitude = Column(Float, nullable=False)
     latitude = Column(Float, nullable=False)
+    geohash = Column(String(geo.GEOHASH_PRECISION), default=_location_geohash)
     location_categories = relationship('LocationCategory', back_populates='location')
     reviews = relationship('Review', back_populates='location')
 
     __table_args__ = (
         Index('idx_location_coords', 'longitude', 'latitude'),
+        Index('idx_location_geohash', 'geohash', postgresql_ops={'geohash': 'text_pattern_ops'}),
     )
 
 class Category(TimestampMixin, Base):
@@ -46,6 +56,46 @@ class Review(TimestampMixin, Base):
     location = relationship('Location', back_populates='reviews')
     category = relationship('Category')
 
+    __table_args__ = (
+        UniqueConstraint('location_id', 'category_id', name='uq_reviews_location_category'),
+    )
+
+class ReviewEvent(Base):
+    """
+    One review of a location-category pair. Rows are only ever inserted.
+    """
+    __tablename__ = 'review_events'
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    location_id = Column(Integer, ForeignKey('locations.id'), nullable=False)
+    category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
+    reviewed_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index('idx_review_events_pair', location_id, category_id, id),
+    )
+
+class ReviewDailyCount(Base):
+    """
+    Number of reviews of a location-category pair on a UTC day, rolled up from the review events.
+    """
+    __tablename__ = 'review_daily_counts'
+    location_id = Column(Integer, ForeignKey('locations.id'), primary_key=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    reviews = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_review_daily_counts_day', 'day'),
+    )
+
+class PendingReviewEvent(Base):
+    """
+    Review event not rolled up yet, inserted along with the event and deleted by the
+    rollup that folds it.
+    """
+    __tablename__ = 'review_events_pending'
+    event_id = Column(BigInteger().with_variant(Integer, 'sqlite'), ForeignKey('review_events.id'), primary_key=True)
+
 class LocationCategory(TimestampMixin, Base):
     """
     Represents a many-to-many relationship between locations and categories.
@@ -56,4 +106,85 @@ class LocationCategory(TimestampMixin, Base):
     category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
     last_reviewed = Column(DateTime(timezone=True), default=None)
     location = relationship('Location', back_populates='location_categories')
-    category = relationship('Category', back_populates='location_categories')
\ No newline at end of file
+    category = relationship('Category', back_populates='location_categories')
+
+    __table_args__ = (
+        UniqueConstraint('location_id', 'category_id', name='uq_location_category_pair'),
+        # Staleness key matching the recommendation ordering, so the top-N is an index range read.
+        # NULLS FIRST is explicit on PostgreSQL, where ascending indexes sort NULLs last.
+        Index(
+            'idx_location_category_staleness',
+            last_reviewed.asc().nulls_first(), location_id, category_id
+        ).ddl_if(dialect='postgresql'),
+        Index(
+            'idx_location_category_staleness_default',
+            last_reviewed, location_id, category_id
+        ).ddl_if(callable_=lambda ddl, target, bind, **kw: bind.dialect.name != 'postgresql'),
+    )
+
+class RecommendationLease(Base):
+    """
+    Location-category pair claimed by an explorer until ``expires_at``.
+
+    Deleted when the pair is reviewed or released; an expired lease can be taken over
+    by the next claim.
+    """
+    __tablename__ = 'recommendation_leases'
+    location_id = Column(Integer, ForeignKey('locations.id'), primary_key=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), primary_key=True)
+    holder = Column(String(64), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index('idx_recommendation_leases_holder', 'holder'),
+    )
+
+class LocationGridCell(Base):
+    """
+    Number of locations and sums of their coordinates in a geohash cell, per grid precision.
+
+    Maintained from the queued ``LocationGridDelta`` rows by
+    ``crud.roll_up_location_grid``, and rebuilt with ``crud.rebuild_location_grid``.
+    """
+    __tablename__ = 'location_grid'
+    precision = Column(Integer, primary_key=True)
+    cell = Column(String(geo.GEOHASH_PRECISION), primary_key=True)
+    locations = Column(Integer, nullable=False, default=0)
+    longitude_sum = Column(Float, nullable=False, default=0)
+    latitude_sum = Column(Float, nullable=False, default=0)
+
+class LocationGridReviewDay(Base):
+    """
+    Number of location-category pairs of a geohash cell whose last review happened on a given day.
+
+    Only the days that can still make a pair fresh are kept. Maintained from the
+    queued ``LocationGridDelta`` rows by ``crud.roll_up_location_grid``, and rebuilt
+    with ``crud.rebuild_location_grid``.
+    """
+    __tablename__ = 'location_grid_review_days'
+    precision = Column(Integer, primary_key=True)
+    cell = Column(String(geo.GEOHASH_PRECISION), primary_key=True)
+    day = Column(Date, primary_key=True)
+    pairs = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_location_grid_review_days_day', 'day'),
+    )
+
+
+class LocationGridDelta(Base):
+    """
+    A change to the location grid, queued by a write until the grid rollup folds it in.
+
+    Deltas are recorded at the finest grid precision only. Writes append them instead
+    of updating the counters of every precision, whose coarse cells are shared by
+    every write in a region.
+    """
+    __tablename__ = 'location_grid_deltas'
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    cell = Column(String(geo.GEOHASH_PRECISION), nullable=False)
+    locations = Column(Integer, nullable=False, default=0)
+    longitude_sum = Column(Float, nullable=False, default=0)
+    latitude_sum = Column(Float, nullable=False, default=0)
+    day = Column(Date)
+    pairs = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,70 @@
+from . import config
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ReviewRollup:
+    """
+    Background rollup of the review events into the reviews, the location categories
+    and the daily review counts.
+
+    Every ``interval`` seconds, events are folded ``batch_size`` at a time until none
+    is left. Every worker runs one; concurrent rollups fold disjoint events.
+    """
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """
+        Fold the waiting events.
+
+        Returns:
+            int: The number of events folded.
+        """
+        from . import crud
+        from .database import SessionLocal
+
+        folded = 0
+        db = SessionLocal()
+        try:
+            while not self._stopping.is_set():
+                count = crud.roll_up_review_events(db, batch_size=self.batch_size)
+                folded += count
+                if count < self.batch_size:
+                    break
+        except Exception as e:
+            logger.error(f"Error rolling up review events: {str(e)}")
+        finally:
+            db.close()
+        return folded
+
+    def start(self):
+        """
+        Start the background rollup thread.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="review-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread. Events not rolled up yet are left to the next start.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.run_once()
+
+review_rollup = ReviewRollup(
+    interval=config.REVIEW_ROLLUP_INTERVAL,
+    batch_size=config.REVIEW_ROLLUP_BATCH_SIZE
+) if config.REVIEW_EVENTS_ENABLED else None
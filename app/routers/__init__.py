@@ -1,4 +1,6 @@
+from .caches import router as caches_router
 from .categories import router as categories_router
+from .exports import router as exports_router
 from .locations import router as locations_router
 from .recommendations import router as recommendations_router
 from .reviews import router as reviews_router
\ No newline at end of file
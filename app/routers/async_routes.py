@@ -0,0 +1,540 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import List, Literal, Optional, Tuple
+from .. import cache, conditional, config, crud, crud_async, geo, models, review_events, schemas, serialization, write_behind
+from .exports import EXPORT_COLUMNS, MEDIA_TYPES, ExportEntity, ExportFormat, _encode_csv, _encode_ndjson
+from .locations import MAX_NEARBY_RADIUS_M, lookup_ids
+from .recommendations import recommendation_scope
+from .reviews import MAX_REVIEW_BATCH_SIZE, accept_review, lookup_pairs, record_review_event, review_count_range
+from ..database import get_async_db, get_async_read_db, open_async_read_session, reads_own_writes
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of the database routes, mounted in front of the sync routers when
+# ASYNC_DB is enabled. Path parameters use the int convertor so that the literal paths
+# such as /locations/nearby are not taken for IDs. The cache counter routes do not
+# touch the database and are only served by the sync routers.
+categories_router = APIRouter()
+locations_router = APIRouter()
+recommendations_router = APIRouter()
+reviews_router = APIRouter()
+exports_router = APIRouter()
+
+@categories_router.post("/", response_model=schemas.Category, status_code=status.HTTP_201_CREATED)
+async def create_category(category: schemas.CategoryCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create a new category.
+
+    Parameters:
+    - **category**: A CategoryCreate object containing the name of the new category.
+
+    Returns:
+    - A Category object with the details of the created category, including its ID and timestamps.
+
+    Raises:
+    - 409 Conflict: If a category with the same name already exists.
+    - 500 Internal Server Error: If there's an unexpected error during category creation.
+    """
+    return await crud_async.create_category(db=db, category=category)
+
+@categories_router.get("/", response_model=List[schemas.Category])
+async def read_categories(request: Request, response: Response, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve a list of categories, ordered by ID.
+
+    Parameters:
+    - **skip**: Number of categories to skip (default: 0)
+    - **limit**: Maximum number of categories to return (default: 100)
+    - **after_id**: Only return categories with an ID greater than this cursor.
+
+    Returns:
+    - A list of Category objects, each containing the category's details.
+    - An `X-Next-Cursor` header with the `after_id` of the next page, when the page is full.
+    - `ETag` and `Last-Modified` headers for conditional requests.
+    """
+    version = await crud_async.get_category_page_version(db, skip=skip, limit=limit, after_id=after_id)
+    current = conditional.validators(*version, last_modified=version[2])
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION and not cache.category_catalog.enabled:
+        rows = await crud_async.get_page_rows(db, models.Category, schemas.Category, skip=skip, limit=limit, after_id=after_id)
+        return conditional.set_headers(serialization.page_response(schemas.Category, rows, limit), current)
+    categories = await crud_async.get_categories(db=db, skip=skip, limit=limit, after_id=after_id)
+    if limit > 0 and len(categories) == limit:
+        response.headers["X-Next-Cursor"] = str(categories[-1].id)
+    return categories
+
+@categories_router.get("/{category_id:int}", response_model=schemas.Category)
+async def read_category(request: Request, response: Response, category_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve a specific category by ID.
+
+    Parameters:
+    - **category_id**: The ID of the category to retrieve (path parameter)
+
+    Returns:
+    - A Category object containing the details of the requested category, with
+      `ETag` and `Last-Modified` headers for conditional requests.
+
+    Raises:
+    - 404 Not Found: If no category with the given ID exists.
+    """
+    db_category = await crud_async.get_category(db=db, category_id=category_id)
+    if db_category is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    current = conditional.validators(db_category.id, db_category.updated_at, last_modified=db_category.updated_at)
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    return db_category
+
+@categories_router.get("/lookup", response_model=List[Optional[schemas.Category]])
+async def read_categories_by_ids(category_ids: List[int] = Depends(lookup_ids), db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve several categories by ID in one request.
+
+    Parameters:
+    - **ids**: Comma-separated IDs of the categories, at most 1000 (for example `ids=3,1,2`)
+
+    Returns:
+    - One entry per ID, in the order given: the Category object, or null if no
+      category has that ID.
+
+    Raises:
+    - 400 Bad Request: If the IDs are malformed or too many.
+    """
+    return await db.run_sync(crud.get_categories_by_ids, category_ids)
+
+@locations_router.post("/", response_model=schemas.Location, status_code=status.HTTP_201_CREATED)
+async def create_location(location: schemas.LocationCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create a new location.
+
+    Parameters:
+    - **location**: A LocationCreate object containing the longitude and latitude of the new location.
+
+    Returns:
+    - A Location object with the details of the created location, including its ID and timestamps.
+
+    Raises:
+    - 500 Internal Server Error: If there's an unexpected error during location creation.
+    """
+    return await crud_async.create_location(db=db, location=location)
+
+@locations_router.get("/", response_model=List[schemas.Location])
+async def read_locations(request: Request, response: Response, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve a list of locations, ordered by ID.
+
+    Parameters:
+    - **skip**: Number of locations to skip (default: 0)
+    - **limit**: Maximum number of locations to return (default: 100)
+    - **after_id**: Only return locations with an ID greater than this cursor.
+
+    Returns:
+    - A list of Location objects, each containing the location's details.
+    - An `X-Next-Cursor` header with the `after_id` of the next page, when the page is full.
+    - `ETag` and `Last-Modified` headers for conditional requests.
+    """
+    version = await crud_async.get_page_version(db, models.Location, skip=skip, limit=limit, after_id=after_id)
+    current = conditional.validators(*version, last_modified=version[2])
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION:
+        rows = await crud_async.get_page_rows(db, models.Location, schemas.Location, skip=skip, limit=limit, after_id=after_id)
+        return conditional.set_headers(serialization.page_response(schemas.Location, rows, limit), current)
+    locations = await crud_async.get_locations(db, skip=skip, limit=limit, after_id=after_id)
+    if limit > 0 and len(locations) == limit:
+        response.headers["X-Next-Cursor"] = str(locations[-1].id)
+    return locations
+
+@locations_router.get("/{location_id:int}", response_model=schemas.Location)
+async def read_location(request: Request, response: Response, location_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve a specific location by ID.
+
+    Parameters:
+    - **location_id**: The ID of the location to retrieve (path parameter)
+
+    Returns:
+    - A Location object containing the details of the requested location, with
+      `ETag` and `Last-Modified` headers for conditional requests.
+
+    Raises:
+    - 404 Not Found: If no location with the given ID exists.
+    """
+    db_location = await crud_async.get_location(db, location_id=location_id)
+    if db_location is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    current = conditional.validators(db_location.id, db_location.updated_at, last_modified=db_location.updated_at)
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    return db_location
+
+@locations_router.get("/nearby", response_model=List[schemas.NearbyLocation])
+async def read_locations_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(..., gt=0, le=MAX_NEARBY_RADIUS_M),
+    limit: int = Query(100, gt=0, le=1000),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Retrieve the locations within a radius of a point.
+
+    Parameters:
+    - **lat**: Latitude of the search center
+    - **lon**: Longitude of the search center
+    - **radius_m**: Search radius in meters, at most 100 km
+    - **limit**: Maximum number of locations to return (default: 100)
+
+    Returns:
+    - A list of Location objects with their distance in meters, nearest first.
+    """
+    return await db.run_sync(crud.get_locations_nearby, latitude=lat, longitude=lon, radius_m=radius_m, limit=limit)
+
+@locations_router.get("/within", response_model=List[schemas.Location])
+async def read_locations_within(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    limit: int = Query(100, gt=0, le=1000),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Retrieve the locations inside a bounding box.
+
+    Parameters:
+    - **bbox**: The box as "min_lon,min_lat,max_lon,max_lat". A box with min_lon > max_lon crosses the antimeridian.
+    - **limit**: Maximum number of locations to return (default: 100)
+
+    Returns:
+    - A list of Location objects, ordered by ID.
+
+    Raises:
+    - 400 Bad Request: If the bounding box is malformed.
+    """
+    try:
+        parsed_bbox = geo.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return await db.run_sync(crud.get_locations_within, bbox=parsed_bbox, limit=limit)
+
+@locations_router.get("/lookup", response_model=List[Optional[schemas.Location]])
+async def read_locations_by_ids(location_ids: List[int] = Depends(lookup_ids), db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve several locations by ID in one request.
+
+    Parameters:
+    - **ids**: Comma-separated IDs of the locations, at most 1000 (for example `ids=3,1,2`)
+
+    Returns:
+    - One entry per ID, in the order given: the Location object, or null if no
+      location has that ID.
+
+    Raises:
+    - 400 Bad Request: If the IDs are malformed or too many.
+    """
+    return await db.run_sync(crud.get_locations_by_ids, location_ids)
+
+@locations_router.get("/tiles/{z}/{x}/{y}", response_model=schemas.LocationTile)
+async def read_location_tile(
+    z: int = Path(..., ge=0, le=geo.MAX_TILE_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    stale: bool = False,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Retrieve the locations of a web map tile, aggregated per grid cell.
+
+    Parameters:
+    - **z**: Zoom level (path parameter)
+    - **x**: Tile column, from 0 at the antimeridian (path parameter)
+    - **y**: Tile row, from 0 at the north edge (path parameter)
+    - **stale**: Also return, per cell, the number of location-category pairs due for a review (default: false)
+
+    Returns:
+    - A LocationTile object with the grid precision and, for each non-empty cell, its
+      geohash, number of locations and centroid.
+
+    Raises:
+    - 400 Bad Request: If x or y is outside the tiles of the zoom level.
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tile coordinates out of range")
+    return await db.run_sync(crud.get_location_tile, z=z, x=x, y=y, include_stale=stale)
+
+@recommendations_router.get("/", response_model=List[schemas.Recommendation], status_code=status.HTTP_200_OK)
+async def get_recommendations(
+    request: Request,
+    response: Response,
+    scope: crud.RecommendationScope = Depends(recommendation_scope),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Retrieve a list of recommendations.
+
+    This endpoint returns a list of 10 location-category combinations that have not been
+    reviewed in the last 30 days, prioritizing those that have never been reviewed.
+
+    Parameters:
+    - **lat**, **lon**, **radius_m** or **bbox**: Only rank the pairs of the locations in this region
+    - **category_id**: Only recommend pairs of this category
+    - **limit**: Number of recommendations to return (default: 10, at most 100)
+
+    Returns:
+        List[schemas.Recommendation]: A list of recommended location-category combinations,
+        with an `ETag` header for conditional requests.
+    """
+    recommendations, version = await crud_async.get_versioned_recommendations(db, scope, rows=config.FAST_SERIALIZATION)
+    current = conditional.validators(*version)
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION:
+        return conditional.set_headers(serialization.recommendations_response(recommendations), current)
+    return recommendations
+
+@recommendations_router.post("/claims", response_model=List[schemas.RecommendationClaim], status_code=status.HTTP_200_OK)
+async def claim_recommendations(
+    holder: str = Query(..., min_length=1, max_length=64),
+    scope: crud.RecommendationScope = Depends(recommendation_scope),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Claim the next recommendations, leasing them to the caller.
+
+    Parameters:
+    - **holder**: Identifier of the explorer, used to release the leases
+    - **lat**, **lon**, **radius_m** or **bbox**: Only claim pairs of the locations in this region
+    - **category_id**: Only claim pairs of this category
+    - **limit**: Number of pairs to claim (default: 10, at most 100)
+
+    Returns:
+        List[schemas.RecommendationClaim]: The claimed pairs in rank order, with the
+        expiry of their lease.
+
+    Raises:
+    - 400 Bad Request: If the region parameters are incomplete, combined or malformed.
+    """
+    return await db.run_sync(crud.claim_recommendations, holder, scope)
+
+@recommendations_router.delete("/claims", response_model=schemas.ReleasedClaims, status_code=status.HTTP_200_OK)
+async def release_recommendations(
+    holder: str = Query(..., min_length=1, max_length=64),
+    pairs: Optional[str] = Query(None, description="Comma-separated location_id:category_id pairs"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Release claimed recommendations before their lease expires.
+
+    Parameters:
+    - **holder**: Identifier of the explorer who claimed the pairs
+    - **pairs**: The pairs to release as "location_id:category_id,...", all the pairs of the holder by default
+
+    Returns:
+        schemas.ReleasedClaims: The number of leases released.
+
+    Raises:
+    - 400 Bad Request: If the pairs are malformed or too many.
+    """
+    parsed_pairs = lookup_pairs(pairs) if pairs is not None else None
+    return schemas.ReleasedClaims(released=await db.run_sync(crud.release_recommendations, holder, parsed_pairs))
+
+@reviews_router.get("/", response_model=List[schemas.Review], status_code=status.HTTP_200_OK)
+async def read_reviews(request: Request, response: Response, skip: int = 0, limit: int = 10, after_id: Optional[int] = None, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve a list of reviews, ordered by ID.
+
+    Args:
+        skip (int): Number of reviews to skip (for pagination).
+        limit (int): Maximum number of reviews to return.
+        after_id (Optional[int]): Only return reviews with an ID greater than this cursor.
+        db (AsyncSession): The database session.
+
+    Returns:
+        List[schemas.Review]: A list of reviews, with `ETag` and `Last-Modified` headers
+        for conditional requests.
+    """
+    version = await crud_async.get_page_version(db, models.Review, skip=skip, limit=limit, after_id=after_id)
+    current = conditional.validators(*version, last_modified=version[2])
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION:
+        rows = await crud_async.get_page_rows(db, models.Review, schemas.Review, skip=skip, limit=limit, after_id=after_id)
+        return conditional.set_headers(serialization.page_response(schemas.Review, rows, limit), current)
+    reviews = await crud_async.get_reviews(db, skip=skip, limit=limit, after_id=after_id)
+    if limit > 0 and len(reviews) == limit:
+        response.headers["X-Next-Cursor"] = str(reviews[-1].id)
+    return reviews
+
+@reviews_router.post(
+    "/",
+    response_model=schemas.Review,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": schemas.ReviewAccepted}}
+)
+async def create_or_update_review(review: schemas.ReviewCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create a new review or update an existing one.
+
+    When write-behind or review events are enabled, the review is buffered or recorded
+    as an event and the endpoint answers 202 Accepted.
+
+    Args:
+        review (schemas.ReviewCreate): The review data to create or update.
+        db (AsyncSession): The database session.
+
+    Returns:
+        schemas.Review: The created or updated review.
+    """
+    if review_events.review_rollup is not None:
+        return await db.run_sync(record_review_event, review)
+    if write_behind.review_buffer is not None:
+        return await db.run_sync(accept_review, review)
+    return await crud_async.create_or_update_review(db=db, review=review)
+
+@reviews_router.get("/history", response_model=List[schemas.ReviewEvent], status_code=status.HTTP_200_OK)
+async def read_review_history(
+    response: Response,
+    location_id: int,
+    category_id: int,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, gt=0, le=1000),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Retrieve every review of a location-category pair, oldest first.
+
+    Args:
+        location_id (int): The ID of the location.
+        category_id (int): The ID of the category.
+        after_id (Optional[int]): Only return reviews with an ID greater than this cursor.
+        limit (int): Maximum number of reviews to return, at most 1000.
+        db (AsyncSession): The database session.
+
+    Returns:
+        List[schemas.ReviewEvent]: The reviews of the pair.
+    """
+    events = await db.run_sync(crud.get_review_history, location_id, category_id, after_id=after_id, limit=limit)
+    if len(events) == limit:
+        response.headers["X-Next-Cursor"] = str(events[-1].id)
+    return events
+
+@reviews_router.get("/lookup", response_model=List[Optional[schemas.Review]], status_code=status.HTTP_200_OK)
+async def read_reviews_by_pairs(pairs: List[Tuple[int, int]] = Depends(lookup_pairs), db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Retrieve the reviews of several location-category pairs in one request.
+
+    Args:
+        pairs (str): Comma-separated location_id:category_id pairs, at most 1000.
+        db (AsyncSession): The database session.
+
+    Returns:
+        List[Optional[schemas.Review]]: The review of each pair, in the order given,
+        or null if the pair has never been reviewed.
+    """
+    return await db.run_sync(crud.get_reviews_by_pairs, pairs)
+
+@reviews_router.get("/counts", response_model=List[schemas.ReviewCount], status_code=status.HTTP_200_OK)
+async def read_review_counts(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    period: Literal["day", "week", "month"] = "day",
+    location_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Count the reviews per day, week or month.
+
+    Args:
+        start (Optional[date]): First UTC day counted, 29 days before ``end`` by default.
+        end (Optional[date]): Last UTC day counted, today by default.
+        period (str): "day", "week" (starting on Monday) or "month".
+        location_id (Optional[int]): Only count the reviews of this location.
+        category_id (Optional[int]): Only count the reviews of this category.
+        db (AsyncSession): The database session.
+
+    Returns:
+        List[schemas.ReviewCount]: One count per period, in order, including empty periods.
+    """
+    start, end = review_count_range(start, end)
+    return await db.run_sync(
+        crud.get_review_counts, start=start, end=end, period=period, location_id=location_id, category_id=category_id
+    )
+
+@reviews_router.post(
+    "/batch",
+    response_model=List[schemas.ReviewBatchResult],
+    status_code=status.HTTP_200_OK,
+    responses={status.HTTP_202_ACCEPTED: {"model": List[schemas.ReviewBatchResult]}}
+)
+async def create_or_update_reviews(response: Response, reviews: List[schemas.ReviewCreate], db: AsyncSession = Depends(get_async_db)):
+    """
+    Create or update a batch of reviews.
+
+    When review events are enabled, the reviews are recorded as events and the
+    endpoint answers 202 Accepted.
+
+    Args:
+        reviews (List[schemas.ReviewCreate]): The reviews to create or update, at most 1000.
+        db (AsyncSession): The database session.
+
+    Returns:
+        List[schemas.ReviewBatchResult]: One result per review, in request order.
+    """
+    if len(reviews) > MAX_REVIEW_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A batch can hold at most {MAX_REVIEW_BATCH_SIZE} reviews"
+        )
+    if review_events.review_rollup is not None:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return await db.run_sync(crud.append_review_events, reviews)
+    return await db.run_sync(crud.create_or_update_reviews, reviews)
+
+async def _export(entity: ExportEntity, format: ExportFormat, read_your_writes: bool):
+    """
+    Generate the export body chunk by chunk, like ``exports._export`` on an async session.
+    """
+    columns = EXPORT_COLUMNS[entity]
+    names = [column.key for column in columns]
+    db = await open_async_read_session(read_your_writes)
+    try:
+        if format == ExportFormat.csv:
+            yield _encode_csv(names, [], header=True)
+        async for rows in crud_async.stream_rows(db, columns, order_by=columns[0]):
+            if format == ExportFormat.csv:
+                yield _encode_csv(names, rows, header=False)
+            else:
+                yield _encode_ndjson(names, rows)
+    except Exception as e:
+        logger.error(f"Error exporting {entity.value}: {str(e)}")
+        raise
+    finally:
+        await db.close()
+
+@exports_router.get("/{entity}", response_class=StreamingResponse)
+async def export(request: Request, entity: ExportEntity, format: ExportFormat = ExportFormat.ndjson):
+    """
+    Export a whole table as a stream.
+
+    Parameters:
+    - **entity**: locations, categories, reviews or location-categories (path parameter)
+    - **format**: ndjson (one JSON object per line, default) or csv (with a header row)
+
+    Returns:
+    - The rows of the table ordered by ID, with timestamps in ISO 8601 format.
+    """
+    return StreamingResponse(
+        _export(entity, format, reads_own_writes(request)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity.value}.{format.value}"'}
+    )
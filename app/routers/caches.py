@@ -0,0 +1,20 @@
+from fastapi import APIRouter, status
+from typing import Dict
+from .. import cache, schemas
+
+router = APIRouter()
+
+@router.get("/", response_model=Dict[str, schemas.CacheStats], status_code=status.HTTP_200_OK)
+def get_cache_stats():
+    """
+    Retrieve the counters of every in-process cache of this worker.
+
+    Returns:
+    - The hits, misses, hit ratio, size and TTL of the recommendation cache, the
+      location and category entity cache, and the category catalog.
+    """
+    return {
+        "recommendations": cache.recommendation_cache.stats(),
+        "entities": cache.entity_cache.stats(),
+        "category_catalog": cache.category_catalog.stats(),
+    }
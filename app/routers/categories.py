@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from .. import schemas, crud
-from ..database import get_db
+from typing import List, Optional
+from .. import cache, conditional, config, crud, models, schemas, serialization
+from ..database import get_db, get_read_db
+from .locations import lookup_ids
 
 router = APIRouter()
 
@@ -26,24 +27,56 @@ def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_
     return crud.create_category(db=db, category=category)
 
 @router.get("/", response_model=List[schemas.Category])
-def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_categories(request: Request, response: Response, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, db: Session = Depends(get_read_db)):
     """
     Retrieve a list of categories.
 
-    This endpoint returns a paginated list of all categories in the database.
+    This endpoint returns a paginated list of all categories in the database, ordered by ID.
 
     Parameters:
     - **skip**: Number of categories to skip (default: 0)
     - **limit**: Maximum number of categories to return (default: 100)
+    - **after_id**: Only return categories with an ID greater than this cursor. Unlike
+      `skip`, every page costs the same regardless of depth.
 
     Returns:
     - A list of Category objects, each containing the category's details.
+    - An `X-Next-Cursor` header with the `after_id` of the next page, when the page is full.
+    - `ETag` and `Last-Modified` headers; a request sending them back in `If-None-Match` or
+      `If-Modified-Since` gets 304 Not Modified while the page is unchanged.
     """
-    categories = crud.get_categories(db=db, skip=skip, limit=limit)
+    version = crud.get_category_page_version(db, skip=skip, limit=limit, after_id=after_id)
+    current = conditional.validators(*version, last_modified=version[2])
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION and not cache.category_catalog.enabled:
+        rows = crud.get_page_rows(db, models.Category, schemas.Category, skip=skip, limit=limit, after_id=after_id)
+        return conditional.set_headers(serialization.page_response(schemas.Category, rows, limit), current)
+    categories = crud.get_categories(db=db, skip=skip, limit=limit, after_id=after_id)
+    if limit > 0 and len(categories) == limit:
+        response.headers["X-Next-Cursor"] = str(categories[-1].id)
     return categories
 
+@router.get("/lookup", response_model=List[Optional[schemas.Category]])
+def read_categories_by_ids(category_ids: List[int] = Depends(lookup_ids), db: Session = Depends(get_read_db)):
+    """
+    Retrieve several categories by ID in one request.
+
+    Parameters:
+    - **ids**: Comma-separated IDs of the categories, at most 1000 (for example `ids=3,1,2`)
+
+    Returns:
+    - One entry per ID, in the order given: the Category object, or null if no
+      category has that ID.
+
+    Raises:
+    - 400 Bad Request: If the IDs are malformed or too many.
+    """
+    return crud.get_categories_by_ids(db, category_ids)
+
 @router.get("/{category_id}", response_model=schemas.Category)
-def read_category(category_id: int, db: Session = Depends(get_db)):
+def read_category(request: Request, response: Response, category_id: int, db: Session = Depends(get_read_db)):
     """
     Retrieve a specific category by ID.
 
@@ -53,7 +86,8 @@ def read_category(category_id: int, db: Session = Depends(get_db)):
     - **category_id**: The ID of the category to retrieve (path parameter)
 
     Returns:
-    - A Category object containing the details of the requested category.
+    - A Category object containing the details of the requested category, with
+      `ETag` and `Last-Modified` headers for conditional requests.
 
     Raises:
     - 404 Not Found: If no category with the given ID exists.
@@ -62,4 +96,8 @@ def read_category(category_id: int, db: Session = Depends(get_db)):
     if db_category is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                             detail="Category not found")
+    current = conditional.validators(db_category.id, db_category.updated_at, last_modified=db_category.updated_at)
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
     return db_category
\ No newline at end of file
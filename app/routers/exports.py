@@ -0,0 +1,113 @@
+from enum import Enum
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from .. import crud, models
+from ..database import open_read_session, reads_own_writes
+import csv
+import io
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class ExportEntity(str, Enum):
+    locations = "locations"
+    categories = "categories"
+    reviews = "reviews"
+    location_categories = "location-categories"
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+# Exported columns per entity, in output order
+EXPORT_COLUMNS = {
+    ExportEntity.locations: [
+        models.Location.id, models.Location.longitude, models.Location.latitude,
+        models.Location.created_at, models.Location.updated_at,
+    ],
+    ExportEntity.categories: [
+        models.Category.id, models.Category.name,
+        models.Category.created_at, models.Category.updated_at,
+    ],
+    ExportEntity.reviews: [
+        models.Review.id, models.Review.location_id, models.Review.category_id,
+        models.Review.last_reviewed, models.Review.created_at, models.Review.updated_at,
+    ],
+    ExportEntity.location_categories: [
+        models.LocationCategory.id, models.LocationCategory.location_id, models.LocationCategory.category_id,
+        models.LocationCategory.last_reviewed, models.LocationCategory.created_at, models.LocationCategory.updated_at,
+    ],
+}
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+def _to_text(value):
+    """
+    Convert a column value to its JSON/CSV representation.
+    """
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+def _encode_ndjson(names, rows):
+    return "".join(
+        json.dumps({name: _to_text(value) for name, value in zip(names, row)}) + "\n"
+        for row in rows
+    )
+
+def _encode_csv(names, rows, header: bool):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(names)
+    writer.writerows([_to_text(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+def _export(entity: ExportEntity, format: ExportFormat, read_your_writes: bool):
+    """
+    Generate the export body chunk by chunk.
+
+    The session is opened here rather than through ``get_read_db`` because the body is
+    produced after the endpoint returns, once dependencies have been closed.
+    """
+    columns = EXPORT_COLUMNS[entity]
+    names = [column.key for column in columns]
+    db = open_read_session(read_your_writes)
+    try:
+        if format == ExportFormat.csv:
+            yield _encode_csv(names, [], header=True)
+        for rows in crud.stream_rows(db, columns, order_by=columns[0]):
+            if format == ExportFormat.csv:
+                yield _encode_csv(names, rows, header=False)
+            else:
+                yield _encode_ndjson(names, rows)
+    except Exception as e:
+        logger.error(f"Error exporting {entity.value}: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+@router.get("/{entity}", response_class=StreamingResponse)
+def export(request: Request, entity: ExportEntity, format: ExportFormat = ExportFormat.ndjson):
+    """
+    Export a whole table as a stream.
+
+    Rows are read through a server-side cursor and written as they arrive, so the first
+    bytes are sent immediately and memory use does not depend on the table size.
+
+    Parameters:
+    - **entity**: locations, categories, reviews or location-categories (path parameter)
+    - **format**: ndjson (one JSON object per line, default) or csv (with a header row)
+
+    Returns:
+    - The rows of the table ordered by ID, with timestamps in ISO 8601 format.
+    """
+    return StreamingResponse(
+        _export(entity, format, reads_own_writes(request)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity.value}.{format.value}"'}
+    )
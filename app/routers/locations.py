@@ -1,11 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from .. import crud, schemas
-from ..database import get_db
-from typing import List
+from .. import conditional, config, crud, geo, models, schemas, serialization
+from ..database import get_db, get_read_db
+from typing import List, Optional
 
 router = APIRouter()
 
+# Largest search radius of a nearby request, in meters
+MAX_NEARBY_RADIUS_M = 100_000
+
+def lookup_ids(ids: str = Query(..., description="Comma-separated IDs, at most 1000")) -> List[int]:
+    """
+    Parse the comma-separated IDs of a batch lookup.
+
+    Raises:
+    - 400 Bad Request: If an ID is not an integer or there are too many IDs.
+    """
+    try:
+        parsed_ids = [int(part) for part in ids.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be comma-separated integers")
+    if len(parsed_ids) > crud.MAX_LOOKUP_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A lookup can resolve at most {crud.MAX_LOOKUP_IDS} IDs"
+        )
+    return parsed_ids
+
 @router.post("/", response_model=schemas.Location, status_code=status.HTTP_201_CREATED)
 def create_location(location: schemas.LocationCreate, db: Session = Depends(get_db)):
     """
@@ -25,24 +46,139 @@ def create_location(location: schemas.LocationCreate, db: Session = Depends(get_
     return crud.create_location(db=db, location=location)
 
 @router.get("/", response_model=List[schemas.Location])
-def read_locations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_locations(request: Request, response: Response, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, db: Session = Depends(get_read_db)):
     """
     Retrieve a list of locations.
     
-    This endpoint returns a paginated list of all locations in the database.
+    This endpoint returns a paginated list of all locations in the database, ordered by ID.
 
     Parameters:
     - **skip**: Number of locations to skip (default: 0)
     - **limit**: Maximum number of locations to return (default: 100)
+    - **after_id**: Only return locations with an ID greater than this cursor. Unlike
+      `skip`, every page costs the same regardless of depth.
 
     Returns:
     - A list of Location objects, each containing the location's details.
+    - An `X-Next-Cursor` header with the `after_id` of the next page, when the page is full.
+    - `ETag` and `Last-Modified` headers; a request sending them back in `If-None-Match` or
+      `If-Modified-Since` gets 304 Not Modified while the page is unchanged.
     """
-    locations = crud.get_locations(db, skip=skip, limit=limit)
+    version = crud.get_page_version(db, models.Location, skip=skip, limit=limit, after_id=after_id)
+    current = conditional.validators(*version, last_modified=version[2])
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION:
+        rows = crud.get_page_rows(db, models.Location, schemas.Location, skip=skip, limit=limit, after_id=after_id)
+        return conditional.set_headers(serialization.page_response(schemas.Location, rows, limit), current)
+    locations = crud.get_locations(db, skip=skip, limit=limit, after_id=after_id)
+    if limit > 0 and len(locations) == limit:
+        response.headers["X-Next-Cursor"] = str(locations[-1].id)
     return locations
 
+@router.get("/nearby", response_model=List[schemas.NearbyLocation])
+def read_locations_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(..., gt=0, le=MAX_NEARBY_RADIUS_M),
+    limit: int = Query(100, gt=0, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve the locations within a radius of a point.
+
+    Candidates are found through the geohash index, ranked by approximate distance in
+    the database and refined with the haversine distance, so the cost depends on the
+    density around the point, not on the table size.
+
+    Parameters:
+    - **lat**: Latitude of the search center
+    - **lon**: Longitude of the search center
+    - **radius_m**: Search radius in meters, at most 100 km
+    - **limit**: Maximum number of locations to return (default: 100)
+
+    Returns:
+    - A list of Location objects with their distance in meters, nearest first.
+    """
+    return crud.get_locations_nearby(db, latitude=lat, longitude=lon, radius_m=radius_m, limit=limit)
+
+@router.get("/within", response_model=List[schemas.Location])
+def read_locations_within(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    limit: int = Query(100, gt=0, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve the locations inside a bounding box.
+
+    Parameters:
+    - **bbox**: The box as "min_lon,min_lat,max_lon,max_lat". A box with min_lon > max_lon crosses the antimeridian.
+    - **limit**: Maximum number of locations to return (default: 100)
+
+    Returns:
+    - A list of Location objects, ordered by ID.
+
+    Raises:
+    - 400 Bad Request: If the bounding box is malformed.
+    """
+    try:
+        parsed_bbox = geo.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return crud.get_locations_within(db, bbox=parsed_bbox, limit=limit)
+
+@router.get("/lookup", response_model=List[Optional[schemas.Location]])
+def read_locations_by_ids(location_ids: List[int] = Depends(lookup_ids), db: Session = Depends(get_read_db)):
+    """
+    Retrieve several locations by ID in one request.
+
+    Parameters:
+    - **ids**: Comma-separated IDs of the locations, at most 1000 (for example `ids=3,1,2`)
+
+    Returns:
+    - One entry per ID, in the order given: the Location object, or null if no
+      location has that ID.
+
+    Raises:
+    - 400 Bad Request: If the IDs are malformed or too many.
+    """
+    return crud.get_locations_by_ids(db, location_ids)
+
+@router.get("/tiles/{z}/{x}/{y}", response_model=schemas.LocationTile)
+def read_location_tile(
+    z: int = Path(..., ge=0, le=geo.MAX_TILE_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    stale: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve the locations of a web map tile, aggregated per grid cell.
+
+    Counts and centroids are read from a precomputed geohash grid, so the cost
+    depends on the number of cells in the tile, not on the number of locations.
+    The grid is updated in the background and lags the writes by up to `GRID_ROLLUP_INTERVAL` seconds.
+
+    Parameters:
+    - **z**: Zoom level (path parameter)
+    - **x**: Tile column, from 0 at the antimeridian (path parameter)
+    - **y**: Tile row, from 0 at the north edge (path parameter)
+    - **stale**: Also return, per cell, the number of location-category pairs due for a review (default: false)
+
+    Returns:
+    - A LocationTile object with the grid precision and, for each non-empty cell, its
+      geohash, number of locations and centroid.
+
+    Raises:
+    - 400 Bad Request: If x or y is outside the tiles of the zoom level.
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tile coordinates out of range")
+    return crud.get_location_tile(db, z=z, x=x, y=y, include_stale=stale)
+
 @router.get("/{location_id}", response_model=schemas.Location)
-def read_location(location_id: int, db: Session = Depends(get_db)):
+def read_location(request: Request, response: Response, location_id: int, db: Session = Depends(get_read_db)):
     """
     Retrieve a specific location by ID.
     
@@ -52,7 +188,8 @@ def read_location(location_id: int, db: Session = Depends(get_db)):
     - **location_id**: The ID of the location to retrieve (path parameter)
 
     Returns:
-    - A Location object containing the details of the requested location.
+    - A Location object containing the details of the requested location, with
+      `ETag` and `Last-Modified` headers for conditional requests.
 
     Raises:
     - 404 Not Found: If no location with the given ID exists.
@@ -60,4 +197,8 @@ def read_location(location_id: int, db: Session = Depends(get_db)):
     db_location = crud.get_location(db, location_id=location_id)
     if db_location is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    current = conditional.validators(db_location.id, db_location.updated_at, last_modified=db_location.updated_at)
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
     return db_location
\ No newline at end of file
@@ -1,23 +1,147 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from .. import schemas, crud
-from ..database import get_db
+from typing import List, Optional
+from .. import cache, conditional, config, crud, geo, schemas, serialization
+from ..database import get_db, get_read_db
+from .reviews import lookup_pairs
 
 router = APIRouter()
 
+# Largest number of recommendations a request can ask for
+MAX_RECOMMENDATION_LIMIT = 100
+
+def recommendation_scope(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_m: Optional[float] = Query(None, gt=0),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    category_id: Optional[int] = None,
+    limit: int = Query(crud.RECOMMENDATION_LIMIT, gt=0, le=MAX_RECOMMENDATION_LIMIT),
+) -> crud.RecommendationScope:
+    """
+    Build the recommendation scope from the query parameters.
+
+    Raises:
+        HTTPException: 400 if the region parameters are incomplete, combined or malformed.
+    """
+    circle = (lat, lon, radius_m)
+    if bbox is not None and any(value is not None for value in circle):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Use either lat, lon and radius_m, or bbox")
+    if bbox is not None:
+        try:
+            bboxes = geo.split_bbox(geo.parse_bbox(bbox))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return crud.RecommendationScope(bboxes=tuple(bboxes), category_id=category_id, limit=limit)
+    if any(value is None for value in circle):
+        if any(value is not None for value in circle):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="lat, lon and radius_m must be given together")
+        return crud.RecommendationScope(category_id=category_id, limit=limit)
+    return crud.RecommendationScope(
+        bboxes=tuple(geo.bbox_around(lat, lon, radius_m)), center=(lat, lon), radius_m=radius_m,
+        category_id=category_id, limit=limit
+    )
+
 @router.get("/", response_model=List[schemas.Recommendation], status_code=status.HTTP_200_OK)
-def get_recommendations(db: Session = Depends(get_db)):
+def get_recommendations(
+    request: Request,
+    response: Response,
+    scope: crud.RecommendationScope = Depends(recommendation_scope),
+    db: Session = Depends(get_read_db)
+):
     """
     Retrieve a list of recommendations.
 
     This endpoint returns a list of 10 location-category combinations that have not been
     reviewed in the last 30 days, prioritizing those that have never been reviewed.
 
-    Args:
-        db (Session): The database session.
+    The ranking can be restricted to a region, given either as a circle or as a box.
+    Only the pairs of the locations inside it are ranked, so a regional request
+    does not depend on the size of the whole table.
+
+    Parameters:
+    - **lat**, **lon**, **radius_m**: Center and radius in meters of a circular region
+    - **bbox**: A rectangular region as "min_lon,min_lat,max_lon,max_lat". A box with min_lon > max_lon crosses the antimeridian.
+    - **category_id**: Only recommend pairs of this category
+    - **limit**: Number of recommendations to return (default: 10, at most 100)
 
     Returns:
         List[schemas.Recommendation]: A list of recommended location-category combinations.
+        The `ETag` header can be sent back in `If-None-Match` to get 304 Not Modified
+        while the recommendations are unchanged.
+
+    Raises:
+    - 400 Bad Request: If the region parameters are incomplete, combined or malformed.
+    """
+    recommendations, version = crud.get_versioned_recommendations(db, scope, rows=config.FAST_SERIALIZATION)
+    current = conditional.validators(*version)
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION:
+        return conditional.set_headers(serialization.recommendations_response(recommendations), current)
+    return recommendations
+
+@router.post("/claims", response_model=List[schemas.RecommendationClaim], status_code=status.HTTP_200_OK)
+def claim_recommendations(
+    holder: str = Query(..., min_length=1, max_length=64),
+    scope: crud.RecommendationScope = Depends(recommendation_scope),
+    db: Session = Depends(get_db)
+):
+    """
+    Claim the next recommendations, leasing them to the caller.
+
+    Unlike `GET /`, concurrent explorers get different pairs: claimed pairs are
+    skipped by the other claims until they are reviewed, released, or their lease
+    expires after `RECOMMENDATION_LEASE_SECONDS`.
+
+    Parameters:
+    - **holder**: Identifier of the explorer, used to release the leases
+    - **lat**, **lon**, **radius_m** or **bbox**: Only claim pairs of the locations in this region
+    - **category_id**: Only claim pairs of this category
+    - **limit**: Number of pairs to claim (default: 10, at most 100)
+
+    Returns:
+        List[schemas.RecommendationClaim]: The claimed pairs in rank order, with the
+        expiry of their lease. Fewer pairs are returned when the claimable pairs run out.
+
+    Raises:
+    - 400 Bad Request: If the region parameters are incomplete, combined or malformed.
+    """
+    return crud.claim_recommendations(db, holder, scope)
+
+@router.delete("/claims", response_model=schemas.ReleasedClaims, status_code=status.HTTP_200_OK)
+def release_recommendations(
+    holder: str = Query(..., min_length=1, max_length=64),
+    pairs: Optional[str] = Query(None, description="Comma-separated location_id:category_id pairs"),
+    db: Session = Depends(get_db)
+):
+    """
+    Release claimed recommendations before their lease expires.
+
+    Reviewing a claimed pair releases it as well.
+
+    Parameters:
+    - **holder**: Identifier of the explorer who claimed the pairs
+    - **pairs**: The pairs to release as "location_id:category_id,...", all the pairs of the holder by default
+
+    Returns:
+        schemas.ReleasedClaims: The number of leases released.
+
+    Raises:
+    - 400 Bad Request: If the pairs are malformed or too many.
+    """
+    parsed_pairs = lookup_pairs(pairs) if pairs is not None else None
+    return schemas.ReleasedClaims(released=crud.release_recommendations(db, holder, parsed_pairs))
+
+@router.get("/cache", response_model=schemas.CacheStats, status_code=status.HTTP_200_OK)
+def get_recommendation_cache_stats():
+    """
+    Retrieve the recommendation cache counters of this worker.
+
+    Returns:
+        schemas.CacheStats: Hit and miss counts, current size and TTL of the cache.
     """
-    return crud.get_recommendations(db)
\ No newline at end of file
+    return cache.recommendation_cache.stats()
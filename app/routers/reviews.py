@@ -1,28 +1,60 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from .. import crud, schemas
-from ..database import get_db
-from typing import List
+from .. import conditional, config, crud, models, review_events, schemas, serialization, write_behind
+from ..database import get_db, get_read_db
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Literal, Optional, Tuple
 
 router = APIRouter()
 
+# Maximum number of reviews accepted by one batch request
+MAX_REVIEW_BATCH_SIZE = 1000
+
+# Days counted by default, and at most, by one review count request
+DEFAULT_REVIEW_COUNT_DAYS = 30
+MAX_REVIEW_COUNT_DAYS = 3660
+
 @router.get("/", response_model=List[schemas.Review], status_code=status.HTTP_200_OK)
-def read_reviews(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def read_reviews(request: Request, response: Response, skip: int = 0, limit: int = 10, after_id: Optional[int] = None, db: Session = Depends(get_read_db)):
     """
-    Retrieve a list of reviews.
+    Retrieve a list of reviews, ordered by ID.
+
+    When the page is full, the `X-Next-Cursor` response header holds the
+    `after_id` of the next page. The `ETag` and `Last-Modified` headers can be sent
+    back in `If-None-Match` or `If-Modified-Since` to get 304 Not Modified while the
+    page is unchanged.
 
     Args:
         skip (int): Number of reviews to skip (for pagination).
         limit (int): Maximum number of reviews to return.
+        after_id (Optional[int]): Only return reviews with an ID greater than this cursor.
+            Unlike skip, every page costs the same regardless of depth.
         db (Session): The database session.
 
     Returns:
         List[schemas.Review]: A list of reviews.
     """
-    reviews = crud.get_reviews(db, skip=skip, limit=limit)
+    version = crud.get_page_version(db, models.Review, skip=skip, limit=limit, after_id=after_id)
+    current = conditional.validators(*version, last_modified=version[2])
+    not_modified = conditional.check(request, response, current)
+    if not_modified is not None:
+        return not_modified
+    if config.FAST_SERIALIZATION:
+        rows = crud.get_page_rows(db, models.Review, schemas.Review, skip=skip, limit=limit, after_id=after_id)
+        return conditional.set_headers(serialization.page_response(schemas.Review, rows, limit), current)
+    reviews = crud.get_reviews(db, skip=skip, limit=limit, after_id=after_id)
+    if limit > 0 and len(reviews) == limit:
+        response.headers["X-Next-Cursor"] = str(reviews[-1].id)
     return reviews
 
-@router.post("/", response_model=schemas.Review, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=schemas.Review,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": schemas.ReviewAccepted}}
+)
 def create_or_update_review(review: schemas.ReviewCreate, db: Session = Depends(get_db)):
     """
     Create a new review or update an existing one.
@@ -30,11 +62,233 @@ def create_or_update_review(review: schemas.ReviewCreate, db: Session = Depends(
     If a review for the given location-category combination already exists,
     it will be updated. Otherwise, a new review will be created.
 
+    When write-behind is enabled, the review is buffered and written with the next
+    batch; the endpoint then answers 202 Accepted with the recorded review time.
+    When review events are enabled, the review is recorded as an event and rolled
+    up later, also with a 202 Accepted.
+
     Args:
         review (schemas.ReviewCreate): The review data to create or update.
         db (Session): The database session.
 
     Returns:
         schemas.Review: The created or updated review.
+
+    Raises:
+        HTTPException: 404 if the location or category does not exist, with write-behind or review events enabled.
+    """
+    if review_events.review_rollup is not None:
+        return record_review_event(db, review)
+    if write_behind.review_buffer is not None:
+        return accept_review(db, review)
+    return crud.create_or_update_review(db=db, review=review)
+
+def record_review_event(db: Session, review: schemas.ReviewCreate):
+    """
+    Record a review as a review event.
+
+    Args:
+        db (Session): The database session.
+        review (schemas.ReviewCreate): The review to record.
+
+    Returns:
+        JSONResponse: A 202 Accepted response holding a ReviewAccepted object.
+
+    Raises:
+        HTTPException: 404 if the location or category does not exist.
+    """
+    reviewed_at = datetime.now(timezone.utc)
+    result = crud.append_review_events(db, [review], reviewed_at=reviewed_at)[0]
+    if result.status == "error":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=result.detail)
+    accepted = schemas.ReviewAccepted(**review.dict(), last_reviewed=reviewed_at)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(accepted))
+
+def accept_review(db: Session, review: schemas.ReviewCreate):
+    """
+    Buffer a review in the write-behind buffer.
+
+    The location and category are checked first, through the entity cache and the
+    category catalog when enabled, so that no review is accepted and later dropped.
+
+    Args:
+        db (Session): The database session.
+        review (schemas.ReviewCreate): The review to buffer.
+
+    Returns:
+        JSONResponse: A 202 Accepted response holding a ReviewAccepted object.
+
+    Raises:
+        HTTPException: 404 if the location or category does not exist.
+    """
+    if crud.get_location(db, review.location_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    if crud.get_category(db, review.category_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    reviewed_at = write_behind.review_buffer.add(review.location_id, review.category_id)
+    accepted = schemas.ReviewAccepted(**review.dict(), last_reviewed=reviewed_at)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(accepted))
+
+@router.get("/history", response_model=List[schemas.ReviewEvent], status_code=status.HTTP_200_OK)
+def read_review_history(
+    response: Response,
+    location_id: int,
+    category_id: int,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, gt=0, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve every review of a location-category pair, oldest first.
+
+    Reviews are only recorded individually when review events are enabled. When the
+    page is full, the `X-Next-Cursor` response header holds the `after_id` of the next page.
+
+    Args:
+        location_id (int): The ID of the location.
+        category_id (int): The ID of the category.
+        after_id (Optional[int]): Only return reviews with an ID greater than this cursor.
+        limit (int): Maximum number of reviews to return, at most 1000.
+        db (Session): The database session.
+
+    Returns:
+        List[schemas.ReviewEvent]: The reviews of the pair.
+    """
+    events = crud.get_review_history(db, location_id, category_id, after_id=after_id, limit=limit)
+    if len(events) == limit:
+        response.headers["X-Next-Cursor"] = str(events[-1].id)
+    return events
+
+def lookup_pairs(
+    pairs: str = Query(..., description="Comma-separated location_id:category_id pairs, at most 1000")
+) -> List[Tuple[int, int]]:
+    """
+    Parse the comma-separated location-category pairs of a batch lookup.
+
+    Raises:
+        HTTPException: 400 if a pair is malformed or there are too many pairs.
+    """
+    try:
+        parsed_pairs = []
+        for part in pairs.split(","):
+            location_id, category_id = part.split(":")
+            parsed_pairs.append((int(location_id), int(category_id)))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="pairs must be comma-separated location_id:category_id integers"
+        )
+    if len(parsed_pairs) > crud.MAX_LOOKUP_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A lookup can resolve at most {crud.MAX_LOOKUP_IDS} pairs"
+        )
+    return parsed_pairs
+
+@router.get("/lookup", response_model=List[Optional[schemas.Review]], status_code=status.HTTP_200_OK)
+def read_reviews_by_pairs(pairs: List[Tuple[int, int]] = Depends(lookup_pairs), db: Session = Depends(get_read_db)):
+    """
+    Retrieve the reviews of several location-category pairs in one request.
+
+    Args:
+        pairs (str): Comma-separated location_id:category_id pairs, at most 1000
+            (for example ``pairs=1:2,1:3``).
+        db (Session): The database session.
+
+    Returns:
+        List[Optional[schemas.Review]]: The review of each pair, in the order given,
+        or null if the pair has never been reviewed.
+
+    Raises:
+        HTTPException: 400 if the pairs are malformed or too many.
+    """
+    return crud.get_reviews_by_pairs(db, pairs)
+
+def review_count_range(start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+    """
+    Resolve the days counted by a review count request.
+
+    Raises:
+        HTTPException: 400 if start is after end or the range is longer than 3660 days.
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=DEFAULT_REVIEW_COUNT_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must not be after end")
+    if (end - start).days >= MAX_REVIEW_COUNT_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A count can cover at most {MAX_REVIEW_COUNT_DAYS} days"
+        )
+    return start, end
+
+@router.get("/counts", response_model=List[schemas.ReviewCount], status_code=status.HTTP_200_OK)
+def read_review_counts(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    period: Literal["day", "week", "month"] = "day",
+    location_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Count the reviews per day, week or month.
+
+    Counts are read from daily totals rolled up from the review events, so they
+    cover the reviews recorded with review events enabled, up to the last rollup.
+
+    Args:
+        start (Optional[date]): First UTC day counted, 29 days before ``end`` by default.
+        end (Optional[date]): Last UTC day counted, today by default.
+        period (str): "day", "week" (starting on Monday) or "month".
+        location_id (Optional[int]): Only count the reviews of this location.
+        category_id (Optional[int]): Only count the reviews of this category.
+        db (Session): The database session.
+
+    Returns:
+        List[schemas.ReviewCount]: One count per period, in order, including empty periods.
+
+    Raises:
+        HTTPException: 400 if start is after end or the range is longer than 3660 days.
+    """
+    start, end = review_count_range(start, end)
+    return crud.get_review_counts(
+        db, start=start, end=end, period=period, location_id=location_id, category_id=category_id
+    )
+
+@router.post(
+    "/batch",
+    response_model=List[schemas.ReviewBatchResult],
+    status_code=status.HTTP_200_OK,
+    responses={status.HTTP_202_ACCEPTED: {"model": List[schemas.ReviewBatchResult]}}
+)
+def create_or_update_reviews(response: Response, reviews: List[schemas.ReviewCreate], db: Session = Depends(get_db)):
+    """
+    Create or update a batch of reviews.
+
+    All reviews are applied in one transaction with set-based upserts. Reviews for a
+    location or category that does not exist are reported as errors without failing
+    the rest of the batch.
+
+    When review events are enabled, the reviews are recorded as events instead and
+    the endpoint answers 202 Accepted, with an "accepted" status per valid review.
+
+    Args:
+        reviews (List[schemas.ReviewCreate]): The reviews to create or update, at most 1000.
+        db (Session): The database session.
+
+    Returns:
+        List[schemas.ReviewBatchResult]: One result per review, in request order.
+
+    Raises:
+        HTTPException: 422 if the batch holds more than 1000 reviews.
     """
-    return crud.create_or_update_review(db=db, review=review)
\ No newline at end of file
+    if len(reviews) > MAX_REVIEW_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A batch can hold at most {MAX_REVIEW_BATCH_SIZE} reviews"
+        )
+    if review_events.review_rollup is not None:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return crud.append_review_events(db, reviews)
+    return crud.create_or_update_reviews(db=db, reviews=reviews)
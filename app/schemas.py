@@ -1,6 +1,6 @@
 from pydantic import BaseModel, field_validator, ConfigDict
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
 class LocationBase(BaseModel):
     """
@@ -63,6 +63,32 @@ class Location(LocationBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class NearbyLocation(Location):
+    """
+    Schema for a Location returned by a radius search, with its distance to the search center.
+    """
+    distance_m: float
+
+class LocationTileCell(BaseModel):
+    """
+    Schema for the locations of one grid cell of a map tile.
+    """
+    geohash: str
+    locations: int
+    longitude: float
+    latitude: float
+    stale_pairs: Optional[int] = None
+
+class LocationTile(BaseModel):
+    """
+    Schema for a map tile, aggregating its locations per grid cell.
+    """
+    z: int
+    x: int
+    y: int
+    precision: int
+    cells: List[LocationTileCell]
+
 class CategoryBase(BaseModel):
     """
     Base model for Category with common attributes.
@@ -119,6 +145,30 @@ class Recommendation(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class RecommendationClaim(Recommendation):
+    """
+    Schema for a recommendation leased to the explorer who claimed it.
+    """
+    lease_expires_at: datetime
+
+class ReleasedClaims(BaseModel):
+    """
+    Schema for the number of recommendation leases released.
+    """
+    released: int
+
+class CacheStats(BaseModel):
+    """
+    Schema for the counters of an in-process cache.
+    """
+    enabled: bool
+    ttl_seconds: float
+    size: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    max_entries: Optional[int] = None
+
 class ReviewBase(BaseModel):
     """
     Base model for Review with common attributes.
@@ -141,4 +191,34 @@ class Review(ReviewBase):
     created_at: datetime
     updated_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class ReviewBatchResult(ReviewBase):
+    """
+    Schema for the outcome of one review in a batch.
+    """
+    status: Literal["created", "updated", "accepted", "error"]
+    review: Optional[Review] = None
+    detail: Optional[str] = None
+
+class ReviewAccepted(ReviewBase):
+    """
+    Schema for a review accepted by the write-behind buffer or the review event log but not written yet.
+    """
+    last_reviewed: datetime
+
+class ReviewEvent(ReviewBase):
+    """
+    Schema for one entry of the review history of a location-category pair.
+    """
+    id: int
+    reviewed_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ReviewCount(BaseModel):
+    """
+    Schema for the number of reviews in a period starting on a UTC day.
+    """
+    period_start: date
+    reviews: int
@@ -0,0 +1,459 @@
+"""
+Vectorized recommendation ranking on an in-memory snapshot of the review history.
+
+The snapshot holds the last review time of every location-category pair in a
+NumPy matrix with one row per location and one column per category, both
+ordered by ID, so a pair is addressed by position and its IDs are not stored.
+Ranking scores every pair in scope in bulk and selects the top ``limit`` with
+``argpartition``; only the selected pairs are then read from the database.
+Ranking a million pairs takes about 20 ms; a region or a category only scores
+its own pairs.
+
+Memory use per million pairs:
+
+- snapshot: 8 MB (float64 epoch seconds, NaN for never-reviewed pairs), plus
+  24 bytes per location and 8 bytes per category;
+- ranking: about 16 MB of temporary arrays for the pairs in scope (scores,
+  masks and the argpartition indexes), freed when the request ends;
+- reload: a second snapshot is built while the current one keeps serving,
+  so another 8 MB until it is swapped in.
+
+Review writes of this worker update the snapshot in place, and are published
+with their pairs on the invalidation channel. The other workers apply those pairs
+to their own snapshot the same way, without reloading it. New locations or
+categories, and invalidations that arrive without their pairs (with the "file"
+channel, or after the PostgreSQL listener reconnected), trigger a reload in a
+background thread instead, started at most once every ``reload_interval``
+seconds. Whenever the snapshot may be out of date, before the first load and
+from such an invalidation until the reload that covers it completes,
+recommendations are ranked by SQL. A reload only due to ``ttl_seconds`` keeps
+serving the current snapshot until the new one is swapped in.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from . import cache, config, geo
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ENGINES = ("sql", "vectorized")
+
+# Staleness given to never-reviewed pairs, in seconds: far beyond any real review
+# age, so they rank first whatever their category weight and distance.
+NEVER_REVIEWED_AGE = 1e12
+
+# Rows read per batch when loading the review history
+LOAD_BATCH_SIZE = 50_000
+
+def parse_category_weights(spec: str) -> Dict[int, float]:
+    """
+    Parse a "category_id:weight,..." list of category weights.
+
+    Args:
+        spec (str): The comma-separated weights, possibly empty.
+
+    Returns:
+        Dict[int, float]: Weight by category ID.
+
+    Raises:
+        ValueError: If an entry is malformed or a weight is not positive.
+    """
+    weights = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        category_id, separator, weight = entry.partition(":")
+        if not separator:
+            raise ValueError(f"Category weight '{entry}' must be 'category_id:weight'")
+        weights[int(category_id)] = float(weight)
+        if weights[int(category_id)] <= 0:
+            raise ValueError(f"Category weight '{entry}' must be positive")
+    return weights
+
+def _epoch(value: datetime) -> float:
+    """
+    Convert a timestamp to epoch seconds, reading naive timestamps as UTC like the database stores them.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class Snapshot:
+    """
+    Last review time of every location-category pair, with the location coordinates.
+    """
+    __slots__ = ("location_ids", "latitudes", "longitudes", "category_ids", "last_reviewed")
+
+    def __init__(self, location_ids, latitudes, longitudes, category_ids):
+        self.location_ids = location_ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.category_ids = category_ids
+        self.last_reviewed = np.full((len(location_ids), len(category_ids)), np.nan)
+
+    @property
+    def pairs(self):
+        return self.last_reviewed.size
+
+    @property
+    def nbytes(self):
+        return (self.last_reviewed.nbytes + self.location_ids.nbytes + self.latitudes.nbytes
+                + self.longitudes.nbytes + self.category_ids.nbytes)
+
+    def positions(self, location_ids, category_ids):
+        """
+        Return the matrix positions of pairs, and a mask of the pairs the snapshot holds.
+        """
+        rows = np.searchsorted(self.location_ids, location_ids)
+        columns = np.searchsorted(self.category_ids, category_ids)
+        rows_found = rows < len(self.location_ids)
+        columns_found = columns < len(self.category_ids)
+        found = rows_found & columns_found
+        found[found] &= (self.location_ids[rows[found]] == np.asarray(location_ids)[found])
+        found[found] &= (self.category_ids[columns[found]] == np.asarray(category_ids)[found])
+        return rows, columns, found
+
+    def record(self, location_ids, category_ids, epochs) -> bool:
+        """
+        Keep the later of the current and given review times of pairs.
+
+        Returns:
+            bool: False if some pairs are unknown to the snapshot and were ignored.
+        """
+        rows, columns, found = self.positions(location_ids, category_ids)
+        rows, columns = rows[found], columns[found]
+        # Like the database upserts, a review never moves a pair back in time.
+        self.last_reviewed[rows, columns] = np.fmax(self.last_reviewed[rows, columns], np.asarray(epochs)[found])
+        return bool(found.all())
+
+class ScoringEngine:
+    """
+    Ranks recommendations with NumPy on a snapshot reloaded in the background.
+
+    Scores are the staleness of each pair in seconds (``NEVER_REVIEWED_AGE`` when
+    never reviewed), multiplied by the weight of its category, minus
+    ``distance_weight`` days of staleness per kilometer between the location and
+    the center of the request's region. Pairs reviewed after the threshold are
+    left out. With the default weights the ranking is the SQL one: never-reviewed
+    first, then oldest, ties broken by location ID, then category ID.
+    """
+    def __init__(self, enabled: bool, reload_interval: float, ttl_seconds: float, channel,
+                 category_weights: Optional[Dict[int, float]] = None, distance_weight: float = 0):
+        self.enabled = enabled
+        self.reload_interval = reload_interval
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        self.category_weights = category_weights or {}
+        self.distance_weight = distance_weight
+        self._snapshot = None
+        self._generation = None
+        self._loaded_at = None
+        self._reload_started_at = None
+        self._stale = False
+        self._loader = None
+        # Whether the running reload is only due to the TTL, so the current snapshot is still served
+        self._expired_reload = False
+        # Reviews recorded while a reload runs, replayed on the new snapshot
+        self._recorded_during_load = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Start a background reload if the snapshot is missing or stale and none ran recently.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._loader is not None:
+                return
+            self._catch_up()
+            current = self._snapshot is not None and not self._stale and self._generation == self.channel.generation()
+            if current and now - self._loaded_at < self.ttl_seconds:
+                return
+            if self._reload_started_at is not None and now - self._reload_started_at < self.reload_interval:
+                return
+            self._reload_started_at = now
+            self._expired_reload = current
+            self._loader = threading.Thread(target=self._reload, name="scoring-snapshot", daemon=True)
+            self._loader.start()
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Error loading the scoring snapshot: {str(e)}")
+            with self._lock:
+                # The snapshot may lack the changes taken from the channel by the failed load.
+                self._stale = True
+                self._recorded_during_load = None
+        finally:
+            with self._lock:
+                self._loader = None
+                self._expired_reload = False
+
+    def load(self):
+        """
+        Read the review history from the database and swap in the new snapshot.
+        """
+        from . import crud, models
+        from .database import SessionLocal
+
+        started = time.monotonic()
+        with self._lock:
+            # The rows read below cover every change announced so far.
+            generation, payloads = self.channel.changes()
+            if payloads is None:
+                self._expired_reload = False
+            elif payloads and self._snapshot is not None:
+                self._snapshot.record(*_payload_arrays(payloads))
+            self._recorded_during_load = []
+            self._stale = False
+        with SessionLocal() as db:
+            locations = db.execute(select(
+                models.Location.id, models.Location.latitude, models.Location.longitude
+            ).order_by(models.Location.id)).all()
+            category_ids = db.scalars(select(models.Category.id).order_by(models.Category.id)).all()
+            snapshot = Snapshot(
+                np.array([row[0] for row in locations], dtype=np.int64),
+                np.array([row[1] for row in locations], dtype=np.float64),
+                np.array([row[2] for row in locations], dtype=np.float64),
+                np.array(category_ids, dtype=np.int64),
+            )
+            reviewed = crud.stream_rows(
+                db,
+                [models.LocationCategory.location_id, models.LocationCategory.category_id, models.LocationCategory.last_reviewed],
+                order_by=models.LocationCategory.id, batch_size=LOAD_BATCH_SIZE
+            )
+            for rows in reviewed:
+                rows = [row for row in rows if row[2] is not None]
+                if rows:
+                    snapshot.record(
+                        np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+                        np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+                        np.fromiter((_epoch(row[2]) for row in rows), dtype=np.float64, count=len(rows)),
+                    )
+
+        with self._lock:
+            for location_ids, category_ids, epochs in self._recorded_during_load:
+                snapshot.record(location_ids, category_ids, epochs)
+            self._recorded_during_load = None
+            self._snapshot = snapshot
+            self._generation = generation
+            self._loaded_at = time.monotonic()
+        logger.info(
+            f"Loaded {snapshot.pairs} pairs into the scoring snapshot in {time.monotonic() - started:.2f}s "
+            f"({snapshot.nbytes / 1e6:.1f} MB)"
+        )
+
+    def record_reviews(self, reviewed_at: Dict[Tuple[int, int], datetime], session=None):
+        """
+        Apply committed reviews to the snapshot and announce them to the other workers.
+
+        Args:
+            reviewed_at (Dict[Tuple[int, int], datetime]): Review time by (location_id, category_id).
+            session (Optional[Session]): The session of the write. When given, the reviews
+                are applied and announced once its transaction commits.
+        """
+        if not self.enabled or not reviewed_at:
+            return
+        location_ids = np.fromiter((pair[0] for pair in reviewed_at), dtype=np.int64, count=len(reviewed_at))
+        category_ids = np.fromiter((pair[1] for pair in reviewed_at), dtype=np.int64, count=len(reviewed_at))
+        epochs = np.fromiter((_epoch(value) for value in reviewed_at.values()), dtype=np.float64, count=len(reviewed_at))
+        payload = [[int(pair[0]), int(pair[1]), float(epoch)] for pair, epoch in zip(reviewed_at, epochs)]
+
+        if session is None:
+            generation = self.channel.generation()
+            self.channel.publish(payload)
+            self._record(location_ids, category_ids, epochs, generation)
+            return
+        # The generation is read on commit, right before the channel publishes.
+        generation = []
+        cache.on_commit(session, lambda: generation.append(self.channel.generation()))
+        self.channel.publish(payload, session=session)
+        cache.on_commit(session, lambda: self._record(location_ids, category_ids, epochs, generation[0]))
+
+    def _record(self, location_ids, category_ids, epochs, generation):
+        """
+        Apply reviews of this worker, announced since the channel was at ``generation``.
+        """
+        with self._lock:
+            if self._snapshot is not None and not self._snapshot.record(location_ids, category_ids, epochs):
+                # Pairs of a location or category loaded after the snapshot
+                self._stale = True
+            if self._recorded_during_load is not None:
+                self._recorded_during_load.append((location_ids, category_ids, epochs))
+            # Our own announcement does not make the snapshot stale, unless
+            # another worker had already published since it was loaded.
+            if self._generation == generation:
+                self._generation = self.channel.generation()
+
+    def _catch_up(self):
+        """
+        Apply the reviews published by other workers since the snapshot was loaded, or
+        mark it stale when they cannot all be applied. Called with the lock held.
+        """
+        if self._snapshot is None or self._stale or self._generation == self.channel.generation():
+            return
+        generation, payloads = self.channel.changes()
+        if payloads is None:
+            self._stale = True
+            return
+        if payloads:
+            location_ids, category_ids, epochs = _payload_arrays(payloads)
+            if not self._snapshot.record(location_ids, category_ids, epochs):
+                self._stale = True
+            if self._recorded_during_load is not None:
+                self._recorded_during_load.append((location_ids, category_ids, epochs))
+        self._generation = generation
+
+    def invalidate(self, session=None):
+        """
+        Reload the snapshot in every worker after a location or category was created.
+
+        Args:
+            session (Optional[Session]): The session of the write. When given, the
+                snapshot is marked stale once its transaction commits.
+        """
+        if not self.enabled:
+            return
+        if session is not None:
+            self.channel.publish(session=session)
+            cache.on_commit(session, self._mark_stale)
+            return
+        self._mark_stale()
+        self.channel.publish()
+
+    def _mark_stale(self):
+        with self._lock:
+            self._stale = True
+
+    def rank(self, scope, threshold_date: datetime) -> Optional[List[Tuple[int, int]]]:
+        """
+        Rank the pairs of a recommendation scope.
+
+        Args:
+            scope (crud.RecommendationScope): Region, category and number of recommendations.
+            threshold_date (datetime): Pairs reviewed at or after this time are not recommended.
+
+        Returns:
+            Optional[List[Tuple[int, int]]]: The (location_id, category_id) of the top pairs, best
+            first, or None when no snapshot is loaded yet or it may be out of date.
+        """
+        self.refresh()
+        with self._lock:
+            self._catch_up()
+            snapshot = self._snapshot
+            if snapshot is None or self._stale or (self._loader is not None and not self._expired_reload):
+                return None
+            if self._generation != self.channel.generation():
+                return None
+
+        rows = np.arange(len(snapshot.location_ids))
+        distances = None
+        if scope.bboxes:
+            rows = rows[_in_boxes(snapshot.latitudes, snapshot.longitudes, scope.bboxes)]
+        if scope.center is not None:
+            distances = _haversine_m(scope.center, snapshot.latitudes[rows], snapshot.longitudes[rows])
+            inside = distances <= scope.radius_m
+            rows, distances = rows[inside], distances[inside]
+        columns = np.arange(len(snapshot.category_ids))
+        if scope.category_id is not None:
+            columns = columns[snapshot.category_ids == scope.category_id]
+
+        last_reviewed = snapshot.last_reviewed
+        if len(rows) != last_reviewed.shape[0] or len(columns) != last_reviewed.shape[1]:
+            last_reviewed = last_reviewed[np.ix_(rows, columns)]
+        if last_reviewed.size == 0:
+            return []
+
+        scores = np.subtract(time.time(), last_reviewed)
+        scores[np.isnan(scores)] = NEVER_REVIEWED_AGE
+        if self.category_weights:
+            weights = np.array([self.category_weights.get(int(category_id), 1.0)
+                                for category_id in snapshot.category_ids[columns]])
+            scores *= weights
+        if distances is not None and self.distance_weight:
+            scores -= (distances * (self.distance_weight * 86400 / 1000))[:, None]
+        scores[last_reviewed >= _epoch(threshold_date)] = -np.inf
+
+        flat = scores.ravel()
+        eligible = int(np.count_nonzero(flat > -np.inf))
+        limit = min(scope.limit, eligible)
+        if limit == 0:
+            return []
+        if limit < flat.size:
+            # Every pair scoring at least the limit-th best, so that ties at the
+            # boundary are broken by position (location ID, then category ID).
+            kth = flat[np.argpartition(flat, flat.size - limit)[flat.size - limit]]
+            candidates = np.flatnonzero(flat >= kth)
+        else:
+            candidates = np.flatnonzero(flat > -np.inf)
+        top = candidates[np.lexsort((candidates, -flat[candidates]))[:limit]]
+        row_positions, column_positions = np.divmod(top, len(columns))
+        return list(zip(
+            snapshot.location_ids[rows[row_positions]].tolist(),
+            snapshot.category_ids[columns[column_positions]].tolist(),
+        ))
+
+    def stats(self):
+        """
+        Return the snapshot size and age.
+
+        Returns:
+            dict: Whether the engine is enabled, the number of pairs, the bytes held
+            and the seconds since the last load.
+        """
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "pairs": snapshot.pairs if snapshot is not None else 0,
+            "bytes": snapshot.nbytes if snapshot is not None else 0,
+            "age_seconds": time.monotonic() - self._loaded_at if self._loaded_at is not None else None,
+        }
+
+def _payload_arrays(payloads):
+    """
+    Split published [location_id, category_id, epoch] items into the arrays of ``Snapshot.record``.
+    """
+    location_ids, category_ids, epochs = zip(*payloads)
+    return (np.array(location_ids, dtype=np.int64), np.array(category_ids, dtype=np.int64),
+            np.array(epochs, dtype=np.float64))
+
+def _in_boxes(latitudes, longitudes, bboxes):
+    """
+    Return the mask of the coordinates inside any of the bounding boxes.
+    """
+    mask = np.zeros(len(longitudes), dtype=bool)
+    for min_lon, min_lat, max_lon, max_lat in bboxes:
+        mask |= (longitudes >= min_lon) & (longitudes <= max_lon) & (latitudes >= min_lat) & (latitudes <= max_lat)
+    return mask
+
+def _haversine_m(center, latitudes, longitudes):
+    """
+    Vectorized ``geo.haversine_m`` from a center to arrays of coordinates.
+    """
+    phi1 = math.radians(center[0])
+    phi2 = np.radians(latitudes)
+    dphi = phi2 - phi1
+    dlambda = np.radians(longitudes - center[1])
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * geo.EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+if config.RECOMMENDATION_ENGINE not in ENGINES:
+    raise ValueError(f"Unknown recommendation engine: {config.RECOMMENDATION_ENGINE}")
+
+# Recommendation engine of this worker, used when RECOMMENDATION_ENGINE is "vectorized"
+engine = ScoringEngine(
+    enabled=config.RECOMMENDATION_ENGINE == "vectorized",
+    reload_interval=config.SCORING_RELOAD_INTERVAL,
+    ttl_seconds=config.SCORING_SNAPSHOT_TTL,
+    channel=cache.create_channel(config.CACHE_INVALIDATION_CHANNEL, topic="scoring"),
+    category_weights=parse_category_weights(config.SCORING_CATEGORY_WEIGHTS),
+    distance_weight=config.SCORING_DISTANCE_WEIGHT,
+)
@@ -0,0 +1,78 @@
+"""
+Fast JSON rendering of list responses, used when FAST_SERIALIZATION is enabled.
+
+Responses are built from plain row tuples and encoded with orjson, skipping ORM
+instances and per-object pydantic validation. The bytes are identical to those of
+the default path: fields follow the schema declaration order, datetimes are written
+the way pydantic writes them, and floats the way the stdlib json module writes them.
+"""
+from fastapi import Response
+from . import schemas
+import orjson
+
+def _json_value(value):
+    """
+    Return ``value`` ready for orjson, matching the stdlib encoding of floats.
+
+    orjson and ``repr`` agree on floats between 1e-4 and 1e16; outside that range
+    ``repr`` switches to exponent notation (1e-05, 1e+16), which is kept verbatim.
+    """
+    if type(value) is float and value != 0 and not 1e-4 <= abs(value) < 1e16:
+        return orjson.Fragment(repr(value).encode())
+    return value
+
+def _to_dict(names, values):
+    return {name: _json_value(value) for name, value in zip(names, values)}
+
+def render(content) -> bytes:
+    """
+    Encode ``content`` as compact JSON, with UTC datetimes written with a "Z" suffix.
+    """
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+def page_response(schema, rows, limit: int) -> Response:
+    """
+    Build a list response from rows holding the fields of ``schema``.
+
+    Args:
+        schema: The response schema of one item, such as schemas.Location.
+        rows (List[Row]): Rows from ``crud.get_page_rows``.
+        limit (int): The requested page size, to decide whether a next page may exist.
+
+    Returns:
+        Response: The JSON response, with an ``X-Next-Cursor`` header when the page is full.
+    """
+    names = list(schema.model_fields)
+    headers = {}
+    if limit > 0 and len(rows) == limit:
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    return Response(
+        content=render([_to_dict(names, row) for row in rows]),
+        media_type="application/json",
+        headers=headers
+    )
+
+def recommendations_response(rows) -> Response:
+    """
+    Build the recommendation list response from rows of ``crud.get_recommendation_rows``.
+
+    Args:
+        rows (List[Row]): Location fields, then category fields, then last_reviewed.
+
+    Returns:
+        Response: The JSON response.
+    """
+    location_names = list(schemas.Location.model_fields)
+    category_names = list(schemas.Category.model_fields)
+    split = len(location_names)
+    return Response(
+        content=render([
+            {
+                "location": _to_dict(location_names, row[:split]),
+                "category": _to_dict(category_names, row[split:-1]),
+                "last_reviewed": row[-1],
+            }
+            for row in rows
+        ]),
+        media_type="application/json"
+    )
@@ -0,0 +1,275 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from . import config
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ReviewBuffer:
+    """
+    Write-behind buffer coalescing reviews of the same location-category pair.
+
+    Accepted reviews are kept in memory keyed by (location_id, category_id) with
+    only the latest review time, and written in batches by a background thread
+    every ``flush_interval`` seconds or as soon as ``max_pending`` pairs are waiting.
+
+    When a journal path is set, every accepted review is appended to a journal of
+    this process, ``<path>.<pid>``, before it is acknowledged. Each worker holds a lock
+    on its journal, so on startup the journals left by workers that are gone can be
+    told apart from those of running ones: they are replayed into this buffer, then
+    removed. Replaying is safe to repeat because batch writes never move a pair's
+    last review back in time.
+
+    With ``fsync``, appends are made durable by group commit: the journal is synced
+    outside the buffer lock, and one ``fsync`` covers every append written before it.
+    """
+    def __init__(self, flush_interval: float, max_pending: int, journal_path: Optional[str] = None, fsync: bool = False):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self._pending: Dict[Tuple[int, int], datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Taken before _lock: serializes the fsyncs and keeps compaction from closing
+        # the journal under one.
+        self._sync_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._journal = None
+        self._journal_lock = None
+        self._own_journal_path = None
+        # Number of appends written to the journal, and how many of them are synced.
+        self._written = 0
+        self._synced = 0
+        self._thread = None
+
+    def add(self, location_id: int, category_id: int, reviewed_at: Optional[datetime] = None):
+        """
+        Accept a review, keeping only the latest review time of its pair.
+
+        Args:
+            location_id (int): The ID of the reviewed location.
+            category_id (int): The ID of the reviewed category.
+            reviewed_at (Optional[datetime]): When the review happened, now by default.
+
+        Returns:
+            datetime: The review time recorded.
+        """
+        reviewed_at = reviewed_at or datetime.now(timezone.utc)
+        pair = (location_id, category_id)
+        written = None
+        with self._lock:
+            if self._journal is not None:
+                self._append_journal(self._journal, pair, reviewed_at)
+                self._written += 1
+                written = self._written
+            if pair not in self._pending or self._pending[pair] < reviewed_at:
+                self._pending[pair] = reviewed_at
+            pending = len(self._pending)
+        if written is not None and self.fsync:
+            self._sync_journal(written)
+        if pending >= self.max_pending:
+            self._wakeup.set()
+        return reviewed_at
+
+    def pending(self):
+        """
+        Return the number of pairs waiting to be written.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """
+        Write the waiting reviews to the database.
+
+        On failure the reviews are put back in the buffer and retried on the next flush.
+
+        Returns:
+            int: The number of pairs written.
+        """
+        from . import crud
+        from .database import SessionLocal
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            db = SessionLocal()
+            try:
+                written = crud.apply_review_timestamps(db, batch)
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} buffered reviews: {str(e)}")
+                with self._lock:
+                    for pair, reviewed_at in batch.items():
+                        if pair not in self._pending or self._pending[pair] < reviewed_at:
+                            self._pending[pair] = reviewed_at
+                return 0
+            finally:
+                db.close()
+
+            with self._sync_lock, self._lock:
+                self._compact_journal()
+            return written
+
+    def start(self):
+        """
+        Replay the journals left by stopped workers and start the background flush thread.
+        """
+        if self.journal_path:
+            self._own_journal_path = f"{self.journal_path}.{os.getpid()}"
+            self._journal_lock = self._lock_journal(self._own_journal_path)
+            self._replay_journal(self._own_journal_path)
+            orphans = []
+            for lock_path in glob.glob(f"{glob.escape(self.journal_path)}.*.lock"):
+                path = lock_path.removesuffix(".lock")
+                if path == self._own_journal_path:
+                    continue
+                # Running workers hold the lock of their journal.
+                orphan_lock = self._lock_journal(path, blocking=False)
+                if orphan_lock is not None:
+                    self._replay_journal(path)
+                    orphans.append((path, orphan_lock))
+            # Everything replayed is rewritten to this worker's journal before the
+            # other journals are removed.
+            with self._sync_lock, self._lock:
+                self._journal = open(self._own_journal_path, "a")
+                self._compact_journal()
+            for path, orphan_lock in orphans:
+                self._remove_journal(path, orphan_lock)
+            self.flush()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="review-write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread and flush the remaining reviews.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._sync_lock, self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._journal_lock is not None:
+                if not self._pending:
+                    self._remove_journal(self._own_journal_path, self._journal_lock)
+                else:
+                    self._journal_lock.close()
+                self._journal_lock = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            self.flush()
+
+    def _append_journal(self, journal, pair, reviewed_at):
+        journal.write(json.dumps({
+            "location_id": pair[0],
+            "category_id": pair[1],
+            "reviewed_at": reviewed_at.isoformat(),
+        }) + "\n")
+        journal.flush()
+
+    def _sync_journal(self, written: int):
+        """
+        Make the first ``written`` appends durable, unless a concurrent sync already did.
+        """
+        with self._sync_lock:
+            if self._synced >= written:
+                return
+            with self._lock:
+                if self._journal is None:
+                    return
+                target = self._written
+                descriptor = self._journal.fileno()
+            os.fsync(descriptor)
+            self._synced = target
+
+    @staticmethod
+    def _lock_journal(path: str, blocking: bool = True):
+        """
+        Take the lock of the journal at ``path``, held for as long as its owner runs.
+
+        Returns:
+            The open lock file, or None if another process holds the lock.
+        """
+        lock = open(f"{path}.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    @staticmethod
+    def _remove_journal(path: str, lock):
+        """
+        Delete a journal whose reviews are written or journaled elsewhere, then its lock.
+        """
+        for stale_path in (path, f"{path}.lock"):
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
+        lock.close()
+
+    def _replay_journal(self, path: str):
+        if not os.path.exists(path):
+            return
+        replayed = 0
+        with open(path) as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                    pair = (entry["location_id"], entry["category_id"])
+                    reviewed_at = datetime.fromisoformat(entry["reviewed_at"])
+                except (ValueError, KeyError):
+                    # A line torn by a crash mid-write; everything before it is intact.
+                    logger.warning(f"Skipping malformed line in review journal {path}")
+                    continue
+                if pair not in self._pending or self._pending[pair] < reviewed_at:
+                    self._pending[pair] = reviewed_at
+                replayed += 1
+        logger.info(f"Replayed {replayed} reviews from journal {path}")
+
+    def _compact_journal(self):
+        """
+        Rewrite the journal with only the reviews still waiting. Called with the sync
+        lock and the lock held.
+        """
+        if self._journal is None:
+            return
+        temporary_path = f"{self._own_journal_path}.tmp"
+        with open(temporary_path, "w") as journal:
+            for pair, reviewed_at in self._pending.items():
+                self._append_journal(journal, pair, reviewed_at)
+            os.fsync(journal.fileno())
+        self._journal.close()
+        os.replace(temporary_path, self._own_journal_path)
+        self._journal = open(self._own_journal_path, "a")
+        self._synced = self._written
+
+review_buffer = ReviewBuffer(
+    flush_interval=config.WRITE_BEHIND_FLUSH_INTERVAL,
+    max_pending=config.WRITE_BEHIND_MAX_PENDING,
+    journal_path=config.WRITE_BEHIND_JOURNAL,
+    fsync=config.WRITE_BEHIND_FSYNC
+) if config.WRITE_BEHIND_ENABLED else None
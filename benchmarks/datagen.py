@@ -0,0 +1,160 @@
+"""
+Synthetic dataset generator for the benchmarks.
+
+Generates ``locations`` x ``categories`` location-category pairs with a chosen
+distribution of review ages, on SQLite or PostgreSQL. Locations and categories
+are inserted in batches from Python (locations need their geohash); pairs and
+reviews are generated by the database with INSERT ... SELECT, so seeding 10M
+pairs never moves them through Python.
+
+Review ages and never-reviewed pairs are derived from a hash of the pair IDs and
+the seed rather than from random(), so the same arguments produce the same
+dataset on either database.
+"""
+import math
+import random
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, bindparam, insert, text
+
+from app import config, crud, geo, models
+
+# Rows inserted per statement when seeding locations and categories
+BATCH_SIZE = 10_000
+
+# Tables emptied before seeding, referencing tables first
+TABLES = (
+    "review_events_pending", "review_events", "review_daily_counts", "recommendation_leases", "reviews", "location_category",
+    "locations", "categories", "location_grid", "location_grid_review_days",
+)
+
+# Review age distributions: the age in days of a reviewed pair, from a uniform value u in [0, 1)
+AGE_DISTRIBUTIONS = {
+    # Ages spread evenly up to max_age_days.
+    "uniform": "({u}) * :max_age_days",
+    # Most pairs reviewed recently with a long tail, capped at max_age_days.
+    "exponential": "{least}(-ln(1 - ({u})) * :mean_age_days, :max_age_days)",
+}
+
+# Pseudo-random values in [0, 1) from the pair IDs and the seed
+PAIR_HASH_U = "((l.id * 2654435761 + c.id * 40503 + :seed * 97) % 1000003) / 1000003.0"
+PAIR_HASH_V = "((l.id * 40503 + c.id * 2654435761 + :seed * 31) % 1000033) / 1000033.0"
+
+
+def _dialect_sql(dialect):
+    """
+    Return the SQL fragments that differ between PostgreSQL and SQLite.
+    """
+    if dialect == "postgresql":
+        return {
+            "least": "LEAST",
+            "timestamp": "CAST(:now AS timestamptz) - make_interval(secs => CAST(({age}) * 86400 AS double precision))",
+        }
+    return {
+        "least": "min",
+        "timestamp": "datetime(:now, '-' || (({age}) * 86400) || ' seconds')",
+    }
+
+
+def clear(db):
+    """
+    Delete every row of the benchmark tables and restart their IDs.
+    """
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+    else:
+        for table in TABLES:
+            db.execute(text(f"DELETE FROM {table}"))
+    db.commit()
+
+
+def seed(db, locations, categories, never_reviewed=0.01, distribution="uniform",
+         max_age_days=90, mean_age_days=20, seed=0):
+    """
+    Replace the benchmark tables with a synthetic dataset.
+
+    Args:
+        db (Session): The database session.
+        locations (int): Number of locations, spread uniformly over the globe.
+        categories (int): Number of categories.
+        never_reviewed (float): Share of pairs never reviewed.
+        distribution (str): Review age distribution, "uniform" or "exponential".
+        max_age_days (float): Oldest review age.
+        mean_age_days (float): Mean review age of the exponential distribution.
+        seed (int): Seed of the generated coordinates, ages and never-reviewed pairs.
+
+    Returns:
+        dict: The dataset parameters and the number of rows of each table.
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        # ln() is only built into SQLite when compiled with its math functions
+        db.connection().connection.driver_connection.create_function("ln", 1, math.log, deterministic=True)
+
+    clear(db)
+    now = datetime.now(timezone.utc)
+    generator = random.Random(seed)
+
+    for start in range(0, locations, BATCH_SIZE):
+        rows = []
+        for _ in range(min(BATCH_SIZE, locations - start)):
+            longitude = generator.uniform(-180, 180)
+            # Uniform over the sphere rather than over latitudes
+            latitude = math.degrees(math.asin(generator.uniform(-1, 1)))
+            rows.append({
+                "longitude": longitude,
+                "latitude": latitude,
+                "geohash": geo.encode_geohash(latitude, longitude),
+                "created_at": now,
+                "updated_at": now,
+            })
+        db.execute(insert(models.Location), rows)
+
+    for start in range(0, categories, BATCH_SIZE):
+        db.execute(insert(models.Category), [
+            {"name": f"category-{i}", "created_at": now, "updated_at": now}
+            for i in range(start, min(categories, start + BATCH_SIZE))
+        ])
+
+    fragments = _dialect_sql(dialect)
+    age = AGE_DISTRIBUTIONS[distribution].format(u=PAIR_HASH_U, least=fragments["least"])
+    reviewed_at = fragments["timestamp"].format(age=age)
+    # Sparse mode only stores reviewed pairs; the others are derived at query time.
+    sparse_filter = f"WHERE {PAIR_HASH_V} >= :never_reviewed" if config.SPARSE_LOCATION_CATEGORY else ""
+    parameters = {
+        "seed": seed,
+        "never_reviewed": never_reviewed,
+        "max_age_days": max_age_days,
+        "mean_age_days": mean_age_days,
+        "now": now,
+    }
+    timestamp = bindparam("now", type_=DateTime(timezone=True))
+
+    db.execute(text(
+        "INSERT INTO location_category (location_id, category_id, last_reviewed, created_at, updated_at) "
+        f"SELECT l.id, c.id, CASE WHEN {PAIR_HASH_V} < :never_reviewed THEN NULL ELSE {reviewed_at} END, :now, :now "
+        f"FROM locations l CROSS JOIN categories c {sparse_filter}"
+    ).bindparams(timestamp), parameters)
+    db.execute(text(
+        "INSERT INTO reviews (location_id, category_id, last_reviewed, created_at, updated_at) "
+        "SELECT location_id, category_id, last_reviewed, :now, :now "
+        "FROM location_category WHERE last_reviewed IS NOT NULL"
+    ).bindparams(timestamp), {"now": now})
+    db.commit()
+    crud.rebuild_location_grid(db)
+    db.execute(text("ANALYZE"))
+    db.commit()
+
+    return {
+        "locations": locations,
+        "categories": categories,
+        "never_reviewed": never_reviewed,
+        "distribution": distribution,
+        "max_age_days": max_age_days,
+        "mean_age_days": mean_age_days,
+        "seed": seed,
+        "rows": {
+            table: db.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            for table in ("locations", "categories", "location_category", "reviews")
+        },
+    }
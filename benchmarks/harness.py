@@ -0,0 +1,54 @@
+"""
+Timing helpers shared by the benchmarks.
+"""
+import time
+
+
+def percentile(samples, pct):
+    """
+    Return the nearest-rank percentile of a list of samples.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms, elapsed_s, errors=0):
+    """
+    Summarize latency samples in milliseconds taken over ``elapsed_s`` seconds.
+    """
+    return {
+        "iterations": len(samples_ms),
+        "errors": errors,
+        "throughput_ops": round(len(samples_ms) / elapsed_s, 1) if elapsed_s else None,
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 3) if samples_ms else None,
+        "p50_ms": round(percentile(samples_ms, 50), 3) if samples_ms else None,
+        "p95_ms": round(percentile(samples_ms, 95), 3) if samples_ms else None,
+        "p99_ms": round(percentile(samples_ms, 99), 3) if samples_ms else None,
+    }
+
+
+def measure(operation, iterations, warmup=3):
+    """
+    Call ``operation(i)`` ``iterations`` times and summarize its latency.
+
+    The first ``warmup`` calls are not recorded. Calls raising an exception are
+    counted as errors and left out of the latency samples.
+    """
+    for i in range(warmup):
+        operation(-1 - i)
+
+    samples = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        try:
+            operation(i)
+        except Exception:
+            errors += 1
+            continue
+        samples.append((time.perf_counter() - call_started) * 1000)
+    return summarize(samples, time.perf_counter() - started, errors)
@@ -0,0 +1,90 @@
+"""
+Closed-loop HTTP load test for a running API server.
+
+Opens ``--concurrency`` connections that each send requests back to back for
+``--duration`` seconds and reports throughput, latency percentiles and errors.
+Run it once against a server started with ASYNC_DB=false and once with
+ASYNC_DB=true to compare the sync and async database paths:
+
+    ASYNC_DB=true uvicorn app.main:app --port 8000
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 500
+
+Requires httpx (pip install -r benchmarks/requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .harness import percentile
+
+DEFAULT_PATHS = [
+    "/api/v1/locations/?limit=20",
+    "/api/v1/categories/",
+    "/api/v1/reviews/?limit=20",
+    "/api/v1/recommendations/",
+]
+
+
+async def worker(client, paths, deadline, latencies, errors):
+    """
+    Send requests over one connection until the deadline.
+    """
+    index = 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                continue
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run(url, concurrency, duration, paths):
+    """
+    Run the load test and return its summary.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies = []
+    errors = {}
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, paths, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) or 0, 3),
+        "p95_ms": round(percentile(latencies, 95) or 0, 3),
+        "p99_ms": round(percentile(latencies, 99) or 0, 3),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--path", action="append", dest="paths", help="path to request, may be repeated")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args.url, args.concurrency, args.duration, args.paths or DEFAULT_PATHS))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Query-plan regression checks of the crud functions on PostgreSQL.
+
+Seeds a synthetic dataset of ``--locations`` x ``--categories`` pairs through
+``benchmarks.datagen``, runs every scenario once while recording the SQL it
+issues, then runs ``EXPLAIN (ANALYZE, FORMAT JSON)`` on each statement inside a
+transaction that is rolled back. A scenario fails when:
+
+- a statement scans one of the large tables sequentially;
+- an index it must use does not appear in its plans;
+- a statement's estimated cost or row count exceeds the scenario budget;
+- the shape of its plans (node types, joins, relations, indexes) differs from the
+  golden file recorded in ``benchmarks/golden_plans/``.
+
+Costs and timings are left out of the golden files, so they only change when a
+plan does. Budgets are set for the default dataset and configuration (dense
+location_category, caches and vectorized engine disabled).
+
+Usage:
+    DATABASE_URL=postgresql://localhost/plans python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --skip-seed --update   # record the golden files
+
+The seeded tables are emptied first: never point it at a database holding real data.
+The command exits with status 1 when a check fails.
+"""
+import argparse
+import difflib
+import json
+import logging
+import os
+import re
+import sys
+from typing import NamedTuple, Tuple
+
+from sqlalchemy import event, select
+
+from app import crud, migrations, models, schemas
+from app.database import SessionLocal, engine
+
+from . import datagen
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden_plans")
+
+# Statements that EXPLAIN accepts
+EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+# Tables large enough that a sequential scan is a regression
+LARGE_TABLES = {"locations", "location_category", "reviews", "review_events"}
+
+# Plan node fields kept in the golden files
+SHAPE_KEYS = ("Node Type", "Join Type", "Strategy", "Relation Name", "Index Name", "Scan Direction")
+
+
+class PlanBudget(NamedTuple):
+    """
+    Limits on the plans of a scenario: the highest estimated total cost and row count
+    of any statement, and the indexes that must appear in its plans.
+    """
+    max_cost: float
+    max_rows: float
+    indexes: Tuple[str, ...] = ()
+
+
+def scenarios(ids):
+    """
+    Return the (name, operation, budget) scenarios.
+    """
+    location_id = ids["locations"][len(ids["locations"]) // 2]
+    category_id = ids["categories"][0]
+    review = schemas.ReviewCreate(location_id=location_id, category_id=category_id)
+
+    return [
+        ("crud.get_location", lambda db: crud.get_location(db, location_id),
+         PlanBudget(max_cost=50, max_rows=1, indexes=("locations_pkey",))),
+        ("crud.get_locations[first page]", lambda db: crud.get_locations(db, limit=100),
+         PlanBudget(max_cost=100, max_rows=100, indexes=("locations_pkey",))),
+        ("crud.get_locations[keyset]", lambda db: crud.get_locations(db, after_id=location_id, limit=100),
+         PlanBudget(max_cost=100, max_rows=100, indexes=("locations_pkey",))),
+        ("crud.get_review", lambda db: crud.get_review(db, location_id, category_id),
+         PlanBudget(max_cost=50, max_rows=1, indexes=("uq_reviews_location_category",))),
+        ("crud.create_or_update_review", lambda db: crud.create_or_update_review(db, review),
+         PlanBudget(max_cost=5000, max_rows=50_000,
+                    indexes=("uq_reviews_location_category", "uq_location_category_pair"))),
+        ("crud.get_recommendations", lambda db: crud.get_recommendations(db),
+         PlanBudget(max_cost=500, max_rows=crud.RECOMMENDATION_LIMIT,
+                    indexes=("idx_location_category_staleness",))),
+    ]
+
+
+def capture(operation):
+    """
+    Run ``operation(db)`` in its own session and return the (statement, parameters) it executed.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in EXPLAINABLE:
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    db = SessionLocal()
+    try:
+        operation(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def explain(statement, parameters):
+    """
+    Return the root plan node of a statement, executed and rolled back.
+    """
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            result = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {statement}", parameters)
+            return result.scalar()[0]["Plan"]
+        finally:
+            transaction.rollback()
+
+
+def nodes(plan):
+    """
+    Yield every node of a plan, depth first.
+    """
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from nodes(child)
+
+
+def shape(plan):
+    """
+    Return the structure of a plan without its costs, estimates and timings.
+    """
+    result = {key: plan[key] for key in SHAPE_KEYS if key in plan}
+    if "Plans" in plan:
+        result["Plans"] = [shape(child) for child in plan["Plans"]]
+    return result
+
+
+def check(budget, plans):
+    """
+    Return the budget violations of the (statement, plan) pairs of a scenario.
+    """
+    violations = []
+    used_indexes = set()
+    for position, (_, plan) in enumerate(plans, 1):
+        for node in nodes(plan):
+            if "Index Name" in node:
+                used_indexes.add(node["Index Name"])
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES:
+                violations.append(f"statement {position}: sequential scan on {node['Relation Name']}")
+        if plan["Total Cost"] > budget.max_cost:
+            violations.append(f"statement {position}: estimated cost {plan['Total Cost']} > {budget.max_cost}")
+        if plan["Plan Rows"] > budget.max_rows:
+            violations.append(f"statement {position}: estimated rows {plan['Plan Rows']} > {budget.max_rows}")
+    for index in budget.indexes:
+        if index not in used_indexes:
+            violations.append(f"index {index} is not used")
+    return violations
+
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") + ".json")
+
+
+def golden(plans):
+    """
+    Return the golden file content of the (statement, plan) pairs of a scenario.
+    """
+    return json.dumps(
+        [{"sql": " ".join(statement.split()), "plan": shape(plan)} for statement, plan in plans], indent=2
+    ) + "\n"
+
+
+def load_ids(db):
+    """
+    Return the IDs the scenarios pick their inputs from.
+    """
+    return {
+        "locations": db.scalars(select(models.Location.id).order_by(models.Location.id)).all(),
+        "categories": db.scalars(select(models.Category.id).order_by(models.Category.id)).all(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=20_000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", action="append", dest="scenarios", help="only run scenarios containing this text")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in the database")
+    parser.add_argument("--update", action="store_true", help="record the golden files instead of comparing them")
+    args = parser.parse_args()
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    if engine.dialect.name != "postgresql":
+        sys.exit("Query plans are only checked on PostgreSQL: point DATABASE_URL at a PostgreSQL database")
+
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        if not args.skip_seed:
+            dataset = datagen.seed(db, args.locations, args.categories, seed=args.seed)
+            print(f"Seeded {json.dumps(dataset['rows'])}")
+        ids = load_ids(db)
+    finally:
+        db.close()
+
+    failed = False
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name, operation, budget in scenarios(ids):
+        if args.scenarios and not any(text in name for text in args.scenarios):
+            continue
+        plans = [(statement, explain(statement, parameters)) for statement, parameters in capture(operation)]
+        violations = check(budget, plans)
+        recorded = golden(plans)
+        path = golden_path(name)
+
+        if args.update:
+            with open(path, "w") as f:
+                f.write(recorded)
+        elif not os.path.exists(path):
+            violations.append(f"no golden file {os.path.relpath(path)}, record it with --update")
+        else:
+            with open(path) as f:
+                expected = f.read()
+            if expected != recorded:
+                violations.append("plans differ from the golden file:\n" + "".join(difflib.unified_diff(
+                    expected.splitlines(keepends=True), recorded.splitlines(keepends=True),
+                    fromfile=os.path.relpath(path), tofile="current"
+                )))
+
+        slowest = max((plan["Actual Total Time"] for _, plan in plans), default=0)
+        print(f"{name:<35} {len(plans)} statements  slowest {slowest:.3f} ms  "
+              f"{'FAILED' if violations else 'ok'}")
+        for violation in violations:
+            print(f"  {violation}")
+        failed = failed or bool(violations)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark crud.get_recommendations on a large location_category table.
+
+Seeds the database with ``--locations`` x ``--categories`` pairs (100,000 x 100
+gives 10M pair rows) through ``benchmarks.datagen``, a share of them never
+reviewed and the rest reviewed up to 90 days ago, then reports latency
+percentiles and the query plans of the recommendation queries, over the whole
+table and over the region given by ``--lat``, ``--lon`` and ``--radius-m``. The
+whole crud and HTTP surface is covered by ``benchmarks.suite``.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.recommendations --locations 100000 --categories 100
+
+The schema migrations are applied first, so the tables have the current indexes.
+"""
+import argparse
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app import crud, geo, migrations, models
+from app.database import SessionLocal, engine
+
+from . import datagen
+from .harness import percentile
+
+
+def regional_scope(latitude, longitude, radius_m):
+    """
+    Return the recommendation scope of a circular region, as built by the API.
+    """
+    return crud.RecommendationScope(
+        bboxes=tuple(geo.bbox_around(latitude, longitude, radius_m)),
+        center=(latitude, longitude),
+        radius_m=radius_m,
+    )
+
+
+def explain(db, statement):
+    """
+    Return the plan of a statement, executed on PostgreSQL.
+    """
+    compiled = statement.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    if db.bind.dialect.name == "postgresql":
+        rows = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT TEXT) {compiled}")).all()
+        return [row[0] for row in rows]
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return [row[-1] for row in rows]
+
+
+def recommendation_statements(scope):
+    """
+    Return the recommendation queries of ``scope`` by name: the dense ranking used when
+    every pair is materialized, and the never-reviewed and stale queries of the sparse layout.
+    """
+    threshold_date = datetime.now(timezone.utc) - timedelta(days=30)
+    return {
+        "dense": crud._select_dense_recommendations(threshold_date, limit=scope.limit, scope=scope),
+        "sparse never reviewed": crud._select_never_reviewed_pairs(limit=scope.limit, scope=scope),
+        "sparse stale": crud._select_stale_pairs(threshold_date, limit=scope.limit, scope=scope),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=100)
+    parser.add_argument("--never-reviewed", type=float, default=0.01, help="share of pairs never reviewed")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in the database")
+    parser.add_argument("--lat", type=float, default=0.0, help="center of the region explained")
+    parser.add_argument("--lon", type=float, default=0.0, help="center of the region explained")
+    parser.add_argument("--radius-m", type=float, default=100_000, help="radius of the region explained")
+    args = parser.parse_args()
+    logging.getLogger("app.crud").setLevel(logging.WARNING)
+
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        if not args.skip_seed:
+            started = time.perf_counter()
+            datagen.seed(db, args.locations, args.categories, never_reviewed=args.never_reviewed)
+            print(f"Seeded {args.locations * args.categories} pairs in {time.perf_counter() - started:.1f}s")
+
+        samples = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            crud.get_recommendations(db)
+            samples.append((time.perf_counter() - started) * 1000)
+
+        print(json.dumps({
+            "pairs": db.query(models.LocationCategory).count(),
+            "iterations": args.iterations,
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+        }, indent=2))
+        scopes = {
+            "global": crud.RecommendationScope(),
+            "regional": regional_scope(args.lat, args.lon, args.radius_m),
+        }
+        for scope_name, scope in scopes.items():
+            for query_name, statement in recommendation_statements(scope).items():
+                print(f"\n== {query_name}, {scope_name} ==")
+                print("\n".join(explain(db, statement)))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Microbenchmark of the default and FAST_SERIALIZATION response paths.
+
+Loads pages of ``--rows`` locations, categories and reviews from an in-memory
+SQLite database and times, per page:
+
+- default: ORM objects from crud, validated and serialized by FastAPI through the
+  route's response model, then encoded by JSONResponse;
+- fast: plain rows from crud.get_page_rows, encoded by app.serialization.
+
+Both paths include the query. The benchmark fails if the two bodies differ.
+
+Usage:
+    python -m benchmarks.serialization --rows 1000 --iterations 200
+
+The app package is imported, so DATABASE_URL must point to a reachable database
+(DATABASE_URL=sqlite:///bench.db is enough); the benchmark data is not written to it.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import crud, models, schemas, serialization
+
+from .harness import percentile
+
+ENTITIES = [
+    ("locations", models.Location, schemas.Location, crud.get_locations),
+    ("categories", models.Category, schemas.Category, crud.get_categories),
+    ("reviews", models.Review, schemas.Review, crud.get_reviews),
+]
+
+
+def seed(db, rows):
+    """
+    Fill the database with ``rows`` locations, categories and reviews.
+    """
+    now = datetime.now(timezone.utc)
+    db.add_all(
+        models.Location(longitude=(i * 0.0137) % 360 - 180, latitude=(i * 0.0071) % 180 - 90)
+        for i in range(rows)
+    )
+    db.add_all(models.Category(name=f"category-{i}") for i in range(rows))
+    db.flush()
+    db.add_all(
+        models.Review(location_id=i + 1, category_id=i + 1, last_reviewed=now - timedelta(minutes=i))
+        for i in range(rows)
+    )
+    db.commit()
+
+
+async def run(db, rows, iterations):
+    """
+    Time both paths for every entity and return the summary.
+    """
+    results = {}
+    for name, model, schema, get_page in ENTITIES:
+        field = create_response_field(name="response", type_=List[schema], mode="serialization")
+
+        async def default():
+            content = await serialize_response(field=field, response_content=get_page(db, skip=0, limit=rows))
+            return JSONResponse(content).body
+
+        async def fast():
+            page = crud.get_page_rows(db, model, schema, skip=0, limit=rows)
+            return serialization.page_response(schema, page, rows).body
+
+        if await default() != await fast():
+            raise AssertionError(f"{name}: the fast path output differs from the default path")
+
+        timings = {}
+        for label, render in (("default", default), ("fast", fast)):
+            samples = []
+            for _ in range(iterations):
+                db.expunge_all()
+                started = time.perf_counter()
+                await render()
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[label] = {
+                "p50_ms": round(percentile(samples, 50), 3),
+                "p95_ms": round(percentile(samples, 95), 3),
+                "p99_ms": round(percentile(samples, 99), 3),
+            }
+        timings["speedup_p50"] = round(timings["default"]["p50_ms"] / timings["fast"]["p50_ms"], 2)
+        results[name] = timings
+    return {"rows": rows, "iterations": iterations, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        seed(db, args.rows)
+        summary = asyncio.run(run(db, args.rows, args.iterations))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
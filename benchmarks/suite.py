@@ -0,0 +1,272 @@
+"""
+Scenario benchmarks of the crud functions and HTTP endpoints on a synthetic dataset.
+
+Seeds the database in DATABASE_URL (SQLite or PostgreSQL) with ``--locations`` x
+``--categories`` pairs, runs every scenario and reports throughput and p50/p95/p99
+latency. Read scenarios run first; write scenarios then add rows to the dataset.
+HTTP scenarios go through the ASGI app in-process, so they include routing,
+validation and serialization but no network.
+
+Results are saved as JSON, along with the dataset parameters, the feature flags
+in effect and the git commit, and can be compared with an earlier run:
+
+    DATABASE_URL=sqlite:///benchmark.db python -m benchmarks.suite --locations 10000 --categories 50
+    python -m benchmarks.suite --skip-seed --compare benchmarks/results/<earlier run>.json
+
+The seeded tables are emptied first: never point it at a database holding real data.
+HTTP scenarios require httpx (pip install -r benchmarks/requirements.txt).
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from app import config, crud, migrations, models, schemas
+from app.database import SessionLocal, engine
+
+from . import datagen
+from .harness import measure
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Search radius of the nearby scenarios, and side in degrees of the within scenarios
+NEARBY_RADIUS_M = 50_000
+WITHIN_BOX_DEGREES = 1.0
+
+# Reviews per request of the batch scenarios
+REVIEW_BATCH_SIZE = 100
+
+
+def with_session(operation):
+    """
+    Run ``operation(db, i)`` in its own session, like a request does.
+    """
+    def run(i):
+        db = SessionLocal()
+        try:
+            return operation(db, i)
+        finally:
+            db.close()
+    return run
+
+
+def crud_scenarios(ids, rng, run_id):
+    """
+    Return the (name, is_write, operation) crud scenarios.
+    """
+    location_ids, category_ids = ids["locations"], ids["categories"]
+
+    def pair():
+        return rng.choice(location_ids), rng.choice(category_ids)
+
+    def point():
+        return rng.uniform(-80, 80), rng.uniform(-179, 179)
+
+    def box():
+        latitude, longitude = point()
+        return (longitude, latitude, longitude + WITHIN_BOX_DEGREES, latitude + WITHIN_BOX_DEGREES)
+
+    def review():
+        location_id, category_id = pair()
+        return schemas.ReviewCreate(location_id=location_id, category_id=category_id)
+
+    return [
+        ("crud.get_recommendations", False, lambda db, i: crud.get_recommendations(db)),
+        ("crud.get_locations[first page]", False, lambda db, i: crud.get_locations(db, limit=100)),
+        ("crud.get_locations[deep offset]", False,
+         lambda db, i: crud.get_locations(db, skip=len(location_ids) // 2, limit=100)),
+        ("crud.get_locations[deep keyset]", False,
+         lambda db, i: crud.get_locations(db, after_id=location_ids[len(location_ids) // 2], limit=100)),
+        ("crud.get_page_rows[locations]", False,
+         lambda db, i: crud.get_page_rows(db, models.Location, schemas.Location, limit=100)),
+        ("crud.get_categories", False, lambda db, i: crud.get_categories(db, limit=100)),
+        ("crud.get_reviews[keyset]", False,
+         lambda db, i: crud.get_reviews(db, after_id=rng.randrange(ids["max_review_id"] + 1), limit=100)),
+        ("crud.get_location", False, lambda db, i: crud.get_location(db, rng.choice(location_ids))),
+        ("crud.get_category", False, lambda db, i: crud.get_category(db, rng.choice(category_ids))),
+        ("crud.get_review", False, lambda db, i: crud.get_review(db, *pair())),
+        ("crud.get_locations_nearby", False,
+         lambda db, i: crud.get_locations_nearby(db, *point(), radius_m=NEARBY_RADIUS_M)),
+        ("crud.get_locations_within", False, lambda db, i: crud.get_locations_within(db, box())),
+        ("crud.get_location_tile[z=0]", False, lambda db, i: crud.get_location_tile(db, 0, 0, 0, include_stale=True)),
+        ("crud.create_or_update_review", True,
+         lambda db, i: crud.create_or_update_review(db, review())),
+        (f"crud.create_or_update_reviews[{REVIEW_BATCH_SIZE}]", True,
+         lambda db, i: crud.create_or_update_reviews(db, [review() for _ in range(REVIEW_BATCH_SIZE)])),
+        ("crud.claim_recommendations", True,
+         lambda db, i: crud.claim_recommendations(db, f"benchmark-{run_id}-{i}")),
+        ("crud.create_location", True,
+         lambda db, i: crud.create_location(db, schemas.LocationCreate(longitude=point()[1], latitude=point()[0]))),
+        ("crud.create_category", True,
+         lambda db, i: crud.create_category(db, schemas.CategoryCreate(name=f"benchmark-{run_id}-{i}"))),
+    ]
+
+
+def http_scenarios(client, ids, rng, run_id):
+    """
+    Return the (name, is_write, operation) HTTP scenarios.
+    """
+    location_ids, category_ids = ids["locations"], ids["categories"]
+
+    def get(path, params=None):
+        response = client.get(path, params=params)
+        response.raise_for_status()
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        response.raise_for_status()
+
+    def review():
+        return {"location_id": rng.choice(location_ids), "category_id": rng.choice(category_ids)}
+
+    return [
+        ("GET /api/v1/recommendations/", False, lambda i: get("/api/v1/recommendations/")),
+        ("GET /api/v1/locations/", False, lambda i: get("/api/v1/locations/", {"limit": 100})),
+        ("GET /api/v1/locations/?after_id", False,
+         lambda i: get("/api/v1/locations/", {"limit": 100, "after_id": location_ids[len(location_ids) // 2]})),
+        ("GET /api/v1/locations/{id}", False, lambda i: get(f"/api/v1/locations/{rng.choice(location_ids)}")),
+        ("GET /api/v1/locations/nearby", False, lambda i: get("/api/v1/locations/nearby", {
+            "lat": rng.uniform(-80, 80), "lon": rng.uniform(-179, 179), "radius_m": NEARBY_RADIUS_M
+        })),
+        ("GET /api/v1/locations/tiles/0/0/0", False, lambda i: get("/api/v1/locations/tiles/0/0/0", {"stale": True})),
+        ("GET /api/v1/categories/", False, lambda i: get("/api/v1/categories/", {"limit": 100})),
+        ("GET /api/v1/categories/{id}", False, lambda i: get(f"/api/v1/categories/{rng.choice(category_ids)}")),
+        ("GET /api/v1/reviews/", False, lambda i: get("/api/v1/reviews/", {"limit": 100})),
+        ("POST /api/v1/reviews/", True, lambda i: post("/api/v1/reviews/", review())),
+        (f"POST /api/v1/reviews/batch[{REVIEW_BATCH_SIZE}]", True,
+         lambda i: post("/api/v1/reviews/batch", [review() for _ in range(REVIEW_BATCH_SIZE)])),
+        ("POST /api/v1/locations/", True,
+         lambda i: post("/api/v1/locations/", {"longitude": rng.uniform(-179, 179), "latitude": rng.uniform(-80, 80)})),
+    ]
+
+
+def load_ids(db):
+    """
+    Return the IDs the scenarios pick their inputs from.
+    """
+    return {
+        "locations": db.scalars(select(models.Location.id).order_by(models.Location.id)).all(),
+        "categories": db.scalars(select(models.Category.id).order_by(models.Category.id)).all(),
+        "max_review_id": db.scalar(select(func.max(models.Review.id))) or 0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """
+    Print the latency change of every scenario against a baseline run.
+    """
+    print(f"{'scenario':<45} {'p50 before':>11} {'p50 after':>11} {'change':>8} {'p99 before':>11} {'p99 after':>11}")
+    for name, summary in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before or not before["p50_ms"] or not summary["p50_ms"]:
+            continue
+        change = (summary["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        print(f"{name:<45} {before['p50_ms']:>11.3f} {summary['p50_ms']:>11.3f} {change:>+7.1f}% "
+              f"{before['p99_ms']:>11.3f} {summary['p99_ms']:>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--never-reviewed", type=float, default=0.01, help="share of pairs never reviewed")
+    parser.add_argument("--distribution", choices=sorted(datagen.AGE_DISTRIBUTIONS), default="uniform",
+                        help="review age distribution")
+    parser.add_argument("--max-age-days", type=float, default=90)
+    parser.add_argument("--mean-age-days", type=float, default=20, help="mean age of the exponential distribution")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200, help="iterations of each read scenario")
+    parser.add_argument("--write-iterations", type=int, default=20, help="iterations of each write scenario")
+    parser.add_argument("--scenario", action="append", dest="scenarios", help="only run scenarios containing this text")
+    parser.add_argument("--no-http", action="store_true", help="skip the HTTP scenarios")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in the database")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    args = parser.parse_args()
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        if args.skip_seed:
+            dataset = {"reused": True}
+        else:
+            dataset = datagen.seed(
+                db, args.locations, args.categories, never_reviewed=args.never_reviewed,
+                distribution=args.distribution, max_age_days=args.max_age_days,
+                mean_age_days=args.mean_age_days, seed=args.seed
+            )
+            print(f"Seeded {json.dumps(dataset['rows'])}")
+        ids = load_ids(db)
+    finally:
+        db.close()
+
+    started_at = datetime.now(timezone.utc)
+    run_id = started_at.strftime("%Y%m%dT%H%M%S")
+    rng = random.Random(args.seed)
+    scenarios = [(name, is_write, with_session(operation)) for name, is_write, operation in crud_scenarios(ids, rng, run_id)]
+    client = None
+    if not args.no_http:
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        client = TestClient(app)
+        client.__enter__()
+        scenarios += http_scenarios(client, ids, rng, run_id)
+
+    # Reads first, on the dataset as seeded
+    scenarios.sort(key=lambda scenario: scenario[1])
+    results = {}
+    try:
+        for name, is_write, operation in scenarios:
+            if args.scenarios and not any(text in name for text in args.scenarios):
+                continue
+            results[name] = measure(operation, args.write_iterations if is_write else args.iterations)
+            print(f"{name:<45} p50 {results[name]['p50_ms']} ms  p99 {results[name]['p99_ms']} ms  "
+                  f"{results[name]['throughput_ops']} ops/s  {results[name]['errors']} errors")
+    finally:
+        if client is not None:
+            client.__exit__(None, None, None)
+
+    output = {
+        "run": {
+            "started_at": started_at.isoformat(),
+            "git_commit": git_commit(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+        },
+        "config": {
+            name: getattr(config, name)
+            for name in dir(config) if name.isupper() and isinstance(getattr(config, name), (bool, int, float, str))
+        },
+        "dataset": dataset,
+        "scenarios": results,
+    }
+    path = args.output or os.path.join(RESULTS_DIR, f"{run_id}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as results_file:
+        json.dump(output, results_file, indent=2)
+    print(f"Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(output, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()